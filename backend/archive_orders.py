@@ -0,0 +1,41 @@
+"""
+Script to move delivered/cancelled orders older than --days from `orders`
+to the compressed `orders_archive` collection (the same job the API runs on
+its ORDER_ARCHIVE_INTERVAL_SECONDS schedule).
+
+Safe to interrupt and re-run. Use --dry-run to only count eligible orders.
+"""
+import argparse
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from beanie import init_beanie
+from models import Order
+from services.order_archive import ORDER_ARCHIVE_AFTER_DAYS, ORDER_ARCHIVE_BATCH_SIZE, archive_orders
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+async def main(args):
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    db_name = os.getenv("DATABASE_NAME", "babadairy")
+    client = AsyncIOMotorClient(mongodb_url)
+    await init_beanie(database=client[db_name], document_models=[Order])
+
+    result = await archive_orders(older_than_days=args.days, batch_size=args.batch_size, dry_run=args.dry_run)
+    if args.dry_run:
+        print(f"Orders eligible for archival (created before {result['cutoff']}): {result['eligible']}")
+        return
+    print(f"Archived {result['archived']} orders created before {result['cutoff']} "
+          f"in {result['batches']} batches ({result['seconds']}s)")
+    stats = await client[db_name].command("collStats", "orders")
+    print(f"Hot orders collection: {stats['count']} orders, {stats.get('storageSize', 0) / 1024:.0f} KB on disk")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=ORDER_ARCHIVE_AFTER_DAYS, help="Archive orders older than this")
+    parser.add_argument("--batch-size", type=int, default=ORDER_ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(main(parser.parse_args()))
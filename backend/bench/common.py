@@ -0,0 +1,108 @@
+"""Helpers shared by the benchmark suites: percentiles, seed data and result files."""
+from typing import Dict, List, Sequence
+import json
+import math
+import os
+import platform
+import sys
+import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BACKEND_DIR, "..", "public", "data")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence (p in 0..100)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples_ms: List[float], errors: int, elapsed_s: float) -> Dict[str, float]:
+    values = sorted(samples_ms)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(values[-1], 3) if values else 0.0,
+    }
+
+
+def load_seed(name: str) -> list:
+    with open(os.path.join(DATA_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def product_from_seed(raw: dict) -> dict:
+    """Map a public/data/products.json entry (camelCase) onto the Product model fields."""
+    return {
+        "id": raw["id"],
+        "name": raw["name"],
+        "category": raw["category"],
+        "description": raw.get("description", ""),
+        "price": float(raw["price"]),
+        "discount": float(raw.get("discount", 0) or 0),
+        "images": raw.get("images", []),
+        "sizes": raw.get("sizes", []),
+        "stock": int(raw.get("stock", 50)),
+        "low_stock_threshold": int(raw.get("lowStockThreshold", 10)),
+        "flavors": raw.get("flavors", []),
+        "dietary": raw.get("dietary", []),
+        "rating": float(raw.get("rating", 0) or 0),
+        "review_count": int(raw.get("reviewCount", 0) or 0),
+        "ingredients": raw.get("ingredients", ""),
+        "nutrition": raw.get("nutrition", {}),
+        "status": raw.get("status", "active"),
+        "featured": bool(raw.get("featured", False)),
+        "created_at": raw.get("createdAt", "2024-01-01"),
+    }
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.datetime.now().isoformat(),
+    }
+
+
+def write_result(path: str, result: dict) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+
+
+def read_result(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline: Dict[str, dict], current: Dict[str, dict], max_regression_pct: float,
+            metrics=("p95_ms", "p99_ms")) -> List[str]:
+    """
+    Regressions of `current` against `baseline`, keyed by benchmark/endpoint name.
+    Latency metrics regress when they grow, throughput when it shrinks.
+    """
+    failures = []
+    for name, base in baseline.items():
+        cur = current.get(name)
+        if cur is None:
+            continue
+        for metric in metrics:
+            old, new = base.get(metric), cur.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            if metric.startswith("throughput"):
+                change = -change
+            if change > max_regression_pct:
+                failures.append(f"{name}: {metric} {old} -> {new} ({change:+.1f}%)")
+    return failures
@@ -0,0 +1,320 @@
+"""
+End-to-end load test for the shop API.
+
+Drives weighted async scenarios (catalog browsing, product detail, login,
+checkout, admin order updates and optionally uploads) with concurrent
+virtual users and reports p50/p95/p99 latency and throughput per endpoint.
+
+Targets, in order of preference:
+  --url http://host:8000        an already running server (seeded with --seed)
+  --mongo-url mongodb://...     the app from main.py in-process against a local mongod
+  (neither)                     the app in-process against mongomock-motor
+
+Examples (run from backend/):
+  python -m bench.load --duration 30 --users 20
+  python -m bench.load --mongo-url mongodb://localhost:27017 --save-baseline bench/results/baseline.json
+  python -m bench.load --baseline bench/results/baseline.json --max-regression 15
+"""
+from typing import Callable, Dict, List, Optional
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+
+from bench.common import (
+    RESULTS_DIR, compare, environment, load_seed, product_from_seed, read_result, summarize, write_result,
+)
+
+DEFAULT_WEIGHTS = {
+    "browse": 50,
+    "product_detail": 25,
+    "login": 8,
+    "checkout": 10,
+    "admin_order_update": 5,
+    "upload": 2,
+}
+
+BENCH_PASSWORD = "bench-password"
+# 1x1 transparent PNG
+_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.recording = False
+
+    async def request(self, client, method: str, url: str, label: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            failed = response.status_code >= 400
+        except Exception:
+            response, failed = None, True
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if self.recording:
+            self.samples.setdefault(label, []).append(elapsed_ms)
+            if failed:
+                self.errors[label] = self.errors.get(label, 0) + 1
+        return response
+
+
+class Context:
+    """Data shared by the virtual users: seeded ids and orders created during the run."""
+
+    def __init__(self, product_ids: List[str], products: Dict[str, dict], user: Optional[dict]):
+        self.product_ids = product_ids
+        self.products = products
+        self.user = user
+        self.order_ids: List[str] = []
+
+
+async def browse(client, ctx: Context, rng: random.Random, rec: Recorder):
+    await rec.request(client, "GET", "/products/catalog", "GET /products/catalog")
+    await rec.request(client, "GET", "/settings/public", "GET /settings/public")
+
+
+async def product_detail(client, ctx, rng, rec):
+    product_id = rng.choice(ctx.product_ids)
+    await rec.request(client, "GET", f"/products/{product_id}", "GET /products/{product_id}")
+
+
+async def login(client, ctx, rng, rec):
+    if ctx.user is None:
+        return await browse(client, ctx, rng, rec)
+    await rec.request(client, "POST", "/users/login", "POST /users/login",
+                      json={"email": ctx.user["email"], "password": BENCH_PASSWORD})
+
+
+async def checkout(client, ctx, rng, rec):
+    items = []
+    for product_id in rng.sample(ctx.product_ids, k=min(len(ctx.product_ids), rng.randint(1, 4))):
+        product = ctx.products[product_id]
+        unit_price = product["price"] * (1 - product.get("discount", 0) / 100)
+        items.append({
+            "productId": product_id,
+            "name": product["name"],
+            "quantity": rng.randint(1, 3),
+            "price": round(unit_price, 2),
+            "size": (product.get("sizes") or [None])[0],
+        })
+    subtotal = round(sum(i["price"] * i["quantity"] for i in items), 2)
+    tax = round(subtotal * 0.05, 2)
+    delivery = 0 if subtotal >= 500 else 40
+    order_id = f"BENCH_{uuid.uuid4().hex[:12]}"
+    response = await rec.request(
+        client, "POST", "/orders/", "POST /orders/",
+        headers={"Idempotency-Key": order_id},
+        json={
+            "id": order_id,
+            "order_number": order_id,
+            "user_id": ctx.user["id"] if ctx.user else "guest",
+            "customer": {"name": "Bench User", "email": "", "phone": "", "address": {"city": "Mumbai"}},
+            "items": items,
+            "subtotal": subtotal,
+            "tax": tax,
+            "delivery_charges": delivery,
+            "discount": 0,
+            "total": round(subtotal + tax + delivery, 2),
+            "payment_method": "COD",
+        },
+    )
+    if response is not None and response.status_code < 400:
+        ctx.order_ids.append(order_id)
+
+
+async def admin_order_update(client, ctx, rng, rec):
+    if not ctx.order_ids:
+        return await checkout(client, ctx, rng, rec)
+    order_id = rng.choice(ctx.order_ids)
+    status = rng.choice(["confirmed", "preparing", "out_for_delivery", "delivered"])
+    await rec.request(client, "PUT", f"/orders/{order_id}", "PUT /orders/{order_id}", json={"status": status})
+
+
+async def upload(client, ctx, rng, rec):
+    await rec.request(client, "POST", "/upload/", "POST /upload/",
+                      files={"file": ("bench.png", _PNG, "image/png")})
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "browse": browse,
+    "product_detail": product_detail,
+    "login": login,
+    "checkout": checkout,
+    "admin_order_update": admin_order_update,
+    "upload": upload,
+}
+
+
+async def seed(client, product_count: int) -> Context:
+    """Create the catalog and a customer through the public API."""
+    raw_products = [product_from_seed(p) for p in load_seed("products.json")]
+    products: Dict[str, dict] = {}
+    for i in range(product_count):
+        product = dict(raw_products[i % len(raw_products)])
+        product["id"] = f"bench_{i:06d}"
+        product["name"] = f"{product['name']} #{i}"
+        product["stock"] = 10 ** 7
+        response = await client.post("/products/", json=product)
+        response.raise_for_status()
+        products[product["id"]] = product
+
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    response = await client.post("/users/", json={"name": "Bench User", "email": email, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    return Context(list(products), products, response.json())
+
+
+async def discover(client) -> Context:
+    """Use whatever catalog a remote server already has (no writes besides checkouts)."""
+    response = await client.get("/products/")
+    response.raise_for_status()
+    products = {p["id"]: p for p in response.json()}
+    if not products:
+        raise SystemExit("Target has no products; rerun with --seed")
+    return Context(list(products), products, None)
+
+
+async def start_in_process(args):
+    """Import the FastAPI app and run its startup against a local mongod or mongomock."""
+    os.environ["DATABASE_NAME"] = args.database
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if args.mongo_url:
+        os.environ["MONGODB_URL"] = args.mongo_url
+    import httpx
+    import database
+    import main
+
+    if not args.mongo_url:
+        from mongomock_motor import AsyncMongoMockClient
+        database.client = AsyncMongoMockClient()
+    else:
+        client = await database.init_db()
+        await client.drop_database(args.database)
+        database.client = client
+    await main.app.router.startup()
+    http = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=60)
+    return http, main.app
+
+
+async def run(args) -> dict:
+    import httpx
+
+    app = None
+    if args.url:
+        http = httpx.AsyncClient(base_url=args.url.rstrip("/"), timeout=60)
+    else:
+        http, app = await start_in_process(args)
+
+    try:
+        ctx = await seed(http, args.products) if (args.seed or not args.url) else await discover(http)
+        weights = dict(DEFAULT_WEIGHTS)
+        if not args.uploads:
+            weights.pop("upload")
+        for override in args.weight or []:
+            name, _, value = override.partition("=")
+            weights[name] = float(value)
+        names = [n for n, w in weights.items() if w > 0]
+        scenario_weights = [weights[n] for n in names]
+
+        recorder = Recorder()
+
+        async def virtual_user(seed_value: int, deadline: float):
+            rng = random.Random(seed_value)
+            while time.perf_counter() < deadline:
+                name = rng.choices(names, scenario_weights)[0]
+                await SCENARIOS[name](http, ctx, rng, recorder)
+
+        if args.warmup > 0:
+            deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*[virtual_user(args.rng_seed + 10_000 + i, deadline) for i in range(args.users)])
+
+        recorder.recording = True
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*[virtual_user(args.rng_seed + i, deadline) for i in range(args.users)])
+        elapsed = time.perf_counter() - start
+    finally:
+        await http.aclose()
+        if app is not None:
+            await app.router.shutdown()
+
+    endpoints = {
+        label: summarize(samples, recorder.errors.get(label, 0), elapsed)
+        for label, samples in sorted(recorder.samples.items())
+    }
+    all_samples = [s for samples in recorder.samples.values() for s in samples]
+    return {
+        "environment": environment(),
+        "config": {
+            "target": args.url or ("mongod" if args.mongo_url else "mongomock"),
+            "users": args.users,
+            "duration_s": args.duration,
+            "products": args.products,
+            "weights": weights,
+        },
+        "total": summarize(all_samples, sum(recorder.errors.values()), elapsed),
+        "endpoints": endpoints,
+    }
+
+
+def print_report(result: dict) -> None:
+    header = f"{'endpoint':<32}{'reqs':>8}{'err':>6}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for label, s in rows:
+        print(f"{label:<32}{s['requests']:>8}{s['errors']:>6}{s['throughput_rps']:>10}"
+              f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server instead of the in-process app")
+    parser.add_argument("--mongo-url", help="Local mongod for the in-process app (default: mongomock)")
+    parser.add_argument("--database", default="babadairy_bench", help="Database for the in-process app (dropped first)")
+    parser.add_argument("--seed", action="store_true", help="Seed products and a user on a remote --url target")
+    parser.add_argument("--products", type=int, default=200, help="Catalog size to seed")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured warm-up seconds")
+    parser.add_argument("--rng-seed", type=int, default=1)
+    parser.add_argument("--weight", action="append", metavar="SCENARIO=W", help="Override a scenario weight")
+    parser.add_argument("--uploads", action="store_true", help="Include the upload scenario (needs Azure storage)")
+    parser.add_argument("--output", help="Where to write the JSON result")
+    parser.add_argument("--baseline", help="Fail if this run regresses against the given result file")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="Allowed regression in percent")
+    parser.add_argument("--save-baseline", help="Also write the result to this baseline path")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args))
+    print_report(result)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    write_result(output, result)
+    print(f"\nResult written to {output}")
+    if args.save_baseline:
+        write_result(args.save_baseline, result)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        failures = compare(read_result(args.baseline)["endpoints"], result["endpoints"], args.max_regression,
+                           metrics=("p95_ms", "p99_ms", "throughput_rps"))
+        if failures:
+            print(f"\nRegressions beyond {args.max_regression}%:")
+            for failure in failures:
+                print(f"  {failure}")
+            return 1
+        print(f"\nNo regressions beyond {args.max_regression}% against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+Microbenchmarks for the per-request CPU work that does not touch Mongo:
+response builders, Pydantic schema validation, settings serialization and
+JSON encoding, across representative document sizes. Alternatives are run
+side by side under the same group so they can be compared directly.
+
+Timing follows pyperf's approach (calibrated loop count, warm-up, several
+runs, mean +- stdev); with --pyperf the benchmarks are handed to pyperf's
+Runner instead. Allocation figures come from tracemalloc in a separate
+pass so they don't distort the timings.
+
+Examples (run from backend/):
+  python -m bench.micro
+  python -m bench.micro --filter order --runs 10
+  python -m bench.micro --save-baseline bench/results/baseline-micro.json
+  python -m bench.micro --baseline bench/results/baseline-micro.json --max-regression 10
+"""
+from typing import Callable, Dict, List, Tuple
+import argparse
+import copy
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from bench.common import RESULTS_DIR, compare, environment, load_seed, product_from_seed, read_result, write_result
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import models  # noqa: E402
+import schemas  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from routers.orders import _order_to_response  # noqa: E402
+from routers.products import _product_to_response  # noqa: E402
+from routers.users import _user_to_response  # noqa: E402
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+
+# --- Representative documents -------------------------------------------------
+
+def _small_product() -> dict:
+    return {
+        "id": "prod_small", "name": "Kesar Pista Kulfi", "category": "Ice Cream",
+        "description": "Slow-cooked milk with saffron and pistachio.", "price": 120.0, "discount": 10,
+        "images": ["https://cdn.example.com/kulfi.jpg"], "sizes": ["Single", "Family Pack"],
+        "price_by_size": {"Single": 120.0, "Family Pack": 450.0}, "stock": 40, "low_stock_threshold": 10,
+        "flavors": ["Kesar", "Pista"], "dietary": ["Vegetarian"], "rating": 4.7, "review_count": 58,
+        "ingredients": "Milk, Sugar, Saffron, Pistachio", "nutrition": {"calories": 210},
+        "status": "active", "featured": True, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00",
+    }
+
+
+def _image_product() -> dict:
+    """Largest seed product: inline base64 images, as stored by the admin UI."""
+    seeds = [product_from_seed(p) for p in load_seed("products.json")]
+    doc = max(seeds, key=lambda p: sum(len(i) for i in p["images"]))
+    doc["updated_at"] = doc["created_at"]
+    return doc
+
+
+def _order(item_count: int, embed_products: bool) -> dict:
+    product = _image_product() if embed_products else None
+    items = []
+    for i in range(item_count):
+        item = {"productId": f"prod_{i:03d}", "name": f"Product {i}", "quantity": 1 + i % 3,
+                "price": 100.0 + i, "size": "Medium"}
+        if product is not None:
+            # What older clients sent: the whole product object inside the line item
+            item.update(copy.deepcopy(product))
+        items.append(item)
+    subtotal = sum(i["price"] * i["quantity"] for i in items)
+    return {
+        "id": "ord_bench", "order_number": "ORD123", "user_id": "user_001",
+        "customer": {"name": "Bench", "email": "bench@example.com", "phone": "+910000000000",
+                     "address": {"line1": "1 Street", "city": "Mumbai", "state": "MH", "pincode": "400001"}},
+        "items": items, "subtotal": subtotal, "tax": subtotal * 0.05, "delivery_charges": 0, "discount": 0,
+        "total": subtotal * 1.05, "payment_method": "COD", "payment_status": "pending",
+        "invoice_number": "INV123", "status": "pending",
+        "status_history": [{"status": "pending", "timestamp": "2024-01-01T00:00:00"}],
+        "estimated_delivery": "2024-01-04", "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00",
+    }
+
+
+def _user() -> dict:
+    return {"id": "user_001", "name": "Rahul Sharma", "email": "rahul@example.com", "phone": "+919999999999",
+            "password": "x", "role": "customer",
+            "addresses": [{"line1": "1 Street", "city": "Mumbai", "state": "MH", "pincode": "400001"}] * 3,
+            "joined_at": "2024-01-01"}
+
+
+def _doc(model, data: dict):
+    """Document instance without a database (Document.__init__ needs an initialized collection)."""
+    return model.model_construct(**data)
+
+
+def _strip_meta(data: dict) -> dict:
+    return {k: v for k, v in data.items() if k != "revision_id"}
+
+
+# --- Benchmarks -----------------------------------------------------------------
+
+def build_benchmarks() -> List[Tuple[str, str, Callable[[], object]]]:
+    """(group, name, zero-arg callable). Benchmarks in one group are alternatives to each other."""
+    small, with_images = _small_product(), _image_product()
+    small_doc, image_doc = _doc(models.Product, small), _doc(models.Product, with_images)
+    order_small = _order(3, embed_products=False)
+    order_large = _order(25, embed_products=False)
+    order_embedded = _order(20, embed_products=True)
+    order_large_doc = _doc(models.Order, order_large)
+    order_embedded_doc = _doc(models.Order, order_embedded)
+    user_doc = _doc(models.User, _user())
+    settings_doc = models.SiteSettings.model_construct()
+    catalog = [_product_to_response(_doc(models.Product, dict(small, id=f"p{i}"))) for i in range(200)]
+
+    benches = [
+        ("product_response.small", "getattr_builder", lambda: _product_to_response(small_doc)),
+        ("product_response.small", "model_dump", lambda: _strip_meta(small_doc.model_dump())),
+        ("product_response.small", "builder+schema_validate",
+         lambda: schemas.Product.model_validate(_product_to_response(small_doc))),
+        ("product_response.images", "getattr_builder", lambda: _product_to_response(image_doc)),
+        ("product_response.images", "model_dump", lambda: _strip_meta(image_doc.model_dump())),
+        ("product_response.images", "builder+schema_validate",
+         lambda: schemas.Product.model_validate(_product_to_response(image_doc))),
+
+        ("order_response.25_items", "getattr_builder", lambda: _order_to_response(order_large_doc)),
+        ("order_response.25_items", "model_dump", lambda: _strip_meta(order_large_doc.model_dump())),
+        ("order_response.20_embedded_products", "getattr_builder", lambda: _order_to_response(order_embedded_doc)),
+        ("order_response.20_embedded_products", "builder+schema_validate",
+         lambda: schemas.Order.model_validate(_order_to_response(order_embedded_doc))),
+
+        ("user_response", "getattr_builder", lambda: _user_to_response(user_doc)),
+        ("user_response", "builder+schema_validate", lambda: schemas.User.model_validate(_user_to_response(user_doc))),
+
+        ("schema_validate.product_create", "small", lambda: schemas.ProductCreate.model_validate(small)),
+        ("schema_validate.product_create", "images", lambda: schemas.ProductCreate.model_validate(with_images)),
+        ("schema_validate.order_create", "3_items", lambda: schemas.OrderCreate.model_validate(order_small)),
+        ("schema_validate.order_create", "25_items", lambda: schemas.OrderCreate.model_validate(order_large)),
+        ("schema_validate.order_create", "20_embedded_products",
+         lambda: schemas.OrderCreate.model_validate(order_embedded)),
+
+        ("settings", "model_dump", lambda: settings_doc.model_dump()),
+        ("settings", "model_dump_json", lambda: settings_doc.model_dump_json()),
+
+        ("encode.catalog_200", "jsonable_encoder+json", lambda: json.dumps(jsonable_encoder(catalog))),
+        ("encode.catalog_200", "json.dumps", lambda: json.dumps(catalog)),
+    ]
+    if orjson is not None:
+        benches.append(("encode.catalog_200", "orjson", lambda: orjson.dumps(catalog)))
+    return benches
+
+
+# --- Runner -------------------------------------------------------------------------
+
+def _calibrate(func, min_time: float) -> int:
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - start >= min_time or loops >= 1 << 22:
+            return loops
+        loops *= 2
+
+
+def time_func(func, runs: int, min_time: float) -> Dict[str, float]:
+    loops = _calibrate(func, min_time)
+    for _ in range(loops):  # warm-up
+        func()
+    per_call_us = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        per_call_us.append((time.perf_counter() - start) / loops * 1e6)
+    return {
+        "loops": loops,
+        "mean_us": round(statistics.mean(per_call_us), 3),
+        "stdev_us": round(statistics.stdev(per_call_us), 3) if len(per_call_us) > 1 else 0.0,
+        "min_us": round(min(per_call_us), 3),
+    }
+
+
+def allocations(func, calls: int = 50) -> Dict[str, float]:
+    """Peak traced bytes of a single call and bytes still held after `calls` calls."""
+    func()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        retained_before, _ = tracemalloc.get_traced_memory()
+        results = [func() for _ in range(calls)]
+        retained_after, _ = tracemalloc.get_traced_memory()
+        del results
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_bytes_per_call": max(0, peak - before),
+        "result_bytes_per_call": round(max(0, retained_after - retained_before) / calls, 1),
+    }
+
+
+def run_pyperf(benches) -> int:
+    import pyperf
+    runner = pyperf.Runner()
+    for group, name, func in benches:
+        runner.bench_func(f"{group}:{name}", func)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", help="Only run benchmarks whose group contains this text")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.1, help="Seconds per run (calibrates the loop count)")
+    parser.add_argument("--pyperf", action="store_true", help="Delegate timing to pyperf.Runner (extra args pass through)")
+    parser.add_argument("--output", help="Where to write the JSON result")
+    parser.add_argument("--baseline", help="Fail if mean time regresses against this result file")
+    parser.add_argument("--max-regression", type=float, default=10.0, help="Allowed regression in percent")
+    parser.add_argument("--save-baseline", help="Also write the result to this baseline path")
+    args, rest = parser.parse_known_args(argv)
+
+    benches = [b for b in build_benchmarks() if not args.filter or args.filter in b[0]]
+    if args.pyperf:
+        sys.argv = [sys.argv[0]] + rest
+        return run_pyperf(benches)
+
+    results: Dict[str, dict] = {}
+    print(f"{'benchmark':<58}{'mean us':>12}{'+-':>9}{'peak B/call':>14}")
+    current_group = None
+    for group, name, func in benches:
+        if group != current_group:
+            print(f"\n[{group}]")
+            current_group = group
+        stats = time_func(func, args.runs, args.min_time)
+        stats.update(allocations(func))
+        results[f"{group}:{name}"] = stats
+        print(f"  {name:<56}{stats['mean_us']:>12}{stats['stdev_us']:>9}{stats['peak_bytes_per_call']:>14}")
+
+    result = {"environment": environment(), "benchmarks": results}
+    output = args.output or os.path.join(RESULTS_DIR, f"micro-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    write_result(output, result)
+    print(f"\nResult written to {output}")
+    if args.save_baseline:
+        write_result(args.save_baseline, result)
+
+    if args.baseline:
+        failures = compare(read_result(args.baseline)["benchmarks"], results, args.max_regression, metrics=("mean_us",))
+        if failures:
+            print(f"\nRegressions beyond {args.max_regression}%:")
+            for failure in failures:
+                print(f"  {failure}")
+            return 1
+        print(f"\nNo regressions beyond {args.max_regression}% against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Local replica set on one machine, for exercising read preferences and
+change streams (neither means much against a standalone mongod).
+
+Starts --members mongod processes on consecutive ports with throwaway data
+directories, initiates them as one replica set, waits for a primary and
+prints the connection string. Runs until interrupted, then stops the
+members. With --check it also reports which member answered a read under
+each of database.READ_PREFERENCES.
+
+Examples (run from backend/, mongod on PATH):
+  python -m bench.replset                       # 3 members on 27018-27020
+  python -m bench.replset --members 1 --port 27030 --check
+
+Then, in another shell:
+  MONGODB_URL="mongodb://localhost:27018/?replicaSet=rs0" python -m bench.load --mongo-url "$MONGODB_URL"
+  MONGODB_URL="mongodb://localhost:27018/?replicaSet=rs0" python serve.py --workers 4
+"""
+from typing import List
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import bench.common  # noqa: F401  (puts backend/ on sys.path)
+
+
+def start_members(args, data_dir: str) -> List[subprocess.Popen]:
+    processes = []
+    for i in range(args.members):
+        port = args.port + i
+        db_path = os.path.join(data_dir, f"member{i}")
+        os.makedirs(db_path, exist_ok=True)
+        processes.append(subprocess.Popen(
+            [args.mongod, "--replSet", args.name, "--port", str(port), "--dbpath", db_path,
+             "--bind_ip", "127.0.0.1", "--logpath", os.path.join(db_path, "mongod.log")],
+        ))
+    return processes
+
+
+def initiate(args) -> str:
+    from pymongo import MongoClient
+
+    hosts = [f"localhost:{args.port + i}" for i in range(args.members)]
+    seed = MongoClient(hosts[0], directConnection=True, serverSelectionTimeoutMS=30000)
+    config = {"_id": args.name, "members": [{"_id": i, "host": host} for i, host in enumerate(hosts)]}
+    seed.admin.command("replSetInitiate", config)
+    url = f"mongodb://{','.join(hosts)}/?replicaSet={args.name}"
+    client = MongoClient(url, serverSelectionTimeoutMS=60000)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        status = client.admin.command("replSetGetStatus")
+        states = [m["stateStr"] for m in status["members"]]
+        if states.count("PRIMARY") == 1 and all(s in ("PRIMARY", "SECONDARY") for s in states):
+            return url
+        time.sleep(0.5)
+    raise SystemExit(f"Replica set did not come up: {states}")
+
+
+def check(url: str) -> None:
+    """Run one read per profile and print which member served it."""
+    from pymongo import MongoClient
+    import database
+
+    client = MongoClient(url)
+    collection = client["babadairy_replset_check"]["products"]
+    collection.insert_one({"name": "check"})
+    time.sleep(1)  # let secondaries replicate
+    for profile, preference in database.READ_PREFERENCES.items():
+        cursor = collection.with_options(read_preference=preference).find({})
+        list(cursor)
+        host, port = cursor.address
+        print(f"  {profile:<10} {preference.mongos_mode:<20} served by {host}:{port}")
+    client.drop_database("babadairy_replset_check")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=3)
+    parser.add_argument("--port", type=int, default=27018, help="Port of the first member")
+    parser.add_argument("--name", default="rs0", help="Replica set name")
+    parser.add_argument("--mongod", default=shutil.which("mongod") or "mongod")
+    parser.add_argument("--check", action="store_true", help="Report which member serves each read profile")
+    args = parser.parse_args(argv)
+
+    data_dir = tempfile.mkdtemp(prefix="babadairy-replset-")
+    processes = start_members(args, data_dir)
+    try:
+        url = initiate(args)
+        print(f"Replica set {args.name} ready: {url}")
+        if args.check:
+            check(url)
+        print("Ctrl+C to stop")
+        while all(p.poll() is None for p in processes):
+            time.sleep(1)
+        print("A member exited; see the mongod.log files under", data_dir)
+        return 1
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+        if all(p.returncode in (0, -15) for p in processes):
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
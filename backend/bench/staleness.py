@@ -0,0 +1,125 @@
+"""
+Bounded-staleness check for the cross-worker invalidation bus.
+
+Makes a write through the API, then reads it back over fresh connections
+(no keep-alive, so requests are spread over the worker processes) until
+--confirm consecutive reads all reflect it. The staleness of a change is
+the time from the write's response to the first read of that final streak.
+Covers product create/update/delete (seen through the search index and the
+catalog snapshot) and a settings update (seen through /settings/public).
+Exits with 1 if any change took longer than --max-staleness.
+
+Examples (run from backend/):
+  INVALIDATION_BUS=poll python serve.py --workers 4 &
+  python -m bench.staleness --url http://localhost:8000 --max-staleness 5
+"""
+from typing import Callable, List, Tuple
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+
+from bench.common import load_seed, product_from_seed
+
+READ_INTERVAL_SECONDS = 0.02
+
+
+async def wait_until(url: str, path: str, check: Callable[[object], bool], confirm: int, timeout: float) -> float:
+    """Seconds until `confirm` consecutive fresh-connection reads of `path` pass `check` (inf on timeout)."""
+    import httpx
+
+    start = time.perf_counter()
+    streak_start, streak = None, 0
+    limits = httpx.Limits(max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=10) as client:
+        while time.perf_counter() - start < timeout:
+            read_at = time.perf_counter()
+            response = await client.get(path)
+            if response.status_code == 200 and check(response.json()):
+                if streak == 0:
+                    streak_start = read_at
+                streak += 1
+                if streak >= confirm:
+                    return streak_start - start
+            else:
+                streak = 0
+            await asyncio.sleep(READ_INTERVAL_SECONDS)
+    return float("inf")
+
+
+def _in_search(product_id: str, present: bool = True, price: float = None):
+    def check(body) -> bool:
+        hits = [r for r in body["results"] if r["id"] == product_id]
+        if not present:
+            return not hits
+        return bool(hits) and (price is None or hits[0]["price"] == price)
+    return check
+
+
+def _in_catalog(product_id: str, price: float):
+    def check(body) -> bool:
+        return any(p["id"] == product_id and p["price"] == price for p in body)
+    return check
+
+
+async def run(args) -> List[Tuple[str, float]]:
+    import httpx
+
+    results = []
+    token = f"stale{uuid.uuid4().hex[:10]}"
+    product = product_from_seed(load_seed("products.json")[0])
+    product.update(id=f"bench_{token}", name=f"Staleness {token}", status="active")
+    search_path = f"/products/search?q={token}&fields=id,price"
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as writer:
+        async def measure(label: str, path: str, check) -> None:
+            staleness = await wait_until(args.url, path, check, args.confirm, args.max_staleness * 3)
+            results.append((label, staleness))
+
+        (await writer.post("/products/", json=product)).raise_for_status()
+        await measure("product create -> search", search_path, _in_search(product["id"]))
+
+        product["price"] = round(product["price"] + 1.5, 2)
+        (await writer.put(f"/products/{product['id']}", json=product)).raise_for_status()
+        await asyncio.gather(
+            measure("product update -> search", search_path, _in_search(product["id"], price=product["price"])),
+            measure("product update -> catalog", "/products/catalog", _in_catalog(product["id"], product["price"])),
+        )
+
+        (await writer.delete(f"/products/{product['id']}")).raise_for_status()
+        await measure("product delete -> search", search_path, _in_search(product["id"], present=False))
+
+        original = (await writer.get("/settings/public")).json().get("storeTagline", "")
+        (await writer.put("/settings/", json={"store_tagline": token})).raise_for_status()
+        try:
+            await measure("settings update -> public settings", "/settings/public",
+                          lambda body: body.get("storeTagline") == token)
+        finally:
+            await writer.put("/settings/", json={"store_tagline": original})
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="Base URL of a server running several workers")
+    parser.add_argument("--max-staleness", type=float, default=5.0, help="Allowed seconds until all workers agree")
+    parser.add_argument("--confirm", type=int, default=20, help="Consecutive up-to-date reads required")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    print(f"{'change':<40}{'staleness s':>14}")
+    failed = False
+    for label, staleness in results:
+        ok = staleness <= args.max_staleness
+        failed = failed or not ok
+        print(f"{label:<40}{staleness:>14.3f}{'' if ok else '  EXCEEDED'}")
+    if failed:
+        print(f"\nSome changes were not visible on every worker within {args.max_staleness}s")
+        return 1
+    print(f"\nAll changes visible on every worker within {args.max_staleness}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,250 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
+from pymongo import monitoring
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from collections import deque
+from services import metrics
+from services.slow_queries import slow_query_log
+import asyncio
+import logging
 import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 # MongoDB Configuration from environment variables
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017/babadairy")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "babadairy")
 
+# Connection pool tuning
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "120000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+
+# Delay between connection attempts while Mongo is unreachable at startup
+MONGO_RETRY_INTERVAL_SECONDS = float(os.getenv("MONGO_RETRY_INTERVAL_SECONDS", "5"))
+
+# Read preference profiles. Queries that can tolerate slightly old data pick a
+# profile so they can be served by secondaries; everything else (order
+# placement, stock, login, anything read back right after a write) stays on
+# the primary. On a standalone server every profile reads from that server.
+_READ_PREFERENCE_MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def _read_preference(mode: str, max_staleness_seconds: int):
+    if mode not in _READ_PREFERENCE_MODES:
+        raise ValueError(f"Unknown read preference {mode!r}; expected one of {', '.join(_READ_PREFERENCE_MODES)}")
+    if mode == "primary":
+        return Primary()
+    # The server requires maxStalenessSeconds >= 90 (or -1 for no limit)
+    if max_staleness_seconds != -1 and max_staleness_seconds < 90:
+        raise ValueError(f"maxStalenessSeconds must be -1 or at least 90, got {max_staleness_seconds}")
+    return _READ_PREFERENCE_MODES[mode](max_staleness=max_staleness_seconds)
+
+
+READ_PREFERENCES = {
+    "primary": Primary(),
+    # Storefront browsing: batch lookups, related products, reviews
+    # (the admin product list and product detail read the primary for read-your-writes)
+    "catalog": _read_preference(
+        os.getenv("CATALOG_READ_PREFERENCE", "secondaryPreferred"),
+        int(os.getenv("CATALOG_MAX_STALENESS_SECONDS", "90")),
+    ),
+    # Exports, reports and batch jobs that scan whole collections
+    # (interactive admin lists such as GET /orders read the primary)
+    "analytics": _read_preference(
+        os.getenv("ANALYTICS_READ_PREFERENCE", "secondaryPreferred"),
+        int(os.getenv("ANALYTICS_MAX_STALENESS_SECONDS", "300")),
+    ),
+}
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool listener tracking open/checked-out connections and checkout wait times."""
+
+    def __init__(self, window: int = 1024):
+        self.connections_open = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+        self.wait_times_ms = deque(maxlen=window)
+        self._local = threading.local()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.connections_open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.connections_open -= 1
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        self.checked_out += 1
+        self.checkouts += 1
+        # pymongo >= 4.7 reports the duration itself; otherwise time it from check_out_started,
+        # which is always emitted on the same thread.
+        duration = getattr(event, "duration", None)
+        if duration is None:
+            started = getattr(self._local, "started", None)
+            if started is None:
+                return
+            duration = time.perf_counter() - started
+        self.wait_times_ms.append(duration * 1000)
+
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+
+    def snapshot(self) -> dict:
+        waits = sorted(self.wait_times_ms)
+
+        def pct(p: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 3)
+
+        return {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "connections_open": self.connections_open,
+            "checked_out": self.checked_out,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.checkout_failures,
+            "pool_clears": self.pool_clears,
+            "checkout_wait_ms": {
+                "p50": pct(0.50),
+                "p95": pct(0.95),
+                "p99": pct(0.99),
+                "max": round(waits[-1], 3) if waits else 0.0,
+                "samples": len(waits),
+            },
+        }
+
+
+pool_stats = PoolStats()
+
+metrics.Gauge("mongodb_pool_connections_open", "Open MongoDB connections",
+              callback=lambda: pool_stats.connections_open)
+metrics.Gauge("mongodb_pool_connections_checked_out", "MongoDB connections checked out of the pool",
+              callback=lambda: pool_stats.checked_out)
+metrics.Gauge("mongodb_pool_max_size", "Configured MongoDB maxPoolSize",
+              callback=lambda: MONGO_MAX_POOL_SIZE)
+
+# Connection state shared with the health endpoints
+client = None
+ready = False
+last_error = None
+
+# Coroutine functions run once Mongo is connected (e.g. building in-memory indexes)
+_ready_callbacks = []
+
+
+def on_ready(callback) -> None:
+    _ready_callbacks.append(callback)
+
+
+def collection_for(model, profile: str = "primary"):
+    """Motor collection of a Beanie model using the read preference of `profile`."""
+    return model.get_motor_collection().with_options(read_preference=READ_PREFERENCES[profile])
+
+
+def from_mongo(model, doc: dict):
+    """Model instance from a raw document (no validation, as Beanie would load it)."""
+    doc = dict(doc)
+    doc["id"] = doc.pop("_id", doc.get("id"))
+    return model.model_construct(**doc)
+
+
 async def init_db():
-    client = AsyncIOMotorClient(MONGODB_URL)
-    print(f"Connected to MongoDB: {client}")
-    # Beanie initialization will happen in main.py startup event
+    client = AsyncIOMotorClient(
+        MONGODB_URL,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        event_listeners=[pool_stats, metrics.command_metrics, slow_query_log],
+    )
+    logger.info(f"MongoDB client created (maxPoolSize={MONGO_MAX_POOL_SIZE}, minPoolSize={MONGO_MIN_POOL_SIZE})")
+    # Beanie initialization happens in connect() / the scripts,
     # passing the document models list
     return client
+
+
+async def warm_up(client, document_models: list) -> None:
+    """
+    Pre-open the pool and prime Beanie so the first requests after a deploy
+    don't pay connection setup, index creation or first-parse costs.
+    """
+    # Concurrent pings force minPoolSize connections to be established now
+    # instead of lazily on the first requests.
+    await asyncio.gather(*[client.admin.command("ping") for _ in range(max(1, MONGO_MIN_POOL_SIZE))])
+    # One round trip per model exercises Beanie's query building and document parsing.
+    for model in document_models:
+        try:
+            await model.find_one({})
+        except Exception as e:
+            logger.warning(f"Warm-up query for {model.__name__} failed: {e}")
+
+
+async def connect(document_models: list) -> None:
+    """Create the client, verify Mongo is reachable, initialize Beanie and warm up."""
+    global client, ready, last_error
+    if client is None:
+        client = await init_db()
+    await client.admin.command("ping")
+    await init_beanie(database=client[DATABASE_NAME], document_models=document_models)
+    slow_query_log.attach(client, asyncio.get_running_loop())
+    await warm_up(client, document_models)
+    for callback in _ready_callbacks:
+        try:
+            await callback()
+        except Exception as e:
+            logger.error(f"Startup callback {callback.__name__} failed: {e}", exc_info=True)
+    ready = True
+    last_error = None
+
+
+async def connect_with_retry(document_models: list) -> None:
+    """Keep trying to connect until Mongo is reachable; readiness stays failing meanwhile."""
+    global last_error
+    while not ready:
+        try:
+            await connect(document_models)
+            logger.info(f"MongoDB initialized successfully. Database: {DATABASE_NAME}")
+        except Exception as e:
+            last_error = str(e)
+            logger.error(f"MongoDB not reachable yet: {e}; retrying in {MONGO_RETRY_INTERVAL_SECONDS}s")
+            await asyncio.sleep(MONGO_RETRY_INTERVAL_SECONDS)
@@ -0,0 +1,39 @@
+"""
+Script to recompute the demand forecasts (demand_forecasts collection) now,
+the same job the API runs on its FORECAST_INTERVAL_SECONDS schedule, and
+print the products that need reordering.
+"""
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from beanie import init_beanie
+from models import Order, Product
+from services.forecasting import reorder_report, run_forecast
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+async def main():
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    db_name = os.getenv("DATABASE_NAME", "babadairy")
+    client = AsyncIOMotorClient(mongodb_url)
+    await init_beanie(database=client[db_name], document_models=[Order, Product])
+
+    report = await run_forecast()
+    seconds = report["seconds"]
+    print(f"{report['products']} products over {report['history_days']} days: "
+          f"load {seconds['load']}s, compute {seconds['compute']}s, write {seconds['write']}s")
+    if not report["published"]:
+        print("A newer run finished first; these forecasts were discarded")
+
+    rows = (await reorder_report(only_reorder=True))["products"]
+    print(f"{len(rows)} products need reordering")
+    for row in rows:
+        days_left = row["days_until_stockout"]
+        print(f"  {row['name'][:40]:<40}{row['stock']:>7} in stock{days_left if days_left is not None else '-':>8} days"
+              f"  reorder {row['suggested_quantity']:>6}  threshold {row['low_stock_threshold']} -> {row['suggested_threshold']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
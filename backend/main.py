@@ -8,15 +8,26 @@ import logging
 # Load environment variables first
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (queue-based JSON pipeline; see services/logging_config.py)
+from services.logging_config import configure_logging
+configure_logging()
 logger = logging.getLogger(__name__)
 
-from database import init_db, DATABASE_NAME
-from models import Product, User, Order, Review, SiteSettings
-from beanie import init_beanie
-from routers import products, orders, users, upload, settings
-import os
+import database
+from models import Product, User, Order, Review, SiteSettings, IdempotencyRecord, StockMovement, StockSnapshot
+from routers import products, orders, users, upload, settings, reviews, cart, analytics, health, metrics, debug
+from services.metrics import MetricsMiddleware
+from services.request_context import RequestContextMiddleware
+from services.profiling import ProfilingMiddleware
+from services import invoices, product_events, recommendations, search, suggest
+from services.forecasting import forecast_job
+from services.inventory import inventory_jobs
+from services.order_archive import order_archiver
+from services.segmentation import segmentation_job
+from services.invalidation import TOPIC_ORDER_BASKETS, TOPIC_PRODUCTS, TOPIC_SETTINGS, bus
+from services.jobs import WORKER_ID
+from services.settings_cache import settings_cache
+import asyncio
 
 app = FastAPI(
     title="Baba Dairy API",
@@ -48,19 +59,86 @@ app.add_middleware(
     max_age=3600,
 )
 
+# Request latency/size metrics, exposed at /metrics
+app.add_middleware(MetricsMiddleware)
+# Makes the current route visible to Mongo listeners (slow query log)
+app.add_middleware(RequestContextMiddleware)
+# Per-request CPU profiles on demand (X-Profile-Token or /debug/profiles/sampling)
+app.add_middleware(ProfilingMiddleware)
+
+# In-memory catalog indexes: built once connected, then kept current from product writes.
+# The invalidation bus starts first so nothing written while they build is missed.
+database.on_ready(bus.start)
+product_events.subscribe(search.product_index.on_product_changed)
+database.on_ready(search.rebuild_product_index)
+product_events.subscribe(suggest.suggestion_index.on_product_changed)
+database.on_ready(suggest.rebuild_suggestion_index)
+product_events.subscribe(products.catalog_cache.on_product_changed)
+database.on_ready(products.catalog_cache.refresh)
+
+
+# Writes made by other worker processes (INVALIDATION_BUS, see serve.py)
+def _apply_remote_product(product_id: str, document):
+    product_events.deliver(product_id, dict(document, id=product_id) if document is not None else None)
+
+
+def _apply_remote_settings(key: str, document):
+    settings_cache.invalidate()
+    flavors = (document or {}).get("product_flavors", SiteSettings.model_fields["product_flavors"].default)
+    suggest.suggestion_index.set_site_flavors(flavors)
+
+
+def _apply_remote_order_basket(event_id: str, event):
+    # Change streams also deliver this worker's own events, which it has applied already
+    if event is not None and event.get("origin") != WORKER_ID:
+        recommendations.deliver(event["order_id"], event["products"], event["sign"])
+
+
+product_events.forward(bus.forward_product_change)
+recommendations.forward(bus.forward_order_basket)
+bus.on_remote_change(TOPIC_PRODUCTS, _apply_remote_product)
+bus.on_remote_change(TOPIC_SETTINGS, _apply_remote_settings)
+bus.on_remote_change(TOPIC_ORDER_BASKETS, _apply_remote_order_basket)
+for rebuild in (search.rebuild_product_index, suggest.rebuild_suggestion_index,
+                products.catalog_cache.refresh, settings_cache.refresh, recommendations.rebuild_co_occurrence):
+    bus.on_resync(rebuild)
+
+# Background jobs: each runs in one worker at a time (lease in job_leases, see services/jobs.py)
+# Moves old completed orders to orders_archive (ORDER_ARCHIVE_INTERVAL_SECONDS)
+database.on_ready(order_archiver.start)
+# Stock ledger snapshots and reconciliation (INVENTORY_SNAPSHOT_INTERVAL_SECONDS)
+database.on_ready(inventory_jobs.start)
+# RFM customer segments for the admin analytics API (SEGMENTATION_INTERVAL_SECONDS)
+database.on_ready(segmentation_job.start)
+# "Frequently bought together" co-occurrence model (RELATED_REBUILD_SECONDS); every worker builds it once
+database.on_ready(recommendations.co_occurrence_job.start)
+# Demand forecasts behind /products/reorder-report (FORECAST_INTERVAL_SECONDS)
+database.on_ready(forecast_job.start)
+
+DOCUMENT_MODELS = [Product, User, Order, Review, SiteSettings, IdempotencyRecord, StockMovement, StockSnapshot]
+
 # Startup event for database connection
 @app.on_event("startup")
 async def start_db():
     logger.info("Initializing MongoDB connection...")
     try:
-        client = await init_db()
-        db_name = os.getenv("DATABASE_NAME", "babadairy")
-        await init_beanie(database=client[db_name], document_models=[Product, User, Order, Review, SiteSettings])
-        logger.info(f"MongoDB initialized successfully. Database: {db_name}")
+        await database.connect(DOCUMENT_MODELS)
+        logger.info(f"MongoDB initialized successfully. Database: {database.DATABASE_NAME}")
     except Exception as e:
+        # Keep serving /healthz; /readyz reports not-ready until the background retry connects.
+        database.last_error = str(e)
         logger.error(f"Failed to initialize MongoDB: {e}")
-        # In production, you might want to retry or exit
-        # For dev, we log it.
+        app.state.db_retry_task = asyncio.create_task(database.connect_with_retry(DOCUMENT_MODELS))
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await order_archiver.stop()
+    await inventory_jobs.stop()
+    await segmentation_job.stop()
+    await recommendations.co_occurrence_job.stop()
+    await forecast_job.stop()
+    await bus.stop()
+    invoices.shutdown()
 
 # Global exception handler
 @app.exception_handler(Exception)
@@ -85,6 +163,12 @@ app.include_router(orders.router)
 app.include_router(users.router)
 app.include_router(upload.router)
 app.include_router(settings.router)
+app.include_router(reviews.router)
+app.include_router(cart.router)
+app.include_router(analytics.router)
+app.include_router(health.router)
+app.include_router(metrics.router)
+app.include_router(debug.router)
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,95 @@
+"""
+Script to rewrite the items of existing orders as compact snapshots
+(product id, name, size, unit price, quantity, thumbnail URL), the same shape
+new orders are stored with. Old orders may embed whole product objects,
+inline base64 images included.
+
+Works through `orders` and `orders_archive` in _id order, in batches. The
+last processed _id of each collection is checkpointed in the `migrations`
+collection, so an interrupted run continues where it stopped (--restart
+starts over; rewriting an already compact order changes nothing). Prints
+the BSON bytes saved.
+"""
+import argparse
+import asyncio
+import bson
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from services.order_archive import ARCHIVE_COLLECTION
+from services.order_items import compact_items
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MIGRATION_ID = "compact_order_items"
+PRODUCT_PROJECTION = {"name": 1, "images": {"$slice": 1}}
+
+
+async def migrate_collection(db, name: str, args) -> dict:
+    orders = db[name]
+    checkpoints = db["migrations"]
+    checkpoint_id = f"{MIGRATION_ID}:{name}"
+    checkpoint = None if args.restart else await checkpoints.find_one({"_id": checkpoint_id})
+    totals = {"orders": 0, "rewritten": 0, "bytes_before": 0, "bytes_after": 0}
+    last_id = None
+    if checkpoint:
+        last_id = checkpoint["last_id"]
+        totals = {k: checkpoint.get(k, 0) for k in totals}
+        print(f"{name}: resuming after {last_id}")
+
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        docs = await orders.find(query, {"items": 1}).sort("_id", 1).limit(args.batch_size).to_list(args.batch_size)
+        if not docs:
+            break
+        product_ids = {
+            item.get("productId") or item.get("product_id") or item.get("id")
+            for doc in docs for item in doc.get("items") or [] if isinstance(item, dict)
+        }
+        products = {
+            p["_id"]: p async for p in db["products"].find({"_id": {"$in": list(product_ids)}}, PRODUCT_PROJECTION)
+        }
+
+        ops = []
+        for doc in docs:
+            items = [item for item in doc.get("items") or [] if isinstance(item, dict)]
+            compact = compact_items(items, products)
+            before = len(bson.encode({"items": doc.get("items") or []}))
+            after = len(bson.encode({"items": compact}))
+            totals["orders"] += 1
+            totals["bytes_before"] += before
+            if compact != doc.get("items"):
+                totals["rewritten"] += 1
+                totals["bytes_after"] += after
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"items": compact}}))
+            else:
+                totals["bytes_after"] += before
+        if ops and not args.dry_run:
+            await orders.bulk_write(ops, ordered=False)
+        last_id = docs[-1]["_id"]
+        if not args.dry_run:
+            await checkpoints.update_one({"_id": checkpoint_id}, {"$set": dict(totals, last_id=last_id)}, upsert=True)
+        print(f"{name}: {totals['orders']} orders scanned, {totals['rewritten']} rewritten")
+    return totals
+
+
+async def main(args):
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    db_name = os.getenv("DATABASE_NAME", "babadairy")
+    db = AsyncIOMotorClient(mongodb_url)[db_name]
+
+    for name in ("orders", ARCHIVE_COLLECTION):
+        totals = await migrate_collection(db, name, args)
+        saved = totals["bytes_before"] - totals["bytes_after"]
+        print(f"{name}: items {totals['bytes_before'] / 1024:.1f} KB -> {totals['bytes_after'] / 1024:.1f} KB "
+              f"({saved / 1024:.1f} KB saved{', dry run' if args.dry_run else ''})")
+    print("Order item migration complete!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="Report savings without writing")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the beginning")
+    asyncio.run(main(parser.parse_args()))
@@ -1,6 +1,7 @@
 from beanie import Document
 from typing import List, Optional, Any, Dict
 from pydantic import Field
+from pymongo import IndexModel, ASCENDING, DESCENDING
 import datetime
 from uuid import uuid4
 
@@ -20,6 +21,7 @@ class Product(Document):
     dietary: List[str] = []
     rating: float = 0
     review_count: int = 0
+    rating_sum: float = 0  # Running sum of review ratings; rating = rating_sum / review_count
     ingredients: str = ""
     nutrition: Dict[str, Any] = {}
     status: str = "active"
@@ -80,6 +82,9 @@ class Review(Document):
 
     class Settings:
         name = "reviews"
+        indexes = [
+            IndexModel([("product_id", ASCENDING), ("created_at", DESCENDING)], name="product_id_created_at"),
+        ]
 
 
 class SiteSettings(Document):
@@ -169,7 +174,60 @@ class SiteSettings(Document):
     # Notifications
     enable_notifications: bool = True
     
+    # Incremented by every update; clients send it back to detect concurrent edits
+    version: int = 0
     updated_at: str = Field(default_factory=lambda: datetime.datetime.now().isoformat())
 
     class Settings:
         name = "site_settings"
+
+
+class IdempotencyRecord(Document):
+    id: str  # "<scope>:<Idempotency-Key>"
+    request_hash: str
+    status: str = "pending"  # pending | completed
+    status_code: int = 200
+    response: Optional[str] = None  # JSON-serialized response body
+    # While pending: the request executing it, and until when; renewed while it runs
+    lease_owner: Optional[str] = None
+    lease_until: Optional[datetime.datetime] = None
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+    expires_at: datetime.datetime
+
+    class Settings:
+        name = "idempotency_keys"
+        indexes = [
+            IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        ]
+
+
+class StockMovement(Document):
+    """One change to a product's stock. Insert-only: corrections are new movements."""
+    id: str = Field(default_factory=lambda: str(uuid4()))
+    product_id: str
+    delta: int
+    # order_placed | order_cancelled | order_reopened | order_deleted | restock | adjustment
+    # | opening_balance | reconciliation
+    reason: str
+    reference: Optional[str] = None  # e.g. the order id
+    note: str = ""
+    stock_after: Optional[int] = None  # Product.stock right after this change, when known
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+
+    class Settings:
+        name = "stock_movements"
+        indexes = [
+            IndexModel([("product_id", ASCENDING), ("created_at", DESCENDING)], name="product_id_created_at"),
+        ]
+
+
+class StockSnapshot(Document):
+    """Materialized sum of a product's movements up to `as_of` (one document per product)."""
+    id: str  # product id
+    stock: int
+    as_of: datetime.datetime
+    movement_count: int = 0
+    updated_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+
+    class Settings:
+        name = "stock_snapshots"
@@ -0,0 +1,48 @@
+"""
+Script to check the stock ledger (stock_movements + stock_snapshots) against
+Product.stock, the same check the API runs on its
+INVENTORY_SNAPSHOT_INTERVAL_SECONDS schedule.
+
+Products without any movement get an opening balance. Differences are
+listed; with --apply each one is recorded as a reconciliation movement so
+the ledger agrees with Product.stock again. --snapshot also folds recent
+movements into the snapshots first.
+"""
+import argparse
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from beanie import init_beanie
+from models import Product, StockMovement, StockSnapshot
+from services.inventory import reconcile, take_snapshots
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+async def main(args):
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    db_name = os.getenv("DATABASE_NAME", "babadairy")
+    client = AsyncIOMotorClient(mongodb_url)
+    await init_beanie(database=client[db_name], document_models=[Product, StockMovement, StockSnapshot])
+
+    if args.snapshot:
+        result = await take_snapshots()
+        print(f"Snapshots updated for {result['products']} products (as of {result['as_of']})")
+    result = await reconcile(apply=args.apply)
+    print(f"Opening balances recorded: {result['opening_balances']}")
+    if not result["drift"]:
+        print("Ledger matches Product.stock for every product.")
+        return
+    print(f"{'product':<30}{'Product.stock':>15}{'ledger':>10}{'diff':>8}")
+    for row in result["drift"]:
+        diff = row["product_stock"] - row["ledger_stock"]
+        print(f"{row['name'][:29]:<30}{row['product_stock']:>15}{row['ledger_stock']:>10}{diff:>+8}")
+    print("Recorded as reconciliation movements." if args.apply else "Run with --apply to record corrections.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", action="store_true", help="Record reconciliation movements for differences")
+    parser.add_argument("--snapshot", action="store_true", help="Update the snapshots first")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,83 @@
+"""
+Script to recompute product rating aggregates (rating_sum, review_count, rating)
+from the reviews collection in a single aggregation pass.
+
+Products that predate the reviews API (static rating/review_count, no
+rating_sum) get their sum seeded from the shown average on their first
+review, so this is only needed to rebuild the aggregates from the actual
+reviews or when they are suspected to have drifted.
+
+Products without any review document keep their aggregates unless they
+came from reviews (rating_sum set), i.e. their reviews were all deleted;
+pass --reset-seeded to also zero the seeded static ratings.
+"""
+import argparse
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from beanie import init_beanie
+from pymongo import UpdateOne
+from models import Product, Review
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BATCH_SIZE = 500
+
+
+async def repair_ratings(reset_seeded: bool = False):
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    db_name = os.getenv("DATABASE_NAME", "babadairy")
+    client = AsyncIOMotorClient(mongodb_url)
+    await init_beanie(database=client[db_name], document_models=[Product, Review])
+
+    pipeline = [
+        {"$group": {
+            "_id": "$product_id",
+            "rating_sum": {"$sum": "$rating"},
+            "review_count": {"$sum": 1},
+        }},
+    ]
+    products = Product.get_motor_collection()
+    reviewed_ids = []
+    ops = []
+    updated = 0
+    async for row in Review.get_motor_collection().aggregate(pipeline):
+        count = row["review_count"]
+        rating_sum = row["rating_sum"]
+        reviewed_ids.append(row["_id"])
+        ops.append(UpdateOne(
+            {"_id": row["_id"]},
+            {"$set": {
+                "rating_sum": rating_sum,
+                "review_count": count,
+                "rating": round(rating_sum / count, 2) if count else 0,
+            }},
+        ))
+        if len(ops) >= BATCH_SIZE:
+            result = await products.bulk_write(ops, ordered=False)
+            updated += result.modified_count
+            ops = []
+    if ops:
+        result = await products.bulk_write(ops, ordered=False)
+        updated += result.modified_count
+
+    # Products without any review get zeroed aggregates, seeded ratings only on request
+    unreviewed = {"_id": {"$nin": reviewed_ids}}
+    if not reset_seeded:
+        unreviewed["rating_sum"] = {"$gt": 0}
+    reset = await products.update_many(
+        unreviewed,
+        {"$set": {"rating_sum": 0, "review_count": 0, "rating": 0}},
+    )
+
+    print(f"Products with reviews: {len(reviewed_ids)} ({updated} updated)")
+    print(f"Products reset to no reviews: {reset.modified_count}")
+    print("Rating repair complete!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reset-seeded", action="store_true",
+                        help="Also zero products whose rating was seeded rather than computed from reviews")
+    asyncio.run(repair_ratings(parser.parse_args().reset_seeded))
@@ -0,0 +1,114 @@
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+import models
+import database
+from services.auth import require_admin_token
+from services import segmentation
+from services.jobs import current_run
+import logging
+
+# Customer names, contacts and spend: admin only (X-Admin-Token)
+router = APIRouter(
+    prefix="/analytics",
+    tags=["analytics"],
+    dependencies=[Depends(require_admin_token)],
+    responses={404: {"description": "Not found"}},
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _segments_collection():
+    # Precomputed by the segmentation job; reading a slightly old copy is fine
+    db = models.Order.get_motor_collection().database
+    return db[segmentation.SEGMENTS_COLLECTION].with_options(read_preference=database.READ_PREFERENCES["analytics"])
+
+
+async def _current_run_id() -> Optional[str]:
+    """Run id of the segmentation results to serve (None before the first run)."""
+    run = await current_run(segmentation.SEGMENTS_COLLECTION, database.READ_PREFERENCES["analytics"])
+    return run["run_id"] if run else None
+
+
+def _segment_to_response(doc: dict) -> dict:
+    return {
+        "user_id": doc["user_id"],
+        "segment": doc.get("segment"),
+        "recency_days": doc.get("recency_days"),
+        "frequency": doc.get("frequency", 0),
+        "monetary": doc.get("monetary", 0),
+        "rfm": doc.get("rfm"),
+        "computed_at": doc["computed_at"].isoformat() if doc.get("computed_at") else None,
+    }
+
+
+@router.get("/segments")
+async def read_segments():
+    """Customer count, revenue and average order count per RFM segment."""
+    try:
+        run_id = await _current_run_id()
+        rows = await _segments_collection().aggregate([
+            {"$match": {"run_id": run_id}},
+            {"$group": {
+                "_id": "$segment",
+                "customers": {"$sum": 1},
+                "monetary": {"$sum": "$monetary"},
+                "avg_frequency": {"$avg": "$frequency"},
+                "computed_at": {"$max": "$computed_at"},
+            }},
+        ]).to_list(length=None)
+    except Exception as e:
+        logger.error(f"Error fetching customer segments: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to fetch segments: {str(e)}")
+    by_name = {row["_id"]: row for row in rows}
+    computed = [row["computed_at"] for row in rows if row.get("computed_at")]
+    return {
+        "computed_at": max(computed).isoformat() if computed else None,
+        "segments": [
+            {
+                "segment": name,
+                "customers": by_name.get(name, {}).get("customers", 0),
+                "monetary": round(by_name.get(name, {}).get("monetary", 0), 2),
+                "avg_frequency": round(by_name.get(name, {}).get("avg_frequency") or 0, 2),
+            }
+            for name in segmentation.SEGMENTS
+        ],
+        "job": segmentation.segmentation_job.status(),
+    }
+
+
+@router.get("/segments/{segment}")
+async def read_segment_customers(segment: str, skip: int = 0, limit: int = 100):
+    """Customers of one segment, highest spend first, with their contact details (for campaigns)."""
+    if segment not in segmentation.SEGMENTS:
+        raise HTTPException(status_code=404, detail=f"Unknown segment; expected one of {', '.join(segmentation.SEGMENTS)}")
+    safe_limit = max(1, min(limit, 1000))
+    query = {"run_id": await _current_run_id(), "segment": segment}
+    cursor = _segments_collection().find(query).sort("monetary", -1).skip(skip).limit(safe_limit)
+    customers = [_segment_to_response(doc) async for doc in cursor]
+    users = database.collection_for(models.User, "analytics").find(
+        {"_id": {"$in": [c["user_id"] for c in customers]}}, {"name": 1, "email": 1, "phone": 1},
+    )
+    contacts = {doc["_id"]: doc async for doc in users}
+    for customer in customers:
+        contact = contacts.get(customer["user_id"], {})
+        customer.update(name=contact.get("name"), email=contact.get("email"), phone=contact.get("phone"))
+    return customers
+
+
+@router.get("/customers/{user_id}/segment")
+async def read_customer_segment(user_id: str):
+    doc = await _segments_collection().find_one({"run_id": await _current_run_id(), "user_id": user_id})
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Customer has no segment yet")
+    return _segment_to_response(doc)
+
+
+@router.post("/segments/refresh")
+async def refresh_segments():
+    """Run the segmentation job now; returns its report (orders, customers, timings, rows/s)."""
+    try:
+        return await segmentation.run_segmentation()
+    except Exception as e:
+        logger.error(f"Customer segmentation failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Segmentation failed: {str(e)}")
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, HTTPException
+import schemas
+from services import pricing
+import logging
+
+router = APIRouter(
+    prefix="/cart",
+    tags=["cart"],
+    responses={404: {"description": "Not found"}},
+)
+
+logger = logging.getLogger(__name__)
+
+
+@router.post("/quote")
+async def quote_cart(cart: schemas.CartQuoteRequest):
+    """
+    Price a cart on the server: size pricing, discounts, tax and delivery from
+    the current settings, with per-line totals and any availability issues.
+    All products are loaded in one query.
+    """
+    try:
+        return await pricing.quote(cart.items)
+    except Exception as e:
+        logger.error(f"Error quoting cart: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to price cart: {str(e)}")
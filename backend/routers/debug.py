@@ -0,0 +1,104 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+from typing import Optional
+from services.auth import require_admin_token
+from services.slow_queries import slow_query_log, SLOW_QUERY_MS
+from services import profiling, memory
+import models
+import asyncio
+
+router = APIRouter(
+    prefix="/debug",
+    tags=["debug"],
+    dependencies=[Depends(require_admin_token)],
+)
+
+
+@router.get("/slow-queries")
+async def read_slow_queries():
+    """Worst MongoDB operations above the slow threshold, slowest first, with sampled explain output."""
+    return {"threshold_ms": SLOW_QUERY_MS, "operations": slow_query_log.worst()}
+
+
+@router.delete("/slow-queries")
+async def clear_slow_queries():
+    slow_query_log.clear()
+    return {"message": "Slow query log cleared"}
+
+
+class ProfileSampling(BaseModel):
+    route: str  # route template, e.g. "/products/"
+    every_n: int = 1
+
+
+@router.get("/profiles")
+async def read_profiles():
+    """Stored request profiles (newest first) and the routes currently armed for sampling."""
+    return {
+        "profiler": "pyinstrument" if profiling._Pyinstrument else "cProfile",
+        "sampling": profiling.route_sampling,
+        "profiles": profiling.list_profiles(),
+    }
+
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str):
+    path = profiling.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=name)
+
+
+@router.put("/profiles/sampling")
+async def arm_profile_sampling(sampling: ProfileSampling):
+    """Profile 1-in-N requests of a route until disarmed."""
+    profiling.arm_route(sampling.route, sampling.every_n)
+    return {"sampling": profiling.route_sampling}
+
+
+@router.delete("/profiles/sampling")
+async def disarm_profile_sampling(route: str):
+    profiling.disarm_route(route)
+    return {"sampling": profiling.route_sampling}
+
+
+@router.get("/memory")
+async def read_memory_stats():
+    """RSS, live document model instances, GC generation stats and tracemalloc status."""
+    return {
+        "rss_bytes": memory.rss_bytes(),
+        "live_instances": memory.live_instances([models.Product, models.Order, models.User, models.Review]),
+        "gc": memory.gc_stats(),
+        "tracemalloc": memory.tracing_status(),
+    }
+
+
+@router.post("/memory/tracemalloc/start")
+async def start_tracemalloc(frames: int = 1):
+    memory.start_tracing(frames)
+    return memory.tracing_status()
+
+
+@router.post("/memory/tracemalloc/stop")
+async def stop_tracemalloc():
+    memory.stop_tracing()
+    return memory.tracing_status()
+
+
+@router.post("/memory/snapshot")
+async def take_memory_snapshot(limit: int = 25):
+    """Take a tracemalloc snapshot; the previous one is kept as the diff baseline."""
+    try:
+        return await asyncio.to_thread(memory.take_snapshot, limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/memory/diff")
+async def read_memory_diff(limit: int = 25):
+    """Top allocation sites by growth since the previous snapshot."""
+    try:
+        return {"sites": await asyncio.to_thread(memory.diff_snapshots, limit)}
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
@@ -0,0 +1,34 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+import database
+import asyncio
+from services.invalidation import bus
+
+router = APIRouter(tags=["health"])
+
+# Upper bound for the readiness ping so a hung Mongo can't stall the probe
+READINESS_PING_TIMEOUT_SECONDS = 2.0
+
+
+@router.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz():
+    """
+    Readiness: Mongo is reachable and the pool is warmed up.
+    Returns 503 until startup has connected, or when a ping fails.
+    """
+    body = {"status": "ready", "pool": database.pool_stats.snapshot(), "invalidation": bus.status()}
+    if not database.ready or database.client is None:
+        body.update(status="starting", error=database.last_error)
+        return JSONResponse(status_code=503, content=body)
+    try:
+        await asyncio.wait_for(database.client.admin.command("ping"), READINESS_PING_TIMEOUT_SECONDS)
+    except Exception as e:
+        body.update(status="unavailable", error=str(e) or type(e).__name__)
+        return JSONResponse(status_code=503, content=body)
+    return body
@@ -1,9 +1,16 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from typing import List, Any
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Any, Optional
 import models, schemas
-from services.notification import send_email_notification, send_whatsapp_notification
+import database
+from services.auth import require_admin_token
+from routers.products import _product_to_response
+from services import inventory, invoices, order_archive, order_items, pricing, product_events, recommendations
+from services.notification import send_email_notification, send_whatsapp_notification, queue_notification
+from services.idempotency import run_idempotent, request_fingerprint, IdempotencyKeyReused, IdempotencyInProgress
 from uuid import uuid4
 import datetime
+import logging
 
 router = APIRouter(
     prefix="/orders",
@@ -11,6 +18,8 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+logger = logging.getLogger(__name__)
+
 
 def _safe_id(obj: Any, default: str = None) -> str:
     """Get string id from Beanie doc; avoid None/ObjectId serialization errors."""
@@ -46,64 +55,183 @@ def _order_to_response(o: Any) -> dict:
     }
 
 
-async def update_product_stock(items: list, decrease: bool = True):
+async def update_product_stock(items: list, decrease: bool = True, reason: str = None, reference: str = None):
     """
     Update product stock based on order items.
     decrease=True: Decrease stock (when order is placed)
     decrease=False: Increase stock (when order is cancelled)
+    Each change is an atomic increment recorded in the stock ledger under `reason`.
     """
+    reason = reason or ("order_placed" if decrease else "order_cancelled")
     for item in items:
         product_id = item.get("productId") or item.get("product_id")
         quantity = item.get("quantity", 1)
         
         if product_id:
-            product = await models.Product.find_one(models.Product.id == product_id)
+            delta = -quantity if decrease else quantity
+            product = await inventory.apply_stock_change(product_id, delta, reason, reference=reference)
             if product:
-                if decrease:
-                    # Decrease stock
-                    new_stock = max(0, product.stock - quantity)
-                else:
-                    # Increase stock (restore on cancellation)
-                    new_stock = product.stock + quantity
-                
-                product.stock = new_stock
-                await product.save()
-                print(f"Stock updated for {product.name}: {product.stock + quantity if decrease else product.stock - quantity} -> {new_stock}")
+                product_events.publish(product_id, _product_to_response(database.from_mongo(models.Product, product)))
+                logger.debug(f"Stock updated for {product.get('name')}: {delta:+d} -> {product['stock']}")
 
 @router.get("/", response_model=List[schemas.Order])
 async def read_orders(skip: int = 0, limit: int = 100, user_id: str = None):
-    query = models.Order.find_all()
-    if user_id:
-        query = models.Order.find(models.Order.user_id == user_id)
-    
-    orders = await query.sort("-created_at").skip(skip).limit(limit).to_list()
-    return [_order_to_response(ord) for ord in orders]
+    """
+    Orders, newest first. Pages that reach past the hot collection continue
+    with archived (older, completed) orders.
+    """
+    # Primary for both: a customer reads their orders back right after checkout, and the
+    # admin list is reloaded right after a status change (exports use the analytics profile)
+    query = {"user_id": user_id} if user_id else {}
+    hot = models.Order.get_motor_collection()
+    archive = order_archive.archive_collection()
+
+    limit = max(1, limit)
+    docs = await hot.find(query).sort("created_at", -1).skip(skip).limit(limit).to_list(length=limit)
+    if len(docs) < limit:
+        # Only the archive part of the page needs the hot total
+        hot_total = skip + len(docs) if docs else await hot.count_documents(query)
+        archive_skip = max(0, skip - hot_total)
+        cursor = archive.find(query).sort("created_at", -1).skip(archive_skip).limit(limit - len(docs))
+        docs += await cursor.to_list(length=limit - len(docs))
+    return [_order_to_response(database.from_mongo(models.Order, doc)) for doc in docs]
+
+@router.get("/invoices", dependencies=[Depends(require_admin_token)])
+async def download_invoices(from_date: str = Query(..., alias="from"), to_date: str = Query(..., alias="to")):
+    """
+    Zip of the invoices of all non-cancelled orders created between `from`
+    and `to` (YYYY-MM-DD, both inclusive), archived orders included. Cached
+    invoices are reused; missing ones are rendered on the way. Admin only
+    (X-Admin-Token), as the invoices carry customer names and addresses.
+    """
+    try:
+        start = datetime.date.fromisoformat(from_date)
+        end = datetime.date.fromisoformat(to_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="from and to must be dates (YYYY-MM-DD)")
+    if end < start:
+        raise HTTPException(status_code=400, detail="to must not be before from")
+
+    query = {
+        "created_at": {"$gte": start.isoformat(), "$lt": (end + datetime.timedelta(days=1)).isoformat()},
+        "status": {"$ne": "cancelled"},
+    }
+    orders = []
+    for collection in (database.collection_for(models.Order, "analytics"),
+                       order_archive.archive_collection("analytics")):
+        cursor = collection.find(query).sort("created_at", 1).limit(invoices.INVOICE_BULK_MAX_ORDERS + 1)
+        orders += [_order_to_response(database.from_mongo(models.Order, doc)) async for doc in cursor]
+    if len(orders) > invoices.INVOICE_BULK_MAX_ORDERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"More than {invoices.INVOICE_BULK_MAX_ORDERS} orders in range; request a shorter period",
+        )
+    orders.sort(key=lambda o: o["created_at"])
+    filename = f"invoices_{start.isoformat()}_{end.isoformat()}.zip"
+    return StreamingResponse(
+        invoices.stream_invoice_zip(orders),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 @router.get("/{order_id}", response_model=schemas.Order)
 async def read_order(order_id: str):
     order = await models.Order.find_one(models.Order.id == order_id)
     if order is None:
-        raise HTTPException(status_code=404, detail="Order not found")
+        doc = await order_archive.find_archived_order(order_id)
+        if doc is None:
+            raise HTTPException(status_code=404, detail="Order not found")
+        order = database.from_mongo(models.Order, doc)
     return _order_to_response(order)
 
+@router.get("/{order_id}/invoice")
+async def read_order_invoice(order_id: str):
+    """Invoice of one order as an HTML document (cached after the first render)."""
+    order = await read_order(order_id)
+    try:
+        html = await invoices.get_invoice(order)
+    except Exception as e:
+        logger.error(f"Error rendering invoice for order {order_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to render invoice: {str(e)}")
+    return Response(
+        content=html,
+        media_type="text/html; charset=utf-8",
+        headers={"Content-Disposition": f'inline; filename="{invoices.invoice_filename(order)}"'},
+    )
+
 @router.post("/", response_model=schemas.Order)
-async def create_order(order: schemas.OrderCreate, background_tasks: BackgroundTasks):
+async def create_order(
+    order: schemas.OrderCreate,
+    background_tasks: BackgroundTasks,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    """
+    Create an order and decrement stock.
+    With an Idempotency-Key header, retries of the same request return the
+    original response instead of creating a duplicate order.
+    """
+    if not idempotency_key:
+        return await _create_order(order, background_tasks)
+    try:
+        return await run_idempotent(
+            "orders:create",
+            idempotency_key,
+            request_fingerprint(order.model_dump()),
+            lambda: _create_order(order, background_tasks),
+        )
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except IdempotencyInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+async def _create_order(order: schemas.OrderCreate, background_tasks: BackgroundTasks) -> dict:
     order_id = getattr(order, "id", None) or str(uuid4())
     try:
         order_dict = order.model_dump() if hasattr(order, "model_dump") else order.dict()
     except AttributeError:
         order_dict = order.dict()
     order_dict["id"] = order_id
+
+    # Re-price the cart with the same engine as /cart/quote instead of trusting client totals
+    products = await pricing.load_pricing([pid for pid in map(pricing.item_product_id, order.items) if pid])
+    cart_quote = await pricing.quote(order.items, products)
+    if cart_quote["issues"]:
+        logger.warning(f"Order {order_id} has lines that cannot be priced or fulfilled",
+                       extra={"issues": cart_quote["issues"]})
+        if pricing.ORDER_TOTALS_CHECK == "enforce":
+            raise HTTPException(
+                status_code=422,
+                detail={"message": "Some items are unavailable or exceed the available stock",
+                        "issues": cart_quote["issues"], "quote": cart_quote},
+            )
+    mismatches = pricing.total_mismatches(order_dict, cart_quote)
+    if mismatches:
+        logger.warning(f"Order {order_id} totals differ from server pricing", extra={"mismatches": mismatches})
+        if pricing.ORDER_TOTALS_CHECK == "enforce":
+            raise HTTPException(
+                status_code=422,
+                detail={"message": "Order totals do not match current prices", "mismatches": mismatches,
+                        "quote": cart_quote},
+            )
+
+    # Store (and take stock for) the lines the server priced, not the client's item objects:
+    # lines the quote dropped as unavailable or with an invalid quantity never reach the order
+    unit_prices = {(line["product_id"], line["size"]): line["unit_price"] for line in cart_quote["lines"]}
+    order_dict["items"] = order_items.compact_items(cart_quote["lines"], products, unit_prices)
+
     new_order = models.Order(**order_dict)
     await new_order.insert()
 
-    if order.items:
-        await update_product_stock(order.items, decrease=True)
+    if order_dict["items"]:
+        await update_product_stock(order_dict["items"], decrease=True, reference=order_id)
+    recommendations.add_order(order_id, order_dict["items"])
 
     user_email = order.customer.get("email")
     if user_email:
-        background_tasks.add_task(
-            send_email_notification, 
+        queue_notification(
+            background_tasks,
+            send_email_notification,
             to_email=user_email, 
             subject=f"Order Confirmation #{new_order.order_number}", 
             body=f"Thank you for your order! Your Order ID is {new_order.order_number}."
@@ -111,22 +239,27 @@ async def create_order(order: schemas.OrderCreate, background_tasks: BackgroundT
     
     user_phone = order.customer.get("phone")
     if user_phone:
-        background_tasks.add_task(
+        queue_notification(
+            background_tasks,
             send_whatsapp_notification,
             to_phone=user_phone,
             message=f"Order #{new_order.order_number} confirmed! Total: ₹{new_order.total}"
         )
 
-    return _order_to_response(new_order)
+    response = _order_to_response(new_order)
+    if invoices.needs_invoice({}, response):
+        background_tasks.add_task(invoices.pregenerate, response)
+    return response
 
 @router.put("/{order_id}", response_model=schemas.Order)
-async def update_order(order_id: str, order: schemas.OrderUpdate):
+async def update_order(order_id: str, order: schemas.OrderUpdate, background_tasks: BackgroundTasks):
     db_order = await models.Order.find_one(models.Order.id == order_id)
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
     update_data = order.dict(exclude_unset=True)
     old_status = db_order.status
+    before = {"status": db_order.status, "payment_status": db_order.payment_status}
     
     # Handle status history update
     if "status" in update_data and update_data["status"] != db_order.status:
@@ -145,22 +278,29 @@ async def update_order(order_id: str, order: schemas.OrderUpdate):
             # Restore stock
             if db_order.items:
                 items_list = [item.dict() if hasattr(item, 'dict') else item for item in db_order.items]
-                await update_product_stock(items_list, decrease=False)
-                print(f"Stock restored for cancelled order {order_id}")
+                await update_product_stock(items_list, decrease=False, reference=order_id)
+                recommendations.remove_order(order_id, items_list)
+                logger.info(f"Stock restored for cancelled order {order_id}")
         
         # If order is being un-cancelled (rare case, but handle it)
         elif old_status == "cancelled" and new_status != "cancelled":
             # Decrease stock again
             if db_order.items:
                 items_list = [item.dict() if hasattr(item, 'dict') else item for item in db_order.items]
-                await update_product_stock(items_list, decrease=True)
-                print(f"Stock decreased for reactivated order {order_id}")
+                await update_product_stock(items_list, decrease=True, reason="order_reopened", reference=order_id)
+                recommendations.add_order(order_id, items_list)
+                logger.info(f"Stock decreased for reactivated order {order_id}")
 
     for key, value in update_data.items():
         setattr(db_order, key, value)
+    # Also versions the cached invoice (keyed by updated_at)
+    db_order.updated_at = datetime.datetime.now().isoformat()
     
     await db_order.save()
-    return _order_to_response(db_order)
+    response = _order_to_response(db_order)
+    if invoices.needs_invoice(before, response):
+        background_tasks.add_task(invoices.pregenerate, response)
+    return response
 
 @router.delete("/{order_id}")
 async def delete_order(order_id: str):
@@ -171,8 +311,9 @@ async def delete_order(order_id: str):
     # Restore stock if order wasn't already cancelled
     if db_order.status != "cancelled" and db_order.items:
         items_list = [item.dict() if hasattr(item, 'dict') else item for item in db_order.items]
-        await update_product_stock(items_list, decrease=False)
-        print(f"Stock restored for deleted order {order_id}")
+        await update_product_stock(items_list, decrease=False, reason="order_deleted", reference=order_id)
+        recommendations.remove_order(order_id, items_list)
+        logger.info(f"Stock restored for deleted order {order_id}")
     
     await db_order.delete()
     return {"message": "Order deleted successfully"}
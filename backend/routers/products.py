@@ -1,6 +1,15 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Any
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from typing import List, Any, Optional
+from pymongo import ReturnDocument
 import models, schemas
+import database
+from services import forecasting, inventory, product_events, recommendations
+from services.catalog import (
+    CATALOG_CACHE_CONTROL, CATALOG_VERSIONED_CACHE_CONTROL, CatalogCache, negotiate_encoding,
+)
+from services.auth import require_admin_token
+from services.search import product_index
+from services.suggest import SUGGEST_MAX_LIMIT, suggestion_index
 from uuid import uuid4
 import logging
 from datetime import datetime
@@ -51,25 +60,175 @@ def _product_to_response(p: Any) -> dict:
     }
 
 
+async def _load_catalog() -> List[dict]:
+    products = await models.Product.find(models.Product.status != "inactive").to_list()
+    return [_product_to_response(p) for p in products]
+
+
+catalog_cache = CatalogCache(_load_catalog)
+
+PRODUCT_FIELDS = frozenset(schemas.Product.model_fields)
+BATCH_MAX_IDS = 500
+# Fields the admin product form writes; rating, review_count and rating_sum belong to the review endpoints
+PRODUCT_EDIT_FIELDS = frozenset(schemas.ProductUpdate.model_fields)
+
+
+async def _batch_lookup(ids: List[str], fields: Optional[List[str]]) -> dict:
+    """
+    Products for `ids` in request order, `{"id": ..., "found": false}` for
+    unknown ids. Served from the catalog snapshot when it is up to date; the
+    rest (inactive products, or everything while a rebuild is pending) comes
+    from one $in query, projected to the requested fields.
+    """
+    wanted = [f for f in (fields or []) if f in PRODUCT_FIELDS]
+    wanted = (["id"] + [f for f in wanted if f != "id"]) if wanted else None
+    unique_ids = list(dict.fromkeys(ids))
+
+    found = {}
+    snapshot = catalog_cache.fresh
+    if snapshot is not None:
+        found = {pid: snapshot.by_id[pid] for pid in unique_ids if pid in snapshot.by_id}
+    missing = [pid for pid in unique_ids if pid not in found]
+    if missing:
+        projection = {f: 1 for f in wanted if f != "id"} if wanted else None
+        cursor = database.collection_for(models.Product, "catalog").find({"_id": {"$in": missing}}, projection)
+        async for doc in cursor:
+            product = _product_to_response(database.from_mongo(models.Product, doc))
+            found[product["id"]] = product
+
+    results = []
+    for pid in ids:
+        product = found.get(pid)
+        if product is None:
+            results.append({"id": pid, "found": False})
+        else:
+            results.append({f: product.get(f) for f in wanted} if wanted else product)
+    return {"results": results, "missing": [pid for pid in unique_ids if pid not in found]}
+
+
 @router.get("/", response_model=List[schemas.Product])
 async def read_products(skip: int = 0, limit: int = 1000):
     """
     Get all products with pagination.
     Default limit is 1000 to support large product catalogs.
     Use skip and limit for pagination if needed.
+    Read from the primary: this is the admin listing, re-fetched right after edits.
     """
     try:
         safe_limit = min(limit, 10000)
-        products = await models.Product.find_all().skip(skip).limit(safe_limit).to_list()
-        return [_product_to_response(pr) for pr in products]
+        cursor = database.collection_for(models.Product, "primary").find({}).skip(skip).limit(safe_limit)
+        return [_product_to_response(database.from_mongo(models.Product, doc)) async for doc in cursor]
     except Exception as e:
         logger.error(f"Error fetching products: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to fetch products: {str(e)}")
 
+@router.get("/catalog", response_model=List[schemas.Product])
+async def read_catalog(request: Request, v: Optional[str] = None):
+    """
+    All active products, served from a pre-serialized, pre-compressed snapshot
+    (rebuilt in the background after product writes). Negotiates br/gzip via
+    Accept-Encoding and answers If-None-Match with 304. Pass the
+    X-Catalog-Version of a previous response as `v` to get an immutable URL.
+    """
+    try:
+        snapshot = await catalog_cache.get()
+    except Exception as e:
+        logger.error(f"Error building catalog snapshot: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to fetch catalog: {str(e)}")
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), snapshot.bodies)
+    headers = {
+        "ETag": snapshot.etag(encoding),
+        "Cache-Control": CATALOG_VERSIONED_CACHE_CONTROL if v == snapshot.digest else CATALOG_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+        "X-Catalog-Version": snapshot.digest,
+    }
+    if snapshot.matches(request.headers.get("if-none-match", "")):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=snapshot.bodies[encoding], media_type="application/json", headers=headers)
+
+
+@router.get("/search")
+async def search_products(q: str, skip: int = 0, limit: int = 20, fields: Optional[str] = None):
+    """
+    Ranked full-text search (BM25 with typo tolerance) over name, description,
+    ingredients, flavors and category of active products.
+    `fields` is an optional comma-separated projection of the result fields.
+    """
+    safe_limit = max(1, min(limit, 100))
+    wanted = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    return product_index.search(q, skip=max(0, skip), limit=safe_limit, fields=wanted)
+
+
+@router.get("/suggest")
+async def suggest_products(prefix: str = "", limit: int = 8):
+    """
+    Autocomplete for the search box: product names, categories and flavors
+    starting with `prefix` (at any word), most popular first.
+    """
+    return suggestion_index.suggest(prefix, limit=max(1, min(limit, SUGGEST_MAX_LIMIT)))
+
+
+@router.get("/batch")
+async def read_products_batch(ids: str = "", fields: Optional[str] = None):
+    """
+    Several products in one request: `ids` and the optional `fields`
+    projection are comma-separated. Results follow the order of `ids`; unknown
+    ids come back as `{"id": ..., "found": false}` and are listed in `missing`.
+    Use POST /products/batch for lists too long for a URL.
+    """
+    id_list = [i.strip() for i in ids.split(",") if i.strip()]
+    wanted = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    return await _read_batch(id_list, wanted)
+
+
+@router.post("/batch")
+async def read_products_batch_post(batch: schemas.ProductBatchRequest):
+    """Same as GET /products/batch with the ids (and fields) in the body."""
+    return await _read_batch(batch.ids, batch.fields)
+
+
+async def _read_batch(ids: List[str], fields: Optional[List[str]]) -> dict:
+    if len(ids) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_IDS} ids per batch")
+    try:
+        return await _batch_lookup(ids, fields)
+    except Exception as e:
+        logger.error(f"Error fetching product batch: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to fetch products: {str(e)}")
+
+
+@router.get("/reorder-report", dependencies=[Depends(require_admin_token)])
+async def read_reorder_report(only_reorder: bool = False, limit: int = 500):
+    """
+    Demand forecast per active product (exponential smoothing over daily unit
+    sales, refreshed by the forecast job) against current stock: days until
+    stockout, suggested low-stock threshold and reorder quantity. Soonest
+    stockout first; `only_reorder` keeps the products at or below their
+    suggested threshold.
+    """
+    try:
+        return await forecasting.reorder_report(only_reorder=only_reorder, limit=max(1, min(limit, 5000)))
+    except Exception as e:
+        logger.error(f"Error building reorder report: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to build reorder report: {str(e)}")
+
+
 @router.get("/{product_id}", response_model=schemas.Product)
 async def read_product(product_id: str):
+    """
+    Served from the catalog snapshot while it is up to date, otherwise from
+    the primary, so a product re-fetched right after a write is never older
+    than the write (a secondary could still return the previous version).
+    """
+    snapshot = catalog_cache.fresh
+    if snapshot is not None and product_id in snapshot.by_id:
+        return snapshot.by_id[product_id]
     try:
-        product = await models.Product.find_one(models.Product.id == product_id)
+        doc = await database.collection_for(models.Product, "primary").find_one({"_id": product_id})
+        product = database.from_mongo(models.Product, doc) if doc is not None else None
         if product is None:
             raise HTTPException(status_code=404, detail="Product not found")
         return _product_to_response(product)
@@ -95,12 +254,10 @@ async def create_product(product: schemas.ProductCreate):
             if existing_product:
                 # Product exists, update it instead
                 logger.info(f"Product with ID {product_id} already exists, updating instead of creating")
-                for key, value in product_data.items():
-                    if key != 'id' and hasattr(existing_product, key):  # Don't update ID
-                        setattr(existing_product, key, value)
-                existing_product.updated_at = datetime.now().isoformat()
-                await existing_product.save()
-                return _product_to_response(existing_product)
+                response = await _apply_product_edit(existing_product, product_data, "product re-created")
+                if response is not None:
+                    product_events.publish(response["id"], response)
+                    return response
 
         # Generate new ID if not provided or if it doesn't exist
         if not product_id:
@@ -110,7 +267,10 @@ async def create_product(product: schemas.ProductCreate):
         new_product.created_at = datetime.now().isoformat()
         new_product.updated_at = datetime.now().isoformat()
         await new_product.insert()
-        return _product_to_response(new_product)
+        await inventory.record_opening_balance(new_product.id, new_product.stock)
+        response = _product_to_response(new_product)
+        product_events.publish(response["id"], response)
+        return response
     except Exception as e:
         logger.error(f"Error creating product: {e}", exc_info=True)
         # Check if it's a duplicate key error
@@ -131,19 +291,11 @@ async def update_product(product_id: str, product: schemas.ProductUpdate):
         except AttributeError:
             update_data = product.dict(exclude_unset=True)
         
-        # Remove 'id' from update_data to prevent changing the ID
-        update_data.pop('id', None)
-        
-        # Update fields
-        for key, value in update_data.items():
-            if hasattr(db_product, key) and key != 'id':  # Don't allow ID changes
-                setattr(db_product, key, value)
-        
-        # Update timestamp
-        db_product.updated_at = datetime.now().isoformat()
-        
-        await db_product.save()
-        return _product_to_response(db_product)
+        response = await _apply_product_edit(db_product, update_data, "product edit")
+        if response is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        product_events.publish(response["id"], response)
+        return response
     except HTTPException:
         raise
     except Exception as e:
@@ -153,6 +305,93 @@ async def update_product(product_id: str, product: schemas.ProductUpdate):
             raise HTTPException(status_code=409, detail=f"Duplicate key error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to update product: {str(e)}")
 
+async def _apply_product_edit(db_product: models.Product, data: dict, note: str) -> Optional[dict]:
+    """
+    $set the edited fields that differ from `db_product` (never the id or the
+    review aggregates), so concurrent writes to other fields survive; a stock
+    change goes through inventory.apply_stock_change. Returns the product
+    response, or None if the product was deleted meanwhile.
+    """
+    changes = {k: v for k, v in data.items() if k in PRODUCT_EDIT_FIELDS and getattr(db_product, k, None) != v}
+    stock = changes.pop("stock", None)
+    changes["updated_at"] = datetime.now().isoformat()
+    doc = await models.Product.get_motor_collection().find_one_and_update(
+        {"_id": db_product.id}, {"$set": changes}, return_document=ReturnDocument.AFTER,
+    )
+    if doc is not None and stock is not None:
+        # Stock typed into the product form is applied as an atomic adjustment relative to the stock
+        # the edit started from, so order decrements landing meanwhile are kept and the ledger matches
+        doc = await inventory.apply_stock_change(db_product.id, int(stock) - int(db_product.stock or 0), "adjustment",
+                                                 note=note)
+    if doc is None:
+        return None
+    return _product_to_response(database.from_mongo(models.Product, doc))
+
+@router.post("/{product_id}/stock", response_model=schemas.Product)
+async def adjust_stock(product_id: str, adjustment: schemas.StockAdjustment):
+    """Add or remove stock atomically (restock or manual adjustment), recorded in the stock ledger."""
+    if adjustment.reason not in inventory.MANUAL_REASONS:
+        raise HTTPException(status_code=400, detail=f"reason must be one of {', '.join(inventory.MANUAL_REASONS)}")
+    try:
+        product = await inventory.apply_stock_change(product_id, adjustment.delta, adjustment.reason,
+                                                     note=adjustment.note)
+    except Exception as e:
+        logger.error(f"Error adjusting stock of product {product_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to adjust stock: {str(e)}")
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    response = _product_to_response(database.from_mongo(models.Product, product))
+    product_events.publish(product_id, response)
+    return response
+
+@router.get("/{product_id}/stock-history")
+async def read_stock_history(product_id: str, limit: int = 50, before: Optional[str] = None):
+    """
+    Stock movements of a product, newest first, with the current stock and
+    what the ledger (snapshot + later movements) says it should be. Page with
+    `before` = created_at of the last movement seen.
+    """
+    try:
+        before_at = datetime.fromisoformat(before) if before else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="before must be an ISO timestamp")
+    product = await models.Product.find_one(models.Product.id == product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    try:
+        return {
+            "product_id": product_id,
+            "stock": product.stock,
+            "ledger": await inventory.ledger_stock(product_id),
+            "movements": await inventory.stock_history(product_id, limit=max(1, min(limit, 500)), before=before_at),
+        }
+    except Exception as e:
+        logger.error(f"Error fetching stock history of product {product_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to fetch stock history: {str(e)}")
+
+@router.get("/{product_id}/related")
+async def read_related_products(product_id: str, limit: int = 8):
+    """
+    "Frequently bought together": products most often ordered with this one
+    (cosine-ranked co-occurrence), topped up with popular products of the same
+    category when there is not enough order history.
+    """
+    try:
+        snapshot = await catalog_cache.get()
+        product = snapshot.by_id.get(product_id)
+        if product is None:
+            doc = await database.collection_for(models.Product, "catalog").find_one({"_id": product_id}, {"category": 1})
+            if doc is None:
+                raise HTTPException(status_code=404, detail="Product not found")
+            product = doc
+        return recommendations.related_products(product_id, product.get("category"), snapshot.by_id,
+                                                max(1, min(limit, 50)))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching related products of {product_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to fetch related products: {str(e)}")
+
 @router.delete("/{product_id}")
 async def delete_product(product_id: str):
     try:
@@ -161,6 +400,7 @@ async def delete_product(product_id: str):
             raise HTTPException(status_code=404, detail="Product not found")
         
         await db_product.delete()
+        product_events.publish(product_id, None)
         return {"message": "Product deleted successfully"}
     except HTTPException:
         raise
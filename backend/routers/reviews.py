@@ -0,0 +1,135 @@
+from fastapi import APIRouter, HTTPException
+from typing import List, Any
+from pymongo import ReturnDocument
+import models, schemas
+import database
+from routers.products import _product_to_response
+from services import product_events
+from uuid import uuid4
+import logging
+import datetime
+
+router = APIRouter(
+    prefix="/reviews",
+    tags=["reviews"],
+    responses={404: {"description": "Not found"}},
+)
+
+logger = logging.getLogger(__name__)
+
+MIN_RATING = 1
+MAX_RATING = 5
+
+
+def _review_to_response(r: Any) -> dict:
+    """Build response dict for Review schema; safe id and dates."""
+    return {
+        "id": str(getattr(r, "id", None) or uuid4()),
+        "product_id": getattr(r, "product_id", "") or "",
+        "user_id": getattr(r, "user_id", "") or "",
+        "user_name": getattr(r, "user_name", "") or "",
+        "rating": int(getattr(r, "rating", 0) or 0),
+        "title": getattr(r, "title", "") or "",
+        "comment": getattr(r, "comment", "") or "",
+        "images": getattr(r, "images", []) or [],
+        "verified": bool(getattr(r, "verified", False)),
+        "created_at": getattr(r, "created_at", "") or "",
+    }
+
+
+# Products that predate the reviews API carry a static rating/review_count and no
+# rating_sum (or the model default 0); their sum is seeded from the shown average.
+_RATING_SUM = {"$cond": [
+    {"$and": [
+        {"$gt": [{"$ifNull": ["$review_count", 0]}, 0]},
+        {"$lte": [{"$ifNull": ["$rating_sum", 0]}, 0]},
+    ]},
+    {"$multiply": [{"$ifNull": ["$rating", 0]}, "$review_count"]},
+    {"$ifNull": ["$rating_sum", 0]},
+]}
+
+
+async def apply_rating_delta(product_id: str, rating_delta: float, count_delta: int) -> None:
+    """
+    Adjust a product's running rating sum and review count and store the
+    derived average, all in one atomic pipeline update, so concurrent reviews
+    can neither lose an increment nor leave a stale average behind.
+    """
+    collection = models.Product.get_motor_collection()
+    updated = await collection.find_one_and_update(
+        {"_id": product_id},
+        [
+            {"$set": {"rating_sum": _RATING_SUM}},
+            {"$set": {
+                "rating_sum": {"$add": ["$rating_sum", rating_delta]},
+                "review_count": {"$max": [0, {"$add": [{"$ifNull": ["$review_count", 0]}, count_delta]}]},
+            }},
+            {"$set": {"rating": {"$cond": [
+                {"$gt": ["$review_count", 0]},
+                {"$round": [{"$divide": ["$rating_sum", "$review_count"]}, 2]},
+                0,
+            ]}}},
+        ],
+        return_document=ReturnDocument.AFTER,
+    )
+    if updated is None:
+        return
+    # Rating and review count are part of the catalog and search/suggest ranking
+    product_events.publish(product_id, _product_to_response(database.from_mongo(models.Product, updated)))
+
+
+@router.get("/", response_model=List[schemas.Review])
+async def read_reviews(product_id: str, skip: int = 0, limit: int = 20):
+    """
+    Get reviews for a product, newest first.
+    Served by the (product_id, created_at) index, so pages never scan other products' reviews.
+    """
+    safe_limit = max(1, min(limit, 100))
+    cursor = (
+        database.collection_for(models.Review, "catalog")
+        .find({"product_id": product_id})
+        .sort("created_at", -1)
+        .skip(skip)
+        .limit(safe_limit)
+    )
+    return [_review_to_response(database.from_mongo(models.Review, doc)) async for doc in cursor]
+
+
+@router.post("/", response_model=schemas.Review)
+async def create_review(review: schemas.ReviewCreate):
+    if review.rating < MIN_RATING or review.rating > MAX_RATING:
+        raise HTTPException(status_code=400, detail=f"Rating must be between {MIN_RATING} and {MAX_RATING}")
+
+    product = await models.Product.find_one(models.Product.id == review.product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    review_data = review.model_dump()
+    review_data["id"] = review_data.get("id") or str(uuid4())
+    new_review = models.Review(**review_data)
+    new_review.created_at = datetime.datetime.now().isoformat()
+    try:
+        await new_review.insert()
+    except Exception as e:
+        if "Duplicate key" in str(e) or "11000" in str(e):
+            raise HTTPException(status_code=409, detail="Review with this ID already exists")
+        logger.error(f"Error creating review: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to create review: {str(e)}")
+
+    await apply_rating_delta(new_review.product_id, new_review.rating, 1)
+    return _review_to_response(new_review)
+
+
+@router.delete("/{review_id}")
+async def delete_review(review_id: str):
+    # find_one_and_delete guarantees that only one of several concurrent deletes
+    # gets the document back, so the aggregate is decremented exactly once.
+    deleted = await models.Review.get_motor_collection().find_one_and_delete(
+        {"_id": review_id},
+        projection={"product_id": 1, "rating": 1},
+    )
+    if deleted is None:
+        raise HTTPException(status_code=404, detail="Review not found")
+
+    await apply_rating_delta(deleted["product_id"], -(deleted.get("rating", 0) or 0), -1)
+    return {"message": "Review deleted successfully"}
@@ -2,10 +2,19 @@ from fastapi import APIRouter, HTTPException
 from models import SiteSettings
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
+from pymongo import ReturnDocument
+import database
+from services.logging_config import log_payload
+from services.suggest import suggestion_index
+from services.settings_cache import SETTINGS_ID, settings_cache
+from services.invalidation import TOPIC_SETTINGS, bus
 import datetime
+import logging
 
 router = APIRouter(prefix="/settings", tags=["settings"])
 
+logger = logging.getLogger(__name__)
+
 
 class SettingsUpdate(BaseModel):
     # Store Info
@@ -79,69 +88,84 @@ class SettingsUpdate(BaseModel):
     # Notifications
     enable_notifications: Optional[bool] = None
 
+    # Version the client last read; when given, the update is rejected (409) if someone saved since
+    version: Optional[int] = None
+
 
 @router.get("/")
 async def get_settings():
     """Get site settings (creates default if not exists)"""
-    settings = await SiteSettings.find_one(SiteSettings.id == "site_settings")
-    if not settings:
-        # Create default settings
-        settings = SiteSettings(id="site_settings")
-        await settings.insert()
+    settings = await settings_cache.get()
     return settings.model_dump()
 
 
 @router.put("/")
 async def update_settings(update_data: SettingsUpdate):
-    """Update site settings (admin only)"""
+    """
+    Update site settings (admin only).
+    Only the fields present in the request are written, in one atomic
+    find_one_and_update that also bumps `version`; concurrent saves of
+    different sections no longer overwrite each other. Send the `version`
+    from GET /settings/ to be rejected with 409 if someone saved since.
+    """
     try:
-        settings = await SiteSettings.find_one(SiteSettings.id == "site_settings")
-        if not settings:
-            settings = SiteSettings(id="site_settings")
-            await settings.insert()
-        
         # Get all fields from the update request (including None values)
         update_dict = update_data.model_dump(exclude_unset=True)
+        expected_version = update_dict.pop("version", None)
         
-        # Log what we're trying to update
-        print(f"[Settings] Updating fields: {list(update_dict.keys())}")
+        # Log what we're trying to update (values only at DEBUG)
+        logger.info("Updating settings", extra={"fields": list(update_dict.keys()), "expected_version": expected_version})
+        log_payload(logger, "Settings update payload", update_dict)
         
         # Update only provided fields (skip None values)
         update_fields = {}
         for key, value in update_dict.items():
             if value is not None:  # Only update non-None values
-                if hasattr(settings, key):
+                if key in SiteSettings.model_fields:
                     update_fields[key] = value
-                    setattr(settings, key, value)
-                    print(f"[Settings] Updated {key} = {value}")
                 else:
-                    print(f"[Settings] Warning: Field {key} does not exist in SiteSettings model")
+                    logger.warning(f"Field {key} does not exist in SiteSettings model")
         
         # Always update the timestamp
-        settings.updated_at = datetime.datetime.now().isoformat()
-        update_fields["updated_at"] = settings.updated_at
-        
-        # Save to database using save() method
-        try:
-            await settings.save()
-            print(f"[Settings] Successfully saved settings to database using save()")
-        except Exception as save_error:
-            print(f"[Settings] save() failed: {save_error}, trying replace()")
-            # If save() fails, try replace()
-            await settings.replace()
-            print(f"[Settings] Successfully saved settings to database using replace()")
-        
-        # Verify the save by fetching again
-        saved_settings = await SiteSettings.find_one(SiteSettings.id == "site_settings")
-        if saved_settings:
-            print(f"[Settings] Verification: store_name = {saved_settings.store_name}")
-        
+        update_fields["updated_at"] = datetime.datetime.now().isoformat()
+
+        query = {"_id": SETTINGS_ID}
+        if expected_version is not None:
+            # Documents written before versioning have no field, which matches version 0
+            query["version"] = expected_version if expected_version else {"$in": [0, None]}
+        # First save on an empty database: create the document with defaults for everything else
+        defaults = {
+            k: v for k, v in SiteSettings(id=SETTINGS_ID).model_dump().items()
+            if k not in update_fields and k not in ("id", "version", "revision_id")
+        }
+        doc = await SiteSettings.get_motor_collection().find_one_and_update(
+            query,
+            {"$set": update_fields, "$inc": {"version": 1}, "$setOnInsert": defaults},
+            upsert=expected_version is None,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            current = await SiteSettings.get_motor_collection().find_one({"_id": SETTINGS_ID}, {"version": 1})
+            if current is None:
+                raise HTTPException(status_code=404, detail="Settings not found")
+            raise HTTPException(
+                status_code=409,
+                detail={
+                    "message": "Settings were changed by someone else; reload and try again",
+                    "current_version": current.get("version", 0),
+                },
+            )
+
+        settings = database.from_mongo(SiteSettings, doc)
+        settings_cache.set(settings)
+        bus.announce(TOPIC_SETTINGS, SETTINGS_ID)
+        if "product_flavors" in update_fields:
+            suggestion_index.set_site_flavors(settings.product_flavors)
         return settings.model_dump()
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"[Settings] Error updating settings: {str(e)}")
-        print(f"[Settings] Error type: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"Error updating settings ({type(e).__name__}): {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to update settings: {str(e)}")
 
 
@@ -158,17 +182,7 @@ def _safe_get(settings, attr, default=None):
 async def get_public_settings():
     """Get public settings (for frontend display)"""
     try:
-        settings = await SiteSettings.find_one(SiteSettings.id == "site_settings")
-        if not settings:
-            settings = SiteSettings(id="site_settings")
-            try:
-                await settings.insert()
-            except Exception as insert_err:
-                # Document might already exist (e.g. race), fetch again
-                print(f"[Settings] insert said: {insert_err}")
-                settings = await SiteSettings.find_one(SiteSettings.id == "site_settings")
-                if not settings:
-                    raise
+        settings = await settings_cache.get()
         # Build response with safe defaults so missing/null DB fields don't crash
         return {
             "storeName": _safe_get(settings, "store_name", "Baba Dairy"),
@@ -211,8 +225,6 @@ async def get_public_settings():
             "footerText": _safe_get(settings, "footer_text", "© 2024 Baba Dairy. All rights reserved."),
         }
     except Exception as e:
-        print(f"[Settings] get_public_settings error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"get_public_settings error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to load settings: {str(e)}")
 
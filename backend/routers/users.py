@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from typing import List
 import models, schemas
+import database
 from uuid import uuid4
 
 router = APIRouter(
@@ -11,8 +12,9 @@ router = APIRouter(
 
 @router.get("/", response_model=List[schemas.User])
 async def read_users(skip: int = 0, limit: int = 100):
-    users = await models.User.find_all().skip(skip).limit(limit).to_list()
-    return [_user_to_response(u) for u in users]
+    # Admin listing; may be served by a secondary and never needs password hashes
+    cursor = database.collection_for(models.User, "analytics").find({}, {"password": 0}).skip(skip).limit(limit)
+    return [_user_to_response(database.from_mongo(models.User, doc)) async for doc in cursor]
 
 @router.get("/{user_id}", response_model=schemas.User)
 async def read_user(user_id: str):
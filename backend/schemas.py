@@ -19,8 +19,7 @@ class ProductBase(BaseModel):
     nutrition: Optional[Dict[str, Any]] = {}
     status: Optional[str] = "active"
     featured: Optional[bool] = False
-    rating: Optional[float] = 0
-    review_count: Optional[int] = 0
+    # rating / review_count are maintained by the review endpoints; product writes can't set them
 
 class ProductCreate(ProductBase):
     id: Optional[str] = None 
@@ -30,11 +29,20 @@ class ProductUpdate(ProductBase):
 
 class Product(ProductBase):
     id: str
-    rating: float
-    review_count: int
+    rating: float = 0
+    review_count: int = 0
     created_at: str
     updated_at: str
 
+class ProductBatchRequest(BaseModel):
+    ids: List[str]
+    fields: Optional[List[str]] = None
+
+class StockAdjustment(BaseModel):
+    delta: int  # positive to add stock, negative to remove
+    reason: str = "restock"  # restock | adjustment
+    note: str = ""
+
 # User Schemas
 class UserBase(BaseModel):
     name: str
@@ -56,6 +64,15 @@ class User(UserBase):
     joined_at: str
 
 # Order Schemas
+class OrderItemSnapshot(BaseModel):
+    """What an order keeps of each line (key names as sent by the storefront)."""
+    productId: str
+    name: str
+    size: Optional[str] = None
+    price: float  # unit price paid
+    quantity: int
+    thumbnail: Optional[str] = None  # image URL; inline data: images are not copied
+
 class OrderBase(BaseModel):
     order_number: str
     user_id: str
@@ -86,6 +103,10 @@ class Order(OrderBase):
     created_at: str
     updated_at: str
 
+# Cart Schemas
+class CartQuoteRequest(BaseModel):
+    items: List[Dict[str, Any]]  # [{productId, size, quantity}, ...] as in order items
+
 # Review Schemas
 class ReviewBase(BaseModel):
     product_id: str
@@ -0,0 +1,38 @@
+"""
+Run the API with several uvicorn worker processes.
+
+Each worker has its own in-memory caches (search/suggest indexes, catalog
+snapshot, settings, co-occurrence model), so with more than one worker the
+cross-worker invalidation bus is switched on (INVALIDATION_BUS=auto unless
+set). Background jobs (archival, stock snapshots, segmentation, forecasts,
+co-occurrence rescans) run in whichever worker holds the job's lease, not in
+all of them.
+Per-process diagnostics (/metrics, /debug/*) describe whichever worker
+answered the request.
+
+Usage (from backend/):
+  python serve.py                       # WEB_CONCURRENCY or one worker per CPU
+  python serve.py --workers 4 --port 8000
+"""
+import argparse
+import os
+import uvicorn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Inherited by the worker processes, read when they import the app
+        os.environ.setdefault("INVALIDATION_BUS", "auto")
+    print(f"Starting {args.workers} worker(s) on {args.host}:{args.port} "
+          f"(invalidation bus: {os.getenv('INVALIDATION_BUS', 'off')})")
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, proxy_headers=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""
+Admin authentication for the operator endpoints (/debug, /analytics, bulk
+invoice download, reorder report): a shared secret in the X-Admin-Token
+header. The endpoints answer 404 while ADMIN_API_TOKEN is unset.
+"""
+from fastapi import Header, HTTPException
+from typing import Optional
+import hmac
+import os
+
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None, alias="X-Admin-Token")):
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
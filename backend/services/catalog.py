@@ -0,0 +1,172 @@
+"""
+Pre-serialized, pre-compressed snapshot of the active catalog.
+
+The storefront loads every active product on each visit. Instead of streaming
+the collection from Mongo and re-encoding it per request, the JSON body is
+built once, compressed with gzip and (when installed) brotli, and hashed for
+a strong ETag. Product writes mark the snapshot dirty and schedule a rebuild
+in the background, debounced and coalesced so that a steady stream of writes
+(every order changes stock) rebuilds at most once per
+CATALOG_REBUILD_MIN_INTERVAL_SECONDS. Until it finishes the previous snapshot
+keeps being served, so staleness is bounded by that interval plus one rebuild.
+"""
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+CATALOG_REBUILD_DEBOUNCE_SECONDS = float(os.getenv("CATALOG_REBUILD_DEBOUNCE_SECONDS", "1"))
+CATALOG_REBUILD_MIN_INTERVAL_SECONDS = float(os.getenv("CATALOG_REBUILD_MIN_INTERVAL_SECONDS", "15"))
+# Moderate levels: nearly the ratio of the maximum at a fraction of the CPU per rebuild
+CATALOG_GZIP_LEVEL = int(os.getenv("CATALOG_GZIP_LEVEL", "6"))
+CATALOG_BROTLI_QUALITY = int(os.getenv("CATALOG_BROTLI_QUALITY", "5"))
+# Unversioned URL: browsers/CDNs reuse it for a while, then revalidate cheaply with the ETag
+CATALOG_CACHE_CONTROL = os.getenv("CATALOG_CACHE_CONTROL", "public, max-age=300, stale-while-revalidate=86400")
+# ?v=<version> URL: the content for a version never changes
+CATALOG_VERSIONED_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    bodies: Dict[str, bytes]  # content-coding ("identity", "gzip", "br") -> body
+    digest: str               # sha256 of the identity body
+    product_count: int
+    built_at: float
+    by_id: Dict[str, dict]    # product id -> response dict, for batch lookups
+
+    def etag(self, encoding: str) -> str:
+        # Strong validators must differ per representation
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+    def matches(self, if_none_match: str) -> bool:
+        """Whether an If-None-Match header names any representation of this snapshot."""
+        if if_none_match.strip() == "*":
+            return True
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag.strip('"').split("-", 1)[0] == self.digest:
+                return True
+        return False
+
+
+def encode_snapshot(products: List[dict]) -> CatalogSnapshot:
+    """CPU-bound: serialize and compress. Runs in the default executor."""
+    body = json.dumps(products, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=CATALOG_GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        bodies["br"] = brotli.compress(body, quality=CATALOG_BROTLI_QUALITY)
+    return CatalogSnapshot(
+        bodies=bodies,
+        digest=hashlib.sha256(body).hexdigest()[:32],
+        product_count=len(products),
+        built_at=time.time(),
+        by_id={p["id"]: p for p in products},
+    )
+
+
+def negotiate_encoding(accept_encoding: str, available) -> str:
+    """Pick the best available content-coding for an Accept-Encoding header (br > gzip > identity)."""
+    accepted: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+class CatalogCache:
+    """Holds the current snapshot and rebuilds it with `loader` after product writes."""
+
+    def __init__(self, loader: Callable[[], Awaitable[List[dict]]],
+                 debounce_seconds: float = CATALOG_REBUILD_DEBOUNCE_SECONDS,
+                 min_interval_seconds: float = CATALOG_REBUILD_MIN_INTERVAL_SECONDS):
+        self._loader = loader
+        self._debounce = debounce_seconds
+        self._min_interval = min_interval_seconds
+        self._last_build = float("-inf")  # time.monotonic() of the last build
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._dirty = False
+        self.snapshot: Optional[CatalogSnapshot] = None
+
+    async def _build(self) -> CatalogSnapshot:
+        start = time.perf_counter()
+        products = await self._loader()
+        snapshot = await asyncio.get_running_loop().run_in_executor(None, encode_snapshot, products)
+        self.snapshot = snapshot
+        self._last_build = time.monotonic()
+        logger.info(
+            f"Catalog snapshot rebuilt: {snapshot.product_count} products in "
+            f"{(time.perf_counter() - start) * 1000:.0f}ms",
+            extra={"sizes": {k: len(v) for k, v in snapshot.bodies.items()}},
+        )
+        return snapshot
+
+    async def refresh(self) -> CatalogSnapshot:
+        async with self._lock:
+            return await self._build()
+
+    async def get(self) -> CatalogSnapshot:
+        """Current snapshot; built on demand (once, for all waiting requests) if there is none."""
+        snapshot = self.snapshot
+        if snapshot is not None:
+            return snapshot
+        async with self._lock:
+            return self.snapshot or await self._build()
+
+    @property
+    def fresh(self) -> Optional[CatalogSnapshot]:
+        """The snapshot if no product write is waiting to be folded in, else None."""
+        if self._dirty or (self._task is not None and not self._task.done()):
+            return None
+        return self.snapshot
+
+    def on_product_changed(self, product_id: str, product: Optional[dict]) -> None:
+        """product_events listener: schedule a debounced, rate-limited rebuild."""
+        self._dirty = True
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            self._task = asyncio.get_running_loop().create_task(self._rebuild_when_quiet())
+        except RuntimeError:  # no running loop (scripts); drop the snapshot so the next get() rebuilds
+            self.snapshot = None
+
+    async def _rebuild_when_quiet(self) -> None:
+        while self._dirty:
+            # Writes arriving until the rebuild starts are folded into it
+            since_last = time.monotonic() - self._last_build
+            await asyncio.sleep(max(self._debounce, self._min_interval - since_last))
+            self._dirty = False
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Catalog snapshot rebuild failed: {e}", exc_info=True)
+                # Serve fresh data from Mongo on the next request rather than a stale snapshot
+                self.snapshot = None
+                return
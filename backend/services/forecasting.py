@@ -0,0 +1,305 @@
+"""
+Demand forecasting and reorder suggestions.
+
+A nightly job turns the last FORECAST_HISTORY_DAYS of non-cancelled orders
+into daily unit sales per product: MongoDB groups order items by (product,
+day), and the rollup is scattered into a products x days NumPy matrix (days
+without sales are 0). Simple exponential smoothing is then fitted to every
+product at once: the smoothing recursion steps through the days, each step
+updating all products for every candidate alpha, and each product keeps
+the alpha with the smallest one-step-ahead error.
+
+The smoothed level is the expected daily demand and the error spread sizes
+the safety stock. From those and the stock on hand follow days until
+stockout, a dynamic reorder point (to compare with the static
+Product.low_stock_threshold) and a suggested reorder quantity. Each run
+stores its forecasts in `demand_forecasts` under a new run id and then
+publishes the run (services.jobs.publish_run), so runs in several workers
+never mix; GET /products/reorder-report combines the current run with
+current stock. The job runs on FORECAST_INTERVAL_SECONDS
+(0 disables) and from forecast_demand.py.
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+import logging
+import os
+import time
+import numpy as np
+from pymongo import ASCENDING
+import database
+import models
+from services.jobs import PeriodicJob, current_run, publish_run
+from services.order_archive import ORDER_ARCHIVE_AFTER_DAYS, archive_collection
+
+logger = logging.getLogger(__name__)
+
+FORECAST_INTERVAL_SECONDS = float(os.getenv("FORECAST_INTERVAL_SECONDS", "86400"))
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "90"))
+# Days between placing a reorder and the stock arriving
+FORECAST_LEAD_TIME_DAYS = float(os.getenv("FORECAST_LEAD_TIME_DAYS", "7"))
+# Days of demand a reorder should cover beyond the lead time
+FORECAST_COVERAGE_DAYS = float(os.getenv("FORECAST_COVERAGE_DAYS", "14"))
+# Safety stock in standard deviations of daily demand (1.65 ~ 95% of lead times without a stockout)
+FORECAST_SERVICE_LEVEL_Z = float(os.getenv("FORECAST_SERVICE_LEVEL_Z", "1.65"))
+
+FORECASTS_COLLECTION = "demand_forecasts"
+# Candidate smoothing factors; low alphas follow slow-moving demand, high ones react to recent days
+SMOOTHING_ALPHAS = np.array([0.05, 0.1, 0.2, 0.3, 0.5])
+# Days averaged for the starting level
+WARMUP_DAYS = 7
+# Smoothed demand decays towards 0 but never reaches it after the last sale; below this
+# (one unit in about three years) a product counts as not selling
+MIN_DAILY_DEMAND = 1e-3
+# Stockouts further out than this are reported as not in sight (None)
+STOCKOUT_HORIZON_DAYS = 365
+
+
+def _sales_pipeline(since: str) -> List[dict]:
+    return [
+        {"$match": {"status": {"$ne": "cancelled"}, "created_at": {"$gte": since}}},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {
+                "product_id": {"$ifNull": ["$items.productId", "$items.product_id"]},
+                "day": {"$substrBytes": ["$created_at", 0, 10]},
+            },
+            "units": {"$sum": "$items.quantity"},
+        }},
+    ]
+
+
+async def load_daily_sales(product_ids: List[str], days: int = FORECAST_HISTORY_DAYS,
+                           today: Optional[date] = None) -> np.ndarray:
+    """Units sold per product (rows, in `product_ids` order) per day (columns, oldest first, ending today)."""
+    today = today or date.today()
+    start = today - timedelta(days=days - 1)
+    row_of = {product_id: i for i, product_id in enumerate(product_ids)}
+    sales = np.zeros((len(product_ids), days), dtype=np.float64)
+
+    collections = [database.collection_for(models.Order, "analytics")]
+    if days > ORDER_ARCHIVE_AFTER_DAYS:
+        collections.append(archive_collection("analytics"))
+    rows, cols, units = [], [], []
+    for collection in collections:
+        async for doc in collection.aggregate(_sales_pipeline(start.isoformat())):
+            row = row_of.get(doc["_id"]["product_id"])
+            if row is None:
+                continue  # deleted or inactive product
+            try:
+                day = (date.fromisoformat(doc["_id"]["day"]) - start).days
+            except (TypeError, ValueError):
+                continue
+            if 0 <= day < days:
+                rows.append(row)
+                cols.append(day)
+                units.append(doc["units"] or 0)
+    if rows:
+        np.add.at(sales, (np.array(rows), np.array(cols)), np.array(units, dtype=np.float64))
+    return sales
+
+
+def fit_exponential_smoothing(sales: np.ndarray, alphas: np.ndarray = SMOOTHING_ALPHAS) -> Dict[str, np.ndarray]:
+    """
+    Simple exponential smoothing of every row of `sales` for every alpha at
+    once. Returns per product the final level (forecast of daily demand), the
+    chosen alpha and the RMSE of its one-step-ahead forecasts.
+    """
+    products, days = sales.shape
+    if days == 0:
+        zeros = np.zeros(products)
+        return {"level": zeros, "alpha": np.full(products, alphas[0]), "rmse": zeros}
+    a = alphas[:, None]
+    level = np.tile(sales[:, :WARMUP_DAYS].mean(axis=1), (len(alphas), 1))
+    sse = np.zeros_like(level)
+    for t in range(days):
+        error = sales[:, t] - level
+        sse += error * error
+        level += a * error
+    best = sse.argmin(axis=0)
+    columns = np.arange(products)
+    return {
+        "level": level[best, columns],
+        "alpha": alphas[best],
+        "rmse": np.sqrt(sse[best, columns] / days),
+    }
+
+
+def reorder_plan(demand: np.ndarray, demand_std: np.ndarray, stock: np.ndarray,
+                 lead_time_days: float = FORECAST_LEAD_TIME_DAYS, coverage_days: float = FORECAST_COVERAGE_DAYS,
+                 service_level_z: float = FORECAST_SERVICE_LEVEL_Z) -> Dict[str, np.ndarray]:
+    """
+    Days until stockout (inf when not within STOCKOUT_HORIZON_DAYS), safety
+    stock, reorder point and suggested reorder quantity per product.
+    """
+    demand = np.where(demand < MIN_DAILY_DEMAND, 0.0, demand)
+    safety_stock = service_level_z * demand_std * np.sqrt(lead_time_days)
+    reorder_point = np.ceil(demand * lead_time_days + safety_stock)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_until_stockout = np.where(demand > 0, stock / demand, np.inf)
+    days_until_stockout[days_until_stockout > STOCKOUT_HORIZON_DAYS] = np.inf
+    order_up_to = demand * (lead_time_days + coverage_days) + safety_stock
+    needs_reorder = (demand > 0) & (stock <= reorder_point)
+    suggested = np.where(needs_reorder, np.ceil(np.maximum(order_up_to - stock, 0)), 0)
+    return {
+        "days_until_stockout": days_until_stockout,
+        "safety_stock": safety_stock,
+        "reorder_point": reorder_point,
+        "suggested_quantity": suggested,
+        "needs_reorder": needs_reorder,
+    }
+
+
+async def _load_products() -> Tuple[List[dict], np.ndarray]:
+    cursor = database.collection_for(models.Product, "analytics").find(
+        {"status": {"$ne": "inactive"}}, {"name": 1, "category": 1, "stock": 1, "low_stock_threshold": 1},
+    )
+    products = [doc async for doc in cursor]
+    stock = np.fromiter((int(p.get("stock") or 0) for p in products), dtype=np.float64, count=len(products))
+    return products, stock
+
+
+async def _write_forecasts(run_id: str, products: List[dict], fit: Dict[str, np.ndarray],
+                           plan: Dict[str, np.ndarray], units_sold: np.ndarray, computed_at: datetime) -> int:
+    collection = models.Product.get_motor_collection().database[FORECASTS_COLLECTION]
+    await collection.create_index([("run_id", ASCENDING)], name="run_id")
+    written = 0
+    rows = []
+    for i, product in enumerate(products):
+        rows.append({
+            "run_id": run_id,
+            "product_id": product["_id"],
+            "name": product.get("name", ""),
+            "category": product.get("category", ""),
+            "daily_demand": round(float(fit["level"][i]), 4),
+            "demand_std": round(float(fit["rmse"][i]), 4),
+            "alpha": float(fit["alpha"][i]),
+            "units_sold": int(units_sold[i]),
+            "reorder_point": int(plan["reorder_point"][i]),
+            "computed_at": computed_at,
+        })
+        if len(rows) >= 1000:
+            await collection.insert_many(rows, ordered=False)
+            written += len(rows)
+            rows = []
+    if rows:
+        await collection.insert_many(rows, ordered=False)
+        written += len(rows)
+    return written
+
+
+async def _publish_forecasts(run_id: str, computed_at: datetime) -> bool:
+    """Make this run the one the report reads, then drop superseded rows (or ours, if a newer run won)."""
+    collection = models.Product.get_motor_collection().database[FORECASTS_COLLECTION]
+    published, previous_at = await publish_run(FORECASTS_COLLECTION, run_id, computed_at)
+    if not published:
+        await collection.delete_many({"run_id": run_id})
+    elif previous_at is not None:
+        # Runs older than the one just replaced (which lagging readers may still use)
+        await collection.delete_many({"computed_at": {"$lt": previous_at}})
+    return published
+
+
+async def run_forecast() -> dict:
+    """Load sales, fit, plan and store forecasts for all active products; returns counts and timings."""
+    computed_at = datetime.utcnow().replace(microsecond=0)
+    start = time.perf_counter()
+    products, stock = await _load_products()
+    sales = await load_daily_sales([p["_id"] for p in products])
+    loaded = time.perf_counter()
+    fit = fit_exponential_smoothing(sales)
+    plan = reorder_plan(fit["level"], fit["rmse"], stock)
+    computed = time.perf_counter()
+    run_id = uuid4().hex
+    written = await _write_forecasts(run_id, products, fit, plan, sales.sum(axis=1), computed_at)
+    published = await _publish_forecasts(run_id, computed_at)
+    done = time.perf_counter()
+
+    report = {
+        "products": written,
+        "history_days": FORECAST_HISTORY_DAYS,
+        "needs_reorder": int(plan["needs_reorder"].sum()),
+        "seconds": {
+            "load": round(loaded - start, 3),
+            "compute": round(computed - loaded, 4),
+            "write": round(done - computed, 3),
+            "total": round(done - start, 3),
+        },
+        "computed_at": computed_at.isoformat(),
+        "run_id": run_id,
+        # False when a newer run finished first; this run's rows were discarded
+        "published": published,
+    }
+    logger.info(
+        f"Demand forecast: {written} products over {FORECAST_HISTORY_DAYS} days in {report['seconds']['total']}s "
+        f"(compute {report['seconds']['compute']}s), {report['needs_reorder']} need reordering"
+    )
+    return report
+
+
+def _finite(value: float, digits: int = 1) -> Optional[float]:
+    return round(float(value), digits) if np.isfinite(value) else None
+
+
+async def reorder_report(only_reorder: bool = False, limit: int = 500) -> dict:
+    """
+    Stored forecasts combined with current stock, soonest stockout first.
+    Products never sold in the history window sort last.
+    """
+    read_preference = database.READ_PREFERENCES["analytics"]
+    forecasts = models.Product.get_motor_collection().database[FORECASTS_COLLECTION].with_options(
+        read_preference=read_preference
+    )
+    run = await current_run(FORECASTS_COLLECTION, read_preference)
+    docs = await forecasts.find({"run_id": run["run_id"]}).to_list(length=None) if run else []
+    current = database.collection_for(models.Product, "catalog").find(
+        {"_id": {"$in": [d["product_id"] for d in docs]}}, {"stock": 1, "low_stock_threshold": 1},
+    )
+    products = {doc["_id"]: doc async for doc in current}
+    docs = [d for d in docs if d["product_id"] in products]
+
+    stock = np.fromiter((int(products[d["product_id"]].get("stock") or 0) for d in docs), dtype=np.float64,
+                        count=len(docs))
+    demand = np.fromiter((d["daily_demand"] for d in docs), dtype=np.float64, count=len(docs))
+    demand_std = np.fromiter((d["demand_std"] for d in docs), dtype=np.float64, count=len(docs))
+    plan = reorder_plan(demand, demand_std, stock)
+
+    today = date.today()
+    rows = []
+    for i in np.argsort(plan["days_until_stockout"], kind="stable"):
+        if only_reorder and not plan["needs_reorder"][i]:
+            continue
+        doc = docs[i]
+        days_left = plan["days_until_stockout"][i]
+        rows.append({
+            "product_id": doc["product_id"],
+            "name": doc.get("name", ""),
+            "category": doc.get("category", ""),
+            "stock": int(stock[i]),
+            "daily_demand": round(float(demand[i]), 2),
+            "demand_std": round(float(demand_std[i]), 2),
+            "units_sold": doc.get("units_sold", 0),
+            "days_until_stockout": _finite(days_left),
+            "stockout_date": (today + timedelta(days=int(days_left))).isoformat() if np.isfinite(days_left) else None,
+            "low_stock_threshold": int(products[doc["product_id"]].get("low_stock_threshold") or 10),
+            "suggested_threshold": int(plan["reorder_point"][i]),
+            "safety_stock": round(float(plan["safety_stock"][i]), 1),
+            "suggested_quantity": int(plan["suggested_quantity"][i]),
+            "needs_reorder": bool(plan["needs_reorder"][i]),
+        })
+        if len(rows) >= limit:
+            break
+    return {
+        "computed_at": run["computed_at"].isoformat() if run else None,
+        "parameters": {
+            "history_days": FORECAST_HISTORY_DAYS,
+            "lead_time_days": FORECAST_LEAD_TIME_DAYS,
+            "coverage_days": FORECAST_COVERAGE_DAYS,
+            "service_level_z": FORECAST_SERVICE_LEVEL_Z,
+        },
+        "products": rows,
+        "job": forecast_job.status(),
+    }
+
+
+forecast_job = PeriodicJob("demand_forecast", run_forecast, FORECAST_INTERVAL_SECONDS)
@@ -0,0 +1,201 @@
+"""
+Idempotency-Key support for non-idempotent endpoints (order creation).
+
+The first request for a key claims it by inserting a pending record into the
+TTL-indexed `idempotency_keys` collection, runs the handler, and stores the
+serialized response. Replays are answered from an in-process LRU, then from
+Mongo. Concurrent duplicates in the same worker await the first request's
+future; duplicates landing on another worker poll the pending record.
+
+A pending record is leased to the request executing it (lease_until, renewed
+while the handler runs). If that worker dies mid-request the lease runs out
+and the next retry takes the key over instead of getting 409 until the TTL.
+"""
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from uuid import uuid4
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from models import IdempotencyRecord
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 60 * 60)))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "1024"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+# A pending key whose holder has not renewed it for this long can be taken over
+IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "30"))
+_POLL_INTERVAL_SECONDS = 0.1
+
+
+class IdempotencyKeyReused(Exception):
+    """The key was already used with a different request body."""
+
+
+class IdempotencyInProgress(Exception):
+    """Another worker is still executing the request for this key."""
+
+
+# key -> (request_hash, response)
+_cache: "OrderedDict[str, Tuple[str, Any]]" = OrderedDict()
+# key -> (request_hash, future resolving to the response)
+_inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+
+def request_fingerprint(payload: Any) -> str:
+    """Stable hash of a request body, independent of key order."""
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _cache_get(key: str):
+    entry = _cache.get(key)
+    if entry is not None:
+        _cache.move_to_end(key)
+    return entry
+
+
+def _cache_put(key: str, request_hash: str, response: Any) -> None:
+    _cache[key] = (request_hash, response)
+    _cache.move_to_end(key)
+    while len(_cache) > IDEMPOTENCY_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def _check_hash(key: str, expected: str, actual: str) -> None:
+    if expected != actual:
+        raise IdempotencyKeyReused(f"Idempotency-Key {key!r} was already used with a different request")
+
+
+def _lease_until() -> datetime.datetime:
+    return datetime.datetime.utcnow() + datetime.timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)
+
+
+async def _take_over(key: str, owner: str) -> bool:
+    """Claim a pending key whose lease has run out (its holder died)."""
+    taken = await IdempotencyRecord.get_motor_collection().find_one_and_update(
+        # $not/$gte also matches records written before leases existed
+        {"_id": key, "status": "pending", "lease_until": {"$not": {"$gte": datetime.datetime.utcnow()}}},
+        {"$set": {"lease_owner": owner, "lease_until": _lease_until()}},
+        projection={"_id": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    return taken is not None
+
+
+async def _wait_for_completion(key: str, request_hash: str, owner: str) -> Optional[IdempotencyRecord]:
+    """
+    Poll a record claimed by another worker until it completes (returned),
+    is released (None) or its lease expires. In the last case the key is
+    taken over for `owner` and the still pending record is returned.
+    """
+    deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        record = await IdempotencyRecord.find_one(IdempotencyRecord.id == key)
+        if record is None or record.status == "completed":
+            return record
+        if record.lease_until is None or record.lease_until < datetime.datetime.utcnow():
+            _check_hash(key, record.request_hash, request_hash)
+            if await _take_over(key, owner):
+                return record
+        if asyncio.get_running_loop().time() >= deadline:
+            raise IdempotencyInProgress(f"Request for Idempotency-Key {key!r} is still in progress")
+        await asyncio.sleep(_POLL_INTERVAL_SECONDS)
+
+
+async def _renew_lease(key: str, owner: str) -> None:
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_LEASE_SECONDS / 3)
+        try:
+            await IdempotencyRecord.get_motor_collection().update_one(
+                {"_id": key, "status": "pending", "lease_owner": owner},
+                {"$set": {"lease_until": _lease_until()}},
+            )
+        except Exception as e:
+            logger.warning(f"Could not renew the lease on Idempotency-Key {key!r}: {e}")
+
+
+async def _execute(key: str, request_hash: str, handler: Callable[[], Awaitable[Any]]) -> Any:
+    now = datetime.datetime.utcnow()
+    owner = str(uuid4())
+    record = IdempotencyRecord(
+        id=key,
+        request_hash=request_hash,
+        lease_owner=owner,
+        lease_until=_lease_until(),
+        created_at=now,
+        expires_at=now + datetime.timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+    )
+    try:
+        await record.insert()
+    except DuplicateKeyError:
+        existing = await _wait_for_completion(key, request_hash, owner)
+        if existing is None:
+            # The other worker failed and released the key; claim it ourselves.
+            return await _execute(key, request_hash, handler)
+        if existing.status == "completed":
+            _check_hash(key, existing.request_hash, request_hash)
+            response = json.loads(existing.response) if existing.response else None
+            _cache_put(key, existing.request_hash, response)
+            return response
+        logger.warning(f"Took over Idempotency-Key {key!r} after its lease expired")
+
+    collection = IdempotencyRecord.get_motor_collection()
+    renewal = asyncio.create_task(_renew_lease(key, owner))
+    try:
+        response = await handler()
+    except Exception:
+        # Release the key so the client can retry after a failure.
+        await collection.delete_one({"_id": key, "status": "pending", "lease_owner": owner})
+        raise
+    finally:
+        renewal.cancel()
+
+    await collection.update_one(
+        {"_id": key, "lease_owner": owner},
+        {"$set": {"status": "completed", "response": json.dumps(response, default=str)},
+         "$unset": {"lease_owner": "", "lease_until": ""}},
+    )
+    _cache_put(key, request_hash, response)
+    return response
+
+
+async def run_idempotent(scope: str, idempotency_key: str, request_hash: str,
+                         handler: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Run `handler` at most once per (scope, idempotency_key) within the TTL and
+    return its response; repeated calls get the stored response back.
+    """
+    key = f"{scope}:{idempotency_key}"
+
+    cached = _cache_get(key)
+    if cached is not None:
+        _check_hash(key, cached[0], request_hash)
+        return cached[1]
+
+    inflight = _inflight.get(key)
+    if inflight is not None:
+        _check_hash(key, inflight[0], request_hash)
+        return await asyncio.shield(inflight[1])
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = (request_hash, future)
+    try:
+        response = await _execute(key, request_hash, handler)
+        future.set_result(response)
+        return response
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # mark retrieved; waiters (if any) still receive it
+        raise
+    finally:
+        _inflight.pop(key, None)
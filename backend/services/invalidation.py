@@ -0,0 +1,295 @@
+"""
+Cross-worker cache invalidation.
+
+Each worker process keeps in-memory state derived from Mongo (search and
+suggest indexes, catalog snapshot, settings, co-occurrence model). Writes
+made by one worker are applied locally right away; this bus tells the other
+workers. Products and settings are re-read on the receiving side; order
+changes travel as events in `order_basket_events` (order id, products, +1/-1)
+because the co-occurrence model needs the change, not the new state. Two
+transports:
+
+- change_streams: every worker watches the products, site_settings and
+  order_basket_events collections (needs a replica set or sharded
+  cluster). The write itself is the event, so nothing extra is written.
+- poll: writers bump a per-key version in the small `cache_versions`
+  collection and every worker polls it for versions it has not applied yet.
+  Works on a standalone mongod.
+
+INVALIDATION_BUS selects off (single process, default), change_streams,
+poll, or auto (change streams when the deployment supports them, otherwise
+polling; Azure Cosmos DB is polled because its change streams do not report
+deletes). Receivers re-read the changed documents and hand them to the
+handlers registered per topic. If events may have been missed (a change
+stream could not be resumed, or polling was down longer than its overlap
+window) the resync callbacks rebuild everything from Mongo.
+"""
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+import uuid
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+import models
+from services.jobs import WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_BUS = os.getenv("INVALIDATION_BUS", "off").lower()
+INVALIDATION_POLL_SECONDS = float(os.getenv("INVALIDATION_POLL_SECONDS", "1"))
+# Re-read window for versions written just before the previous poll (commit/visibility lag)
+INVALIDATION_POLL_OVERLAP_SECONDS = float(os.getenv("INVALIDATION_POLL_OVERLAP_SECONDS", "10"))
+INVALIDATION_RETRY_SECONDS = float(os.getenv("INVALIDATION_RETRY_SECONDS", "5"))
+# cache_versions entries are only needed for as long as a worker could be behind
+CACHE_VERSIONS_TTL_SECONDS = int(os.getenv("CACHE_VERSIONS_TTL_SECONDS", "86400"))
+
+CACHE_VERSIONS_COLLECTION = "cache_versions"
+# Co-occurrence updates of orders placed, cancelled, reopened or deleted (expire with cache_versions)
+ORDER_BASKET_EVENTS_COLLECTION = "order_basket_events"
+
+TOPIC_PRODUCTS = "products"
+TOPIC_SETTINGS = "settings"
+TOPIC_ORDER_BASKETS = "order_baskets"
+
+# Change stream resume token no longer in the oplog
+_HISTORY_LOST_CODES = (280, 286)
+
+# handler(key, current document or None when deleted)
+RemoteHandler = Callable[[str, Optional[dict]], None]
+
+
+def _topic_collections() -> Dict[str, object]:
+    return {
+        TOPIC_PRODUCTS: models.Product.get_motor_collection(),
+        TOPIC_SETTINGS: models.SiteSettings.get_motor_collection(),
+        TOPIC_ORDER_BASKETS: models.Order.get_motor_collection().database[ORDER_BASKET_EVENTS_COLLECTION],
+    }
+
+
+class InvalidationBus:
+
+    def __init__(self, mode: str = INVALIDATION_BUS):
+        self.requested_mode = mode
+        self.mode = "off"
+        self._handlers: Dict[str, List[RemoteHandler]] = {}
+        self._resync_callbacks: List[Callable[[], Awaitable[None]]] = []
+        self._tasks: List[asyncio.Task] = []
+        self._versions = None  # cache_versions collection (poll mode)
+        # cache_versions _id -> (applied version, its updated_at)
+        self._applied: Dict[str, Tuple[int, datetime]] = {}
+        self._since: Optional[datetime] = None
+        self.received = 0
+        self.last_event_at: Optional[float] = None
+
+    # --- registration -------------------------------------------------------------
+
+    def on_remote_change(self, topic: str, handler: RemoteHandler) -> None:
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def on_resync(self, callback: Callable[[], Awaitable[None]]) -> None:
+        self._resync_callbacks.append(callback)
+
+    # --- local writes ---------------------------------------------------------------
+
+    def announce(self, topic: str, key: str) -> None:
+        """A document behind `topic` was written by this worker."""
+        if self.mode != "poll":
+            return  # change streams see the write itself
+        try:
+            asyncio.get_running_loop().create_task(self._record(topic, key))
+        except RuntimeError:
+            logger.warning(f"No event loop to announce {topic}:{key}; other workers rely on their resync")
+
+    def forward_product_change(self, product_id: str, product: Optional[dict]) -> None:
+        """product_events forwarder."""
+        self.announce(TOPIC_PRODUCTS, product_id)
+
+    def forward_order_basket(self, order_id: str, products: List[str], sign: int) -> None:
+        """recommendations forwarder; receivers skip events whose origin is themselves."""
+        if self.mode == "off":
+            return
+        event = {
+            "_id": uuid.uuid4().hex,
+            "order_id": order_id,
+            "products": products,
+            "sign": sign,
+            "origin": WORKER_ID,
+            "created_at": datetime.utcnow(),
+        }
+        try:
+            asyncio.get_running_loop().create_task(self._publish_event(TOPIC_ORDER_BASKETS, event))
+        except RuntimeError:
+            logger.warning(f"No event loop to forward order {order_id}; other workers catch up on their resync")
+
+    async def _publish_event(self, topic: str, event: dict) -> None:
+        try:
+            await _topic_collections()[topic].insert_one(event)
+        except Exception as e:
+            logger.error(f"Failed to publish {topic} event {event['_id']}: {e}", exc_info=True)
+            return
+        # Every event has its own key, so none is coalesced with another
+        self.announce(topic, event["_id"])
+
+    async def _record(self, topic: str, key: str) -> None:
+        entry_id = f"{topic}:{key}"
+        try:
+            doc = await self._versions.find_one_and_update(
+                {"_id": entry_id},
+                {"$inc": {"version": 1}, "$set": {"topic": topic, "key": key}, "$currentDate": {"updated_at": True}},
+                upsert=True,
+                projection={"version": 1, "updated_at": 1},
+                return_document=ReturnDocument.AFTER,
+            )
+            # Already applied here; don't re-apply our own write when it is polled back
+            self._applied[entry_id] = (doc["version"], doc["updated_at"])
+        except Exception as e:
+            logger.error(f"Failed to announce {entry_id}: {e}", exc_info=True)
+
+    # --- lifecycle ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Pick the transport and start listening. Register before the caches are built."""
+        mode = self.requested_mode
+        if mode == "off":
+            return
+        collections = _topic_collections()
+        database = collections[TOPIC_PRODUCTS].database
+        await collections[TOPIC_ORDER_BASKETS].create_index(
+            "created_at", name="created_at_ttl", expireAfterSeconds=CACHE_VERSIONS_TTL_SECONDS
+        )
+        if mode == "auto":
+            # isMaster rather than hello: older servers and Cosmos DB understand it
+            hello = await database.client.admin.command("isMaster")
+            supports_streams = "setName" in hello or hello.get("msg") == "isdbgrid"
+            is_cosmos = hello.get("setName") == "globaldb"
+            mode = "change_streams" if supports_streams and not is_cosmos else "poll"
+
+        if mode == "change_streams":
+            # Streams open in the background; start them at "now" so writes made while
+            # the caches are being built are still delivered
+            start_at = (await database.command("ping")).get("operationTime")
+            for topic, collection in collections.items():
+                self._tasks.append(asyncio.create_task(self._watch(topic, collection, start_at)))
+        elif mode == "poll":
+            self._versions = database[CACHE_VERSIONS_COLLECTION]
+            await self._versions.create_index(
+                "updated_at", name="updated_at_ttl", expireAfterSeconds=CACHE_VERSIONS_TTL_SECONDS
+            )
+            # Baseline: whatever is already there is reflected in the caches about to be built
+            await self._poll_once(baseline=True)
+            self._tasks.append(asyncio.create_task(self._poll_loop()))
+        else:
+            raise ValueError(f"Unknown INVALIDATION_BUS mode: {mode}")
+        self.mode = mode
+        logger.info(f"Cache invalidation bus started ({mode})")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.mode = "off"
+
+    def status(self) -> dict:
+        return {
+            "mode": self.mode,
+            "received": self.received,
+            "seconds_since_last_event": (
+                round(time.monotonic() - self.last_event_at, 3) if self.last_event_at is not None else None
+            ),
+        }
+
+    # --- receiving ------------------------------------------------------------------
+
+    def _dispatch(self, topic: str, key: str, document: Optional[dict]) -> None:
+        self.received += 1
+        self.last_event_at = time.monotonic()
+        for handler in self._handlers.get(topic, []):
+            try:
+                handler(key, document)
+            except Exception as e:
+                logger.error(f"Invalidation handler for {topic}:{key} failed: {e}", exc_info=True)
+
+    async def _resync(self) -> None:
+        logger.warning("Invalidation events may have been missed; rebuilding caches from Mongo")
+        for callback in self._resync_callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"Resync callback {callback.__name__} failed: {e}", exc_info=True)
+
+    async def _watch(self, topic: str, collection, start_at=None) -> None:
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        token = None
+        while True:
+            position = {"resume_after": token} if token is not None else {"start_at_operation_time": start_at}
+            try:
+                async with collection.watch(pipeline, full_document="updateLookup", **position) as stream:
+                    async for change in stream:
+                        token = stream.resume_token
+                        key = str(change["documentKey"]["_id"])
+                        # updateLookup returns None when the document was deleted since
+                        document = None if change["operationType"] == "delete" else change.get("fullDocument")
+                        self._dispatch(topic, key, document)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                logger.error(f"Change stream on {collection.name} failed: {e}")
+                if e.code in _HISTORY_LOST_CODES:
+                    token = start_at = None
+                    await self._resync()
+            except Exception as e:
+                logger.error(f"Change stream on {collection.name} interrupted: {e}")
+            await asyncio.sleep(INVALIDATION_RETRY_SECONDS)
+
+    async def _poll_loop(self) -> None:
+        last_ok = time.monotonic()
+        while True:
+            await asyncio.sleep(INVALIDATION_POLL_SECONDS)
+            try:
+                await self._poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Polling {CACHE_VERSIONS_COLLECTION} failed: {e}")
+                continue
+            now = time.monotonic()
+            if now - last_ok > INVALIDATION_POLL_OVERLAP_SECONDS:
+                # Down for longer than the re-read window: versions may have been skipped
+                await self._resync()
+            last_ok = now
+
+    async def _poll_once(self, baseline: bool = False) -> None:
+        query = {}
+        if self._since is not None:
+            query = {"updated_at": {"$gte": self._since - timedelta(seconds=INVALIDATION_POLL_OVERLAP_SECONDS)}}
+        changed: Dict[str, List[str]] = {}
+        newest = self._since
+        projection = {"topic": 1, "key": 1, "version": 1, "updated_at": 1}
+        # Oldest first, so events of one order are delivered in the order they happened
+        async for doc in self._versions.find(query, projection).sort("updated_at", 1):
+            applied = self._applied.get(doc["_id"])
+            if applied is None or applied[0] != doc["version"]:
+                self._applied[doc["_id"]] = (doc["version"], doc["updated_at"])
+                if not baseline:
+                    changed.setdefault(doc["topic"], []).append(doc["key"])
+            if newest is None or doc["updated_at"] > newest:
+                newest = doc["updated_at"]
+        self._since = newest
+        if newest is not None:
+            horizon = newest - timedelta(seconds=2 * INVALIDATION_POLL_OVERLAP_SECONDS)
+            self._applied = {k: v for k, v in self._applied.items() if v[1] >= horizon}
+
+        collections = _topic_collections() if changed else {}
+        for topic, keys in changed.items():
+            if topic not in collections:
+                continue
+            documents = {str(d["_id"]): d async for d in collections[topic].find({"_id": {"$in": keys}})}
+            for key in keys:
+                self._dispatch(topic, key, documents.get(key))
+
+
+bus = InvalidationBus()
@@ -0,0 +1,232 @@
+"""
+Inventory ledger.
+
+Product.stock stays the fast counter the shop reads, but every change to it
+is also recorded as an insert-only StockMovement, so stock has a history
+and a bad write can be traced and corrected. Changes are applied with an
+atomic update (no read-modify-write), and the movement records the exact
+delta that was applied.
+
+Summing every movement would get slower forever, so a periodic job
+materializes a StockSnapshot per product: the sum of its movements up to
+`as_of`. Ledger stock = snapshot + movements after `as_of`. `as_of` trails
+the job by INVENTORY_SNAPSHOT_LAG_SECONDS so movements still being written
+are not skipped. A product's ledger starts with an opening balance, written
+when it is created or, for products that predate the ledger, right before
+their first recorded change. The job also reconciles the ledger against
+Product.stock: products without any movement get an opening balance, and
+other differences are reported (reconcile_stock.py can record corrections).
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+import logging
+import os
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import models
+from services.jobs import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("INVENTORY_SNAPSHOT_INTERVAL_SECONDS", "3600"))
+INVENTORY_SNAPSHOT_LAG_SECONDS = float(os.getenv("INVENTORY_SNAPSHOT_LAG_SECONDS", "60"))
+
+MOVEMENT_REASONS = (
+    "order_placed", "order_cancelled", "order_reopened", "order_deleted",
+    "restock", "adjustment", "opening_balance", "reconciliation",
+)
+# Reasons an admin can use through the API
+MANUAL_REASONS = ("restock", "adjustment")
+
+# Products known (in this process) to have an opening balance
+_opened: Set[str] = set()
+
+
+def _opening_id(product_id: str) -> str:
+    return f"opening:{product_id}"
+
+
+async def record_movement(product_id: str, delta: int, reason: str, reference: Optional[str] = None,
+                          note: str = "", stock_after: Optional[int] = None, movement_id: Optional[str] = None) -> bool:
+    """Insert a movement; a fixed `movement_id` makes it happen at most once. Returns whether it was recorded."""
+    if reason not in MOVEMENT_REASONS:
+        raise ValueError(f"Unknown stock movement reason {reason!r}")
+    if delta == 0 and reason != "opening_balance":
+        return False
+    if reason != "opening_balance" and stock_after is not None:
+        await ensure_opening_balance(product_id, stock_after - delta)
+    movement = models.StockMovement(
+        product_id=product_id, delta=delta, reason=reason, reference=reference, note=note, stock_after=stock_after,
+    )
+    if movement_id is not None:
+        movement.id = movement_id
+    try:
+        await movement.insert()
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def record_opening_balance(product_id: str, stock: int) -> bool:
+    """Starting point of a product's ledger (once per product)."""
+    recorded = await record_movement(product_id, stock, "opening_balance", stock_after=stock,
+                                     movement_id=_opening_id(product_id))
+    _opened.add(product_id)
+    return recorded
+
+
+async def ensure_opening_balance(product_id: str, stock_before: int) -> None:
+    """
+    Give a product that predates the ledger its opening balance before its
+    next movement: `stock_before` minus any movements already recorded
+    without one, so the ledger sums to Product.stock.
+    """
+    if product_id in _opened:
+        return
+    movements = models.StockMovement.get_motor_collection()
+    if await movements.find_one({"_id": _opening_id(product_id)}, {"_id": 1}) is None:
+        rows = await movements.aggregate([
+            {"$match": {"product_id": product_id}},
+            {"$group": {"_id": None, "delta": {"$sum": "$delta"}}},
+        ]).to_list(length=1)
+        await record_opening_balance(product_id, stock_before - (rows[0]["delta"] if rows else 0))
+    _opened.add(product_id)
+
+
+async def apply_stock_change(product_id: str, delta: int, reason: str, reference: Optional[str] = None,
+                             note: str = "") -> Optional[dict]:
+    """
+    Atomically add `delta` to Product.stock (never below 0) and record the
+    movement actually applied. Returns the updated product document, or None
+    if the product does not exist.
+    """
+    before = await models.Product.get_motor_collection().find_one_and_update(
+        {"_id": product_id},
+        [{"$set": {"stock": {"$max": [0, {"$add": [{"$ifNull": ["$stock", 0]}, delta]}]}}}],
+        return_document=ReturnDocument.BEFORE,
+    )
+    if before is None:
+        return None
+    old_stock = int(before.get("stock") or 0)
+    new_stock = max(0, old_stock + delta)
+    await record_movement(product_id, new_stock - old_stock, reason, reference, note, stock_after=new_stock)
+    return dict(before, stock=new_stock)
+
+
+async def ledger_stock(product_id: str) -> dict:
+    """Stock according to the ledger: latest snapshot plus the movements after it."""
+    snapshot = await models.StockSnapshot.find_one(models.StockSnapshot.id == product_id)
+    match = {"product_id": product_id}
+    if snapshot is not None:
+        match["created_at"] = {"$gt": snapshot.as_of}
+    rows = await models.StockMovement.get_motor_collection().aggregate([
+        {"$match": match},
+        {"$group": {"_id": None, "delta": {"$sum": "$delta"}, "count": {"$sum": 1}}},
+    ]).to_list(length=1)
+    recent = rows[0] if rows else {"delta": 0, "count": 0}
+    base = snapshot.stock if snapshot is not None else 0
+    return {
+        "stock": base + recent["delta"],
+        "snapshot_stock": base,
+        "snapshot_as_of": snapshot.as_of.isoformat() if snapshot is not None else None,
+        "movements_since_snapshot": recent["count"],
+    }
+
+
+async def stock_history(product_id: str, limit: int = 50, before: Optional[datetime] = None) -> List[dict]:
+    """Movements of a product, newest first; page with `before` = created_at of the last one seen."""
+    query = {"product_id": product_id}
+    if before is not None:
+        query["created_at"] = {"$lt": before}
+    cursor = models.StockMovement.get_motor_collection().find(query).sort("created_at", -1).limit(limit)
+    return [
+        {
+            "id": doc["_id"],
+            "delta": doc["delta"],
+            "reason": doc["reason"],
+            "reference": doc.get("reference"),
+            "note": doc.get("note", ""),
+            "stock_after": doc.get("stock_after"),
+            "created_at": doc["created_at"].isoformat(),
+        }
+        async for doc in cursor
+    ]
+
+
+async def take_snapshots() -> dict:
+    """Fold movements up to now - lag into each product's snapshot."""
+    as_of = datetime.utcnow() - timedelta(seconds=INVENTORY_SNAPSHOT_LAG_SECONDS)
+    movements = models.StockMovement.get_motor_collection()
+    snapshots = models.StockSnapshot.get_motor_collection()
+    previous = {doc["_id"]: doc async for doc in snapshots.find({})}
+    product_ids = await movements.distinct("product_id", {"created_at": {"$lte": as_of}})
+    updated = 0
+    for product_id in product_ids:
+        prev = previous.get(product_id)
+        window = {"$lte": as_of}
+        if prev is not None:
+            if prev["as_of"] >= as_of:
+                continue
+            window["$gt"] = prev["as_of"]
+        rows = await movements.aggregate([
+            {"$match": {"product_id": product_id, "created_at": window}},
+            {"$group": {"_id": None, "delta": {"$sum": "$delta"}, "count": {"$sum": 1}}},
+        ]).to_list(length=1)
+        if not rows:
+            continue
+        # Guarded on the previous as_of so two concurrent runs cannot both add the same window
+        try:
+            result = await snapshots.update_one(
+                {"_id": product_id, "as_of": prev["as_of"] if prev is not None else None},
+                {
+                    "$inc": {"stock": rows[0]["delta"], "movement_count": rows[0]["count"]},
+                    "$set": {"as_of": as_of, "updated_at": datetime.utcnow()},
+                },
+                upsert=prev is None,
+            )
+        except DuplicateKeyError:
+            continue  # another worker created it first
+        updated += 1 if (result.modified_count or result.upserted_id is not None) else 0
+    return {"as_of": as_of.isoformat(), "products": updated}
+
+
+async def reconcile(apply: bool = False) -> dict:
+    """
+    Compare ledger stock with Product.stock. Products with no movements get an
+    opening balance; other differences are returned, and recorded as
+    reconciliation movements (making the ledger agree with Product.stock)
+    when `apply` is set.
+    """
+    products = models.Product.get_motor_collection()
+    with_movements = set(await models.StockMovement.get_motor_collection().distinct("product_id"))
+    opened = 0
+    drift = []
+    async for product in products.find({}, {"stock": 1, "name": 1}):
+        product_id = product["_id"]
+        stock = int(product.get("stock") or 0)
+        if product_id not in with_movements:
+            opened += int(await record_opening_balance(product_id, stock))
+            continue
+        ledger = await ledger_stock(product_id)
+        if ledger["stock"] != stock:
+            drift.append({"product_id": product_id, "name": product.get("name", ""),
+                          "product_stock": stock, "ledger_stock": ledger["stock"]})
+            if apply:
+                await record_movement(product_id, stock - ledger["stock"], "reconciliation",
+                                      note="ledger corrected to Product.stock", stock_after=stock)
+    if drift:
+        logger.warning(f"Stock ledger differs from Product.stock for {len(drift)} products", extra={"drift": drift})
+    return {"opening_balances": opened, "drift": drift, "applied": apply}
+
+
+async def run_inventory_jobs() -> dict:
+    """Scheduled run: reconcile (report only), then update the snapshots."""
+    reconciliation = await reconcile()
+    return {
+        "snapshots": await take_snapshots(),
+        "opening_balances": reconciliation["opening_balances"],
+        "drift": len(reconciliation["drift"]),
+    }
+
+
+inventory_jobs = PeriodicJob("inventory", run_inventory_jobs, INVENTORY_SNAPSHOT_INTERVAL_SECONDS)
@@ -0,0 +1,153 @@
+"""
+Invoice HTML for an order, the server-side counterpart of
+src/utils/invoiceGenerator.ts with the store details (name, address, GSTIN)
+and tax rate taken from SiteSettings.
+
+Pure and import-light on purpose: it runs in worker processes
+(services.invoices) and only receives plain dicts.
+"""
+from datetime import datetime
+from html import escape
+from typing import Any, Dict
+
+STYLE = """
+* { margin: 0; padding: 0; box-sizing: border-box; }
+body { font-family: Arial, sans-serif; color: #4A2C2A; background: #fff; padding: 40px; line-height: 1.6; }
+.invoice-container { max-width: 800px; margin: 0 auto; border: 2px solid #e5e7eb; border-radius: 12px; overflow: hidden; }
+.header { background: linear-gradient(135deg, #FF6B9D 0%, #FFA726 100%); color: white; padding: 30px; text-align: center; }
+.header h1 { font-size: 32px; margin-bottom: 10px; }
+.header p { font-size: 14px; opacity: 0.9; }
+.invoice-info { display: flex; justify-content: space-between; padding: 30px; background: #f9fafb; border-bottom: 2px solid #e5e7eb; }
+.info-section { flex: 1; }
+.info-section h3, .customer-details h3 { font-size: 14px; color: #6b7280; margin-bottom: 10px; text-transform: uppercase; }
+.info-section p { font-size: 16px; font-weight: 600; margin-bottom: 5px; }
+.customer-details { padding: 30px; border-bottom: 2px solid #e5e7eb; }
+.customer-info { display: grid; grid-template-columns: repeat(2, 1fr); gap: 15px; font-size: 14px; color: #6b7280; }
+.customer-info strong { color: #4A2C2A; display: block; }
+.items-table { width: 100%; border-collapse: collapse; margin: 30px 0; }
+.items-table thead { background: #FFF8E1; }
+.items-table th { padding: 15px; text-align: left; font-size: 12px; text-transform: uppercase; }
+.items-table td { padding: 15px; border-bottom: 1px solid #e5e7eb; font-size: 14px; }
+.text-right { text-align: right !important; }
+.text-center { text-align: center !important; }
+.totals { padding: 30px; background: #f9fafb; }
+.totals-row { display: flex; justify-content: space-between; padding: 10px 0; font-size: 14px; }
+.totals-row.total { border-top: 2px solid #4A2C2A; margin-top: 10px; padding-top: 20px; font-size: 20px; font-weight: bold; color: #FF6B9D; }
+.footer { padding: 30px; text-align: center; color: #6b7280; font-size: 12px; border-top: 2px solid #e5e7eb; }
+@media print { body { padding: 0; } .invoice-container { border: none; } }
+"""
+
+
+def format_currency(amount: Any) -> str:
+    """₹ with Indian digit grouping and no decimals, like formatCurrency in the storefront."""
+    value = round(float(amount or 0))
+    sign = "-" if value < 0 else ""
+    digits = str(abs(value))
+    if len(digits) > 3:
+        head, tail = digits[:-3], digits[-3:]
+        groups = []
+        while len(head) > 2:
+            groups.insert(0, head[-2:])
+            head = head[:-2]
+        if head:
+            groups.insert(0, head)
+        digits = ",".join(groups) + "," + tail
+    return f"{sign}₹{digits}"
+
+
+def format_date(value: Any) -> str:
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).strftime("%b %d, %Y")
+    except ValueError:
+        return escape(str(value or ""))
+
+
+def render_invoice_html(order: Dict[str, Any], settings: Dict[str, Any]) -> bytes:
+    """UTF-8 invoice document for an order response dict and the settings document."""
+    e = lambda value: escape(str(value if value is not None else ""))  # noqa: E731
+    customer = order.get("customer") or {}
+    address = customer.get("address") or {}
+    if isinstance(address, str):
+        address_html = e(address)
+    else:
+        line2 = f", {e(address.get('line2'))}" if address.get("line2") else ""
+        address_html = (f"{e(address.get('line1'))}{line2}<br>"
+                        f"{e(address.get('city'))}, {e(address.get('state'))} - {e(address.get('pincode'))}")
+
+    rows = "".join(
+        f"<tr><td>{e(item.get('name'))}</td><td>{e(item.get('size'))}</td>"
+        f"<td class=\"text-center\">{e(item.get('quantity', 1))}</td>"
+        f"<td class=\"text-right\">{format_currency(item.get('price'))}</td>"
+        f"<td class=\"text-right\">{format_currency(float(item.get('price') or 0) * int(item.get('quantity') or 1))}</td></tr>"
+        for item in order.get("items") or []
+    )
+    store_address = ", ".join(
+        e(settings.get(k)) for k in ("store_address", "store_city", "store_state", "store_pincode") if settings.get(k)
+    )
+    gstin = f"<p>GSTIN: {e(settings['store_gstin'])}</p>" if settings.get("store_gstin") else ""
+    tax_rate = settings.get("tax_rate")
+    tax_label = f"Tax ({float(tax_rate):g}%)" if tax_rate is not None else "Tax"
+    delivery = float(order.get("delivery_charges") or 0)
+    discount = float(order.get("discount") or 0)
+    discount_row = (f"<div class=\"totals-row\"><span>Discount:</span><span>-{format_currency(discount)}</span></div>"
+                    if discount > 0 else "")
+    store_name = e(settings.get("store_name") or "")
+
+    html = f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<title>Invoice {e(order.get('invoice_number') or order.get('order_number'))}</title>
+<style>{STYLE}</style>
+</head>
+<body>
+<div class="invoice-container">
+<div class="header">
+<h1>{store_name}</h1>
+<p>{e(settings.get('store_tagline'))}</p>
+<p>{store_address}</p>
+{gstin}
+</div>
+<div class="invoice-info">
+<div class="info-section">
+<h3>Invoice Details</h3>
+<p>Invoice #: {e(order.get('invoice_number'))}</p>
+<p>Order #: {e(order.get('order_number'))}</p>
+<p>Date: {format_date(order.get('created_at'))}</p>
+</div>
+<div class="info-section">
+<h3>Order Status</h3>
+<p>{e(order.get('status'))}</p>
+<p>Payment: {e(order.get('payment_method'))} ({e(order.get('payment_status'))})</p>
+</div>
+</div>
+<div class="customer-details">
+<h3>Customer Information</h3>
+<div class="customer-info">
+<div><strong>Name:</strong>{e(customer.get('name'))}</div>
+<div><strong>Email:</strong>{e(customer.get('email'))}</div>
+<div><strong>Phone:</strong>{e(customer.get('phone'))}</div>
+<div><strong>Delivery Address:</strong>{address_html}</div>
+</div>
+</div>
+<table class="items-table">
+<thead><tr><th>Product</th><th>Size</th><th class="text-center">Quantity</th>
+<th class="text-right">Unit Price</th><th class="text-right">Total</th></tr></thead>
+<tbody>{rows}</tbody>
+</table>
+<div class="totals">
+<div class="totals-row"><span>Subtotal:</span><span>{format_currency(order.get('subtotal'))}</span></div>
+<div class="totals-row"><span>{tax_label}:</span><span>{format_currency(order.get('tax'))}</span></div>
+<div class="totals-row"><span>Delivery Charges:</span><span>{'FREE' if delivery == 0 else format_currency(delivery)}</span></div>
+{discount_row}
+<div class="totals-row total"><span>Total Amount:</span><span>{format_currency(order.get('total'))}</span></div>
+</div>
+<div class="footer">
+<p>Thank you for your order!</p>
+<p>{store_name} | {e(settings.get('store_email'))} | {e(settings.get('store_phone'))}</p>
+</div>
+</div>
+</body>
+</html>
+"""
+    return html.encode("utf-8")
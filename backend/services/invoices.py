@@ -0,0 +1,184 @@
+"""
+Server-side invoices.
+
+Rendering (services.invoice_render) is CPU work, so it runs in a small
+process pool instead of the event loop. Output is cached in storage under
+`<order id>/<updated_at>.html`: any change to the order gives it a new key,
+so a cached invoice never describes an outdated order. Storage is the Azure
+container AZURE_INVOICE_CONTAINER_NAME when Azure is configured, otherwise
+INVOICE_LOCAL_DIR on disk.
+
+Invoices are pre-generated in the background when an order is paid or
+confirmed, so the bulk download for accounting mostly reads cached files.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+import zipfile
+from services.invoice_render import render_invoice_html
+from services.settings_cache import settings_cache
+
+logger = logging.getLogger(__name__)
+
+INVOICE_RENDER_WORKERS = int(os.getenv("INVOICE_RENDER_WORKERS", "2"))
+INVOICE_CONTAINER_NAME = os.getenv("AZURE_INVOICE_CONTAINER_NAME", "invoices")
+INVOICE_LOCAL_DIR = os.getenv(
+    "INVOICE_LOCAL_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "invoices")
+)
+# Upper bound on orders in one bulk download
+INVOICE_BULK_MAX_ORDERS = int(os.getenv("INVOICE_BULK_MAX_ORDERS", "5000"))
+# Invoices rendered concurrently while building a bulk download
+INVOICE_BULK_CONCURRENCY = 16
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: forking a process that runs Motor's threads is not safe
+        _executor = ProcessPoolExecutor(
+            max_workers=INVOICE_RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def invoice_key(order: dict) -> str:
+    version = re.sub(r"[^0-9A-Za-z]", "", str(order.get("updated_at") or order.get("created_at") or "0"))
+    return f"{order['id']}/{version}.html"
+
+
+def invoice_filename(order: dict) -> str:
+    name = order.get("invoice_number") or order.get("order_number") or order["id"]
+    return f"Invoice_{re.sub(r'[^0-9A-Za-z_-]', '_', str(name))}.html"
+
+
+def _use_azure() -> bool:
+    return bool(os.getenv("AZURE_STORAGE_CONNECTION_STRING"))
+
+
+def _local_path(key: str) -> str:
+    return os.path.join(INVOICE_LOCAL_DIR, *key.split("/"))
+
+
+def _read_local(key: str) -> Optional[bytes]:
+    try:
+        with open(_local_path(key), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write_local(key: str, data: bytes) -> None:
+    path = _local_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+async def _read_cached(key: str) -> Optional[bytes]:
+    if _use_azure():
+        from services.storage import get_blob
+        return await get_blob(INVOICE_CONTAINER_NAME, key)
+    return await asyncio.to_thread(_read_local, key)
+
+
+async def _write_cached(key: str, data: bytes) -> None:
+    if _use_azure():
+        from services.storage import put_blob
+        await put_blob(INVOICE_CONTAINER_NAME, key, data, content_type="text/html; charset=utf-8")
+    else:
+        await asyncio.to_thread(_write_local, key, data)
+
+
+async def _render(order: dict, settings: dict) -> bytes:
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), render_invoice_html, order, settings)
+
+
+async def get_invoice(order: dict, settings: Optional[dict] = None) -> bytes:
+    """Invoice HTML for an order response dict: cached copy, else rendered and cached."""
+    key = invoice_key(order)
+    try:
+        cached = await _read_cached(key)
+    except Exception as e:
+        logger.warning(f"Invoice cache read failed for {key}: {e}")
+        cached = None
+    if cached is not None:
+        return cached
+    if settings is None:
+        settings = (await settings_cache.get()).model_dump()
+    html = await _render(order, settings)
+    try:
+        await _write_cached(key, html)
+    except Exception as e:
+        logger.error(f"Invoice cache write failed for {key}: {e}", exc_info=True)
+    return html
+
+
+def needs_invoice(before: Dict[str, Optional[str]], after: dict) -> bool:
+    """Whether an update just made the order paid or confirmed."""
+    became_paid = after.get("payment_status") == "paid" and before.get("payment_status") != "paid"
+    became_confirmed = after.get("status") == "confirmed" and before.get("status") != "confirmed"
+    return became_paid or became_confirmed
+
+
+async def pregenerate(order: dict) -> None:
+    """Background task: render and cache the invoice ahead of the first download."""
+    try:
+        await get_invoice(order)
+    except Exception as e:
+        logger.error(f"Invoice pre-generation failed for order {order.get('id')}: {e}", exc_info=True)
+
+
+class _ZipChunks:
+    """Write-only sink for ZipFile that hands out what has been written so far."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+async def stream_invoice_zip(orders: List[dict]) -> AsyncIterator[bytes]:
+    """Zip of the orders' invoices, yielded as it is built."""
+    settings = (await settings_cache.get()).model_dump()
+    sink = _ZipChunks()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED)
+    names = set()
+    try:
+        for start in range(0, len(orders), INVOICE_BULK_CONCURRENCY):
+            batch = orders[start:start + INVOICE_BULK_CONCURRENCY]
+            invoices = await asyncio.gather(*(get_invoice(order, settings) for order in batch))
+            for order, html in zip(batch, invoices):
+                name = invoice_filename(order)
+                if name in names:
+                    name = name.replace(".html", f"_{order['id']}.html")
+                names.add(name)
+                archive.writestr(name, html)
+            yield sink.take()
+    finally:
+        archive.close()
+    yield sink.take()
@@ -0,0 +1,150 @@
+"""
+Background jobs that run on a fixed interval inside the API process
+(order archival, stock snapshots, customer segmentation). Each job runs once
+at startup and then every `interval_seconds`; 0 disables it. Failures are
+logged and retried on the next tick. Every worker keeps the schedule, but a
+tick only runs the job in the worker holding its lease (job_leases; renewed
+on every tick, expires JOB_LEASE_GRACE_SECONDS after the next one was due),
+so N workers still scan once per interval and another worker takes over
+when the runner dies. The other workers run the job's `follow` callback, if
+any. A run that outlives its lease can overlap the next runner's, so jobs
+must still tolerate running concurrently.
+
+Jobs that replace a whole result collection tag each run's rows with a run
+id and publish the run once all its rows are written (publish_run); readers
+only see rows of the current run (current_run). A run that finishes after a
+newer one was published is discarded instead of overwriting it. The rows of
+the previously current run are kept until the next publish, so readers on a
+lagging secondary (which may still see the old pointer) find their rows.
+"""
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional, Tuple
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import models
+
+logger = logging.getLogger(__name__)
+
+JOB_LEASE_GRACE_SECONDS = float(os.getenv("JOB_LEASE_GRACE_SECONDS", "120"))
+
+# result name -> {"run_id", "computed_at"} of the run readers should use
+JOB_RUNS_COLLECTION = "job_runs"
+# job name -> {"owner", "lease_until"} of the worker running it
+JOB_LEASES_COLLECTION = "job_leases"
+
+# Identifies this worker process as a lease owner
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _runs():
+    return models.Product.get_motor_collection().database[JOB_RUNS_COLLECTION]
+
+
+def _leases():
+    return models.Product.get_motor_collection().database[JOB_LEASES_COLLECTION]
+
+
+async def acquire_lease(name: str, seconds: float) -> bool:
+    """Take or renew the lease of job `name` for `seconds`; False while another worker holds it."""
+    now = datetime.utcnow()
+    try:
+        await _leases().update_one(
+            {"_id": name, "$or": [{"owner": WORKER_ID}, {"lease_until": {"$lt": now}}]},
+            {"$set": {"owner": WORKER_ID, "lease_until": now + timedelta(seconds=seconds)}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False  # the lease exists, is held by someone else and has not expired
+
+
+async def release_lease(name: str) -> None:
+    """Give the lease up (shutdown) so another worker can take over on its next tick."""
+    await _leases().delete_one({"_id": name, "owner": WORKER_ID})
+
+
+async def publish_run(name: str, run_id: str, computed_at: datetime) -> Tuple[bool, Optional[datetime]]:
+    """
+    Make `run_id` the current run of `name` unless a newer run already is.
+    Returns whether it did, and the computed_at of the run it replaced.
+    """
+    newer = {"_id": name, "computed_at": {"$lt": computed_at}}
+    update = {"$set": {"run_id": run_id, "computed_at": computed_at}}
+    previous = await _runs().find_one_and_update(newer, update, return_document=ReturnDocument.BEFORE)
+    if previous is not None:
+        return True, previous["computed_at"]
+    try:
+        await _runs().insert_one({"_id": name, "run_id": run_id, "computed_at": computed_at})
+        return True, None
+    except DuplicateKeyError:
+        # Exists already: either newer than ours, or just created by a concurrent first run
+        previous = await _runs().find_one_and_update(newer, update, return_document=ReturnDocument.BEFORE)
+        return previous is not None, previous["computed_at"] if previous is not None else None
+
+
+async def current_run(name: str, read_preference=None) -> Optional[dict]:
+    """Pointer to the current run; read it with the same read preference as the rows it points to."""
+    runs = _runs() if read_preference is None else _runs().with_options(read_preference=read_preference)
+    return await runs.find_one({"_id": name})
+
+
+class PeriodicJob:
+
+    def __init__(self, name: str, run: Callable[[], Awaitable[dict]], interval_seconds: float,
+                 follow: Optional[Callable[[], Awaitable[None]]] = None):
+        self.name = name
+        self._run = run
+        self._follow = follow
+        self._interval = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.runner = False
+        self.last_run: Optional[dict] = None
+        self.last_error: Optional[str] = None
+
+    async def start(self) -> None:
+        if self._interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            if self.runner:
+                try:
+                    await release_lease(self.name)
+                except Exception as e:
+                    logger.warning(f"Could not release the lease of job {self.name}: {e}")
+                self.runner = False
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                self.runner = await acquire_lease(self.name, self._interval + JOB_LEASE_GRACE_SECONDS)
+                if self.runner:
+                    self.last_run = await self._run()
+                    self.last_error = None
+                elif self._follow is not None:
+                    await self._follow()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Background job {self.name} failed: {e}", exc_info=True)
+            await asyncio.sleep(self._interval)
+
+    def status(self) -> dict:
+        return {
+            "enabled": self._task is not None,
+            # Whether this worker holds the lease (runs the job) as of its last tick
+            "runner": self.runner,
+            "interval_seconds": self._interval,
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+        }
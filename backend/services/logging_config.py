@@ -0,0 +1,105 @@
+"""
+Non-blocking structured logging.
+
+Every logger writes into an in-memory queue through a QueueHandler; a
+background QueueListener thread formats the records as JSON and writes them
+to stderr, so a slow container stdout never stalls the event loop.
+Records carry the request id and route of the request that emitted them.
+"""
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+from services.request_context import current_request_id, current_route
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import sys
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+# Payloads (request bodies, updated values) are only logged at DEBUG and are truncated
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the current request id and route (runs in the emitting context)."""
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = current_request_id()
+        if not hasattr(record, "route"):
+            record.route = current_route()
+        return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Only merges args into the message on the caller's side; formatting happens on the listener thread."""
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and value not in (None, ""):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging() -> None:
+    """Route all logging through the queue; safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stderr)
+    if LOG_FORMAT == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"))
+
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    # Send uvicorn's own loggers through the same pipeline
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Any, **fields) -> None:
+    """Log a (possibly large) payload only when DEBUG is enabled for `logger`."""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    text = json.dumps(payload, default=str, ensure_ascii=False)
+    if len(text) > LOG_PAYLOAD_MAX_CHARS:
+        text = text[:LOG_PAYLOAD_MAX_CHARS] + f"... ({len(text)} chars)"
+    logger.debug(message, extra={"payload": text, **fields})
@@ -0,0 +1,119 @@
+"""
+Memory diagnostics: process RSS, live document model counts, GC stats and
+tracemalloc snapshots with diffing against the previous snapshot.
+
+tracemalloc is off until explicitly started because it slows every
+allocation down; stop it again once the investigation is done.
+"""
+from typing import List, Optional
+import datetime
+import gc
+import os
+import resource
+import sys
+import tracemalloc
+
+# Allocations made by the tracer itself or the import machinery are noise
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+_previous: Optional[tracemalloc.Snapshot] = None
+_current: Optional[tracemalloc.Snapshot] = None
+_current_taken_at: Optional[str] = None
+_previous_taken_at: Optional[str] = None
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size; falls back to the peak RSS where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def live_instances(model_types: list) -> dict:
+    """Count live instances of the given classes by walking the GC-tracked objects."""
+    counts = {t.__name__: 0 for t in model_types}
+    types = tuple(model_types)
+    for obj in gc.get_objects():
+        if isinstance(obj, types):
+            counts[type(obj).__name__] = counts.get(type(obj).__name__, 0) + 1
+    return counts
+
+
+def gc_stats() -> dict:
+    return {
+        "enabled": gc.isenabled(),
+        "counts": gc.get_count(),
+        "thresholds": gc.get_threshold(),
+        "generations": gc.get_stats(),
+    }
+
+
+def tracing_status() -> dict:
+    traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+    return {
+        "tracing": tracemalloc.is_tracing(),
+        "frames": tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else 0,
+        "traced_bytes": traced,
+        "traced_peak_bytes": peak,
+        "snapshot_taken_at": _current_taken_at,
+        "previous_snapshot_taken_at": _previous_taken_at,
+    }
+
+
+def start_tracing(frames: int = 1) -> None:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(1, frames))
+
+
+def stop_tracing() -> None:
+    global _previous, _current, _previous_taken_at, _current_taken_at
+    tracemalloc.stop()
+    _previous = _current = None
+    _previous_taken_at = _current_taken_at = None
+
+
+def _stat_to_dict(stat) -> dict:
+    frame = stat.traceback[0]
+    return {"file": frame.filename, "line": frame.lineno, "size": stat.size, "count": stat.count}
+
+
+def _diff_to_dict(stat) -> dict:
+    frame = stat.traceback[0]
+    return {
+        "file": frame.filename,
+        "line": frame.lineno,
+        "size": stat.size,
+        "size_diff": stat.size_diff,
+        "count": stat.count,
+        "count_diff": stat.count_diff,
+    }
+
+
+def take_snapshot(limit: int = 25) -> dict:
+    """Take a snapshot (the old one becomes the diff baseline) and return its top allocation sites."""
+    global _previous, _current, _previous_taken_at, _current_taken_at
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not running; start it first")
+    snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    _previous, _previous_taken_at = _current, _current_taken_at
+    _current, _current_taken_at = snapshot, datetime.datetime.now().isoformat()
+    return {
+        "taken_at": _current_taken_at,
+        "top": [_stat_to_dict(s) for s in snapshot.statistics("lineno")[:limit]],
+    }
+
+
+def diff_snapshots(limit: int = 25) -> List[dict]:
+    """Top allocation sites by growth between the previous and the latest snapshot."""
+    if _current is None or _previous is None:
+        raise RuntimeError("Two snapshots are needed for a diff")
+    return [_diff_to_dict(s) for s in _current.compare_to(_previous, "lineno")[:limit]]
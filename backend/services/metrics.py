@@ -0,0 +1,224 @@
+"""
+In-process Prometheus-compatible metrics.
+
+Counters, gauges and histograms are plain dicts keyed by label-value tuples.
+There are no locks on the hot path: updates are single dict/list operations
+that the GIL keeps consistent enough for monitoring (a rare lost increment
+from a driver thread racing the event loop is acceptable), which keeps the
+per-request overhead to a few microseconds.
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+from pymongo import monitoring
+import time
+
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, labels: Tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = super().render()
+        for labels, value in list(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._callback = callback
+
+    def inc(self, labels: Tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: Tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, value: float, labels: Tuple = ()) -> None:
+        self._values[labels] = value
+
+    def render(self):
+        lines = super().render()
+        if self._callback is not None:
+            lines.append(f"{self.name} {self._callback()}")
+        for labels, value in list(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum, count]
+        self._series: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, labels: Tuple = ()) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series.setdefault(labels, [0] * (len(self.buckets) + 3))
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = super().render()
+        for labels, series in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {series[-2]}")
+            lines.append(f"{self.name}_count{label_str} {series[-1]}")
+        return lines
+
+
+def render_latest() -> str:
+    """Render every registered metric in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# HTTP
+http_requests_total = Counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"))
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route"))
+http_response_size_bytes = Histogram(
+    "http_response_size_bytes", "HTTP response body size by route template", ("method", "route"), SIZE_BUCKETS)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ("method",))
+
+# MongoDB
+mongodb_command_duration_seconds = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency by collection and command",
+    ("collection", "command"))
+mongodb_command_failures_total = Counter(
+    "mongodb_command_failures_total", "Failed MongoDB commands by collection and command",
+    ("collection", "command"))
+
+# Blob storage and notifications
+blob_upload_duration_seconds = Histogram(
+    "blob_upload_duration_seconds", "Azure blob upload latency by outcome", ("outcome",))
+notification_queue_depth = Gauge(
+    "notification_queue_depth", "Notifications scheduled but not yet sent")
+
+
+def route_template(scope: dict) -> str:
+    """Route template (/products/{product_id}) of a handled request; never the raw path."""
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path if path else "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency, status, response size and in-flight requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = [500]
+        size = [0]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                size[0] += len(message.get("body", b""))
+            await send(message)
+
+        in_flight_labels = (method,)
+        http_requests_in_flight.inc(in_flight_labels)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec(in_flight_labels)
+            labels = (method, route_template(scope))
+            http_request_duration_seconds.observe(elapsed, labels)
+            http_response_size_bytes.observe(size[0], labels)
+            http_requests_total.inc(labels + (status[0],))
+
+
+def _command_collection(event) -> str:
+    target = event.command.get(event.command_name)
+    if isinstance(target, str):
+        return target
+    collection = event.command.get("collection")  # getMore
+    return collection if isinstance(collection, str) else ""
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Records MongoDB command latency per collection and command name."""
+
+    def __init__(self):
+        # (connection_id, request_id) -> collection; succeeded/failed events don't carry the command
+        self._pending: Dict[Tuple, str] = {}
+
+    def started(self, event):
+        self._pending[(event.connection_id, event.request_id)] = _command_collection(event)
+
+    def succeeded(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), "")
+        mongodb_command_duration_seconds.observe(event.duration_micros / 1e6, (collection, event.command_name))
+
+    def failed(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), "")
+        labels = (collection, event.command_name)
+        mongodb_command_duration_seconds.observe(event.duration_micros / 1e6, labels)
+        mongodb_command_failures_total.inc(labels)
+
+
+command_metrics = CommandMetrics()
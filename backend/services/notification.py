@@ -2,9 +2,9 @@ import os
 import smtplib
 from email.message import EmailMessage
 import logging
+from fastapi import BackgroundTasks
+from services.metrics import notification_queue_depth
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Gmail Configuration
@@ -43,3 +43,15 @@ def send_whatsapp_notification(to_phone: str, message: str):
     # 1. Use Twilio or Meta Graph API
     # 2. POST request to https://graph.facebook.com/v17.0/{phone_number_id}/messages
     # 3. Requires generic template or 24hr window
+
+
+def queue_notification(background_tasks: BackgroundTasks, func, **kwargs):
+    """Schedule a notification as a background task, tracking the pending-queue depth."""
+    def run():
+        try:
+            func(**kwargs)
+        finally:
+            notification_queue_depth.dec()
+
+    notification_queue_depth.inc()
+    background_tasks.add_task(run)
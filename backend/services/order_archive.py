@@ -0,0 +1,138 @@
+"""
+Hot/cold split of the orders collection.
+
+Delivered and cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS are moved,
+in batches, from `orders` to `orders_archive`, so the hot collection (and
+its indexes) only holds recent and in-flight orders. The archive is created
+with zstd block compression and a single (user_id, created_at) index, which
+is all the history views need. Archived orders stay readable through the
+orders API; they are no longer updated.
+
+A move is copy-then-delete and safe to repeat: a batch interrupted between
+the two steps is finished by the next run (the copy is rewritten from the
+current document). An order is only deleted from the hot collection if its
+status and updated_at still match the copy; one changed in the meantime
+stays hot (its archive copy is dropped) and is picked up again later. The
+API runs it every ORDER_ARCHIVE_INTERVAL_SECONDS (0 disables it) in the
+worker holding the job lease; an overlapping run (e.g. archive_orders.py,
+which runs it once) only duplicates work.
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+import asyncio
+import logging
+import os
+import time
+from pymongo import ASCENDING, DESCENDING, DeleteOne, ReplaceOne
+from pymongo.errors import CollectionInvalid, OperationFailure
+import database
+import models
+from services.jobs import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "180"))
+ORDER_ARCHIVE_STATUSES = [s.strip() for s in os.getenv("ORDER_ARCHIVE_STATUSES", "delivered,cancelled").split(",")
+                          if s.strip()]
+ORDER_ARCHIVE_BATCH_SIZE = int(os.getenv("ORDER_ARCHIVE_BATCH_SIZE", "500"))
+ORDER_ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ORDER_ARCHIVE_INTERVAL_SECONDS", "86400"))
+# Pause between batches so a large first run does not starve the API of I/O
+ORDER_ARCHIVE_BATCH_PAUSE_SECONDS = float(os.getenv("ORDER_ARCHIVE_BATCH_PAUSE_SECONDS", "0.1"))
+
+ARCHIVE_COLLECTION = "orders_archive"
+
+
+def archive_collection(profile: str = "primary"):
+    """orders_archive with the read preference of `profile` (see database.READ_PREFERENCES)."""
+    db = models.Order.get_motor_collection().database
+    return db[ARCHIVE_COLLECTION].with_options(read_preference=database.READ_PREFERENCES[profile])
+
+
+async def ensure_archive_collection() -> None:
+    """Create orders_archive with zstd compression (if new) and its history index."""
+    db = models.Order.get_motor_collection().database
+    try:
+        await db.create_collection(
+            ARCHIVE_COLLECTION,
+            storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}},
+        )
+        logger.info(f"Created {ARCHIVE_COLLECTION} (zstd block compression)")
+    except CollectionInvalid:
+        pass  # already exists
+    except OperationFailure as e:
+        # Servers without WiredTiger/zstd (e.g. Cosmos DB) get a plain collection
+        logger.warning(f"Could not create {ARCHIVE_COLLECTION} with zstd ({e}); using default storage options")
+        try:
+            await db.create_collection(ARCHIVE_COLLECTION)
+        except CollectionInvalid:
+            pass
+    await db[ARCHIVE_COLLECTION].create_index(
+        [("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_id_created_at"
+    )
+
+
+def _cutoff(older_than_days: int) -> str:
+    # created_at is stored as a naive ISO string, which sorts chronologically
+    return (datetime.now() - timedelta(days=older_than_days)).isoformat()
+
+
+async def _move_batch(ids: List[str], docs: List[dict]) -> int:
+    """Copy to the archive, delete from hot; returns how many orders left the hot collection."""
+    hot = models.Order.get_motor_collection()
+    archive = archive_collection()
+    archived_at = datetime.now().isoformat()
+    # Replace rather than insert: a copy left by an interrupted run may predate later updates
+    await archive.bulk_write(
+        [ReplaceOne({"_id": doc["_id"]}, dict(doc, archived_at=archived_at), upsert=True) for doc in docs],
+        ordered=False,
+    )
+    # Only delete orders still exactly as copied; any update since (status change,
+    # cancellation, ...) bumps updated_at and keeps the order hot
+    result = await hot.bulk_write(
+        [DeleteOne({"_id": doc["_id"], "status": doc.get("status"), "updated_at": doc.get("updated_at")})
+         for doc in docs],
+        ordered=False,
+    )
+    if result.deleted_count < len(ids):
+        still_hot = [doc["_id"] async for doc in hot.find({"_id": {"$in": ids}}, {"_id": 1})]
+        if still_hot:
+            await archive.delete_many({"_id": {"$in": still_hot}})
+    return result.deleted_count
+
+
+async def archive_orders(older_than_days: Optional[int] = None, batch_size: Optional[int] = None,
+                         dry_run: bool = False) -> dict:
+    """Move eligible orders to the archive; returns counts and timing."""
+    older_than_days = ORDER_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    batch_size = batch_size or ORDER_ARCHIVE_BATCH_SIZE
+    cutoff = _cutoff(older_than_days)
+    query = {"status": {"$in": ORDER_ARCHIVE_STATUSES}, "created_at": {"$lt": cutoff}}
+    hot = models.Order.get_motor_collection()
+    start = time.perf_counter()
+    if dry_run:
+        eligible = await hot.count_documents(query)
+        return {"eligible": eligible, "archived": 0, "batches": 0, "cutoff": cutoff, "dry_run": True}
+
+    await ensure_archive_collection()
+    archived = batches = 0
+    while True:
+        docs = await hot.find(query).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+        moved = await _move_batch([doc["_id"] for doc in docs], docs)
+        archived += moved
+        batches += 1
+        if moved == 0:
+            break  # every order in the batch changed while being moved; leave them for the next run
+        await asyncio.sleep(ORDER_ARCHIVE_BATCH_PAUSE_SECONDS)
+    seconds = time.perf_counter() - start
+    if archived:
+        logger.info(f"Archived {archived} orders created before {cutoff} in {batches} batches ({seconds:.1f}s)")
+    return {"archived": archived, "batches": batches, "cutoff": cutoff, "seconds": round(seconds, 3)}
+
+
+async def find_archived_order(order_id: str) -> Optional[dict]:
+    return await archive_collection().find_one({"_id": order_id})
+
+
+order_archiver = PeriodicJob("order_archive", archive_orders, ORDER_ARCHIVE_INTERVAL_SECONDS)
@@ -0,0 +1,52 @@
+"""
+Compact item snapshots stored on orders.
+
+Clients used to send (and orders kept) whatever item objects they had,
+sometimes whole products with base64 images inline. An order only needs
+enough to show and reprint itself: schemas.OrderItemSnapshot. Used when
+orders are created and by migrate_order_items.py for existing orders.
+"""
+from typing import Any, Dict, Iterable, List, Optional
+import schemas
+
+
+def thumbnail_url(images: Iterable[Any]) -> Optional[str]:
+    """First usable image reference; inline data: URIs are too large to copy into orders."""
+    for image in images:
+        if isinstance(image, str) and image and not image.startswith("data:"):
+            return image
+    return None
+
+
+def compact_item(item: Dict[str, Any], product: Optional[dict] = None,
+                 unit_price: Optional[float] = None) -> dict:
+    """
+    Snapshot of one order line. `product` (pricing projection or full document)
+    fills in what the item lacks; `unit_price` overrides the client's price.
+    """
+    product = product or {}
+    product_id = item.get("productId") or item.get("product_id") or item.get("id") or str(product.get("_id", ""))
+    candidates = [item.get("thumbnail"), item.get("image"), *(item.get("images") or []), *(product.get("images") or [])]
+    price = unit_price if unit_price is not None else item.get("price", item.get("unit_price", 0))
+    return schemas.OrderItemSnapshot(
+        productId=str(product_id),
+        name=item.get("name") or product.get("name", "") or "",
+        size=item.get("size"),
+        price=float(price or 0),
+        quantity=int(item.get("quantity", 1) or 1),
+        thumbnail=thumbnail_url(candidates),
+    ).model_dump()
+
+
+def compact_items(items: List[Dict[str, Any]], products: Optional[Dict[str, dict]] = None,
+                  unit_prices: Optional[Dict[tuple, float]] = None) -> List[dict]:
+    """compact_item for every line; `unit_prices` is keyed by (product id, size)."""
+    products = products or {}
+    unit_prices = unit_prices or {}
+    snapshots = []
+    for item in items:
+        product_id = item.get("productId") or item.get("product_id") or item.get("id")
+        snapshots.append(compact_item(
+            item, products.get(product_id), unit_prices.get((product_id, item.get("size")))
+        ))
+    return snapshots
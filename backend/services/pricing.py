@@ -0,0 +1,120 @@
+"""
+Server-side cart pricing.
+
+One engine prices a cart for POST /cart/quote and re-prices incoming orders
+so client-computed totals can be verified. All cart lines are loaded with a
+single $in query that only projects the pricing fields; tax and delivery
+rules come from the cached SiteSettings. Rules match the storefront:
+unit price = size price (price_by_size, else base price) less the product
+discount; tax on the subtotal; delivery free at or above the threshold.
+"""
+from typing import Any, Dict, List, Optional
+import os
+import models
+from services.settings_cache import settings_cache
+
+# Absolute difference (in currency units) tolerated between client and server amounts
+ORDER_TOTALS_TOLERANCE = float(os.getenv("ORDER_TOTALS_TOLERANCE", "0.5"))
+# enforce: reject mismatching orders; log: only log them (e.g. while old clients are still around)
+ORDER_TOTALS_CHECK = os.getenv("ORDER_TOTALS_CHECK", "enforce").lower()
+
+PRICING_PROJECTION = {
+    "name": 1, "price": 1, "price_by_size": 1, "discount": 1, "stock": 1, "status": 1, "images": {"$slice": 1},
+}
+VERIFIED_FIELDS = ("subtotal", "tax", "delivery_charges", "total")
+
+
+def _money(value: float) -> float:
+    return round(value, 2)
+
+
+def item_product_id(item: dict) -> Optional[str]:
+    return item.get("productId") or item.get("product_id")
+
+
+async def load_pricing(product_ids: List[str]) -> Dict[str, dict]:
+    """Pricing fields of the given products in one round trip (primary: prices must be current)."""
+    if not product_ids:
+        return {}
+    cursor = models.Product.get_motor_collection().find({"_id": {"$in": list(set(product_ids))}}, PRICING_PROJECTION)
+    return {str(doc["_id"]): doc async for doc in cursor}
+
+
+def price_cart(items: List[Dict[str, Any]], products: Dict[str, dict], settings) -> dict:
+    """Full breakdown for cart lines ({productId, size, quantity}) against loaded products and settings."""
+    lines = []
+    issues = []
+    for item in items:
+        product_id = item_product_id(item)
+        size = item.get("size")
+        try:
+            quantity = int(item.get("quantity", 1))
+        except (TypeError, ValueError):
+            quantity = 0
+        product = products.get(product_id)
+        if product is None or (product.get("status") or "active") != "active":
+            issues.append({"product_id": product_id, "size": size, "issue": "unavailable"})
+            continue
+        if quantity < 1:
+            issues.append({"product_id": product_id, "size": size, "issue": "invalid_quantity"})
+            continue
+
+        price_by_size = product.get("price_by_size") or {}
+        list_price = float(price_by_size[size] if size in price_by_size else product.get("price", 0) or 0)
+        discount = float(product.get("discount", 0) or 0)
+        unit_price = _money(list_price * (1 - discount / 100))
+        stock = int(product.get("stock", 0) or 0)
+        if quantity > stock:
+            issues.append({"product_id": product_id, "size": size, "issue": "insufficient_stock", "available": stock})
+        images = product.get("images") or []
+        lines.append({
+            "product_id": product_id,
+            "name": product.get("name", ""),
+            "size": size,
+            "quantity": quantity,
+            "list_price": list_price,
+            "discount_percent": discount,
+            "unit_price": unit_price,
+            "line_total": _money(unit_price * quantity),
+            "image": images[0] if images else None,
+        })
+
+    subtotal = _money(sum(line["line_total"] for line in lines))
+    tax_rate = float(getattr(settings, "tax_rate", 0) or 0)
+    tax = _money(subtotal * tax_rate / 100)
+    threshold = float(getattr(settings, "free_delivery_threshold", 0) or 0)
+    delivery = 0.0 if not lines or subtotal >= threshold else float(getattr(settings, "delivery_charges", 0) or 0)
+    min_order = float(getattr(settings, "min_order_amount", 0) or 0)
+    return {
+        "lines": lines,
+        "subtotal": subtotal,
+        "tax_rate": tax_rate,
+        "tax": tax,
+        "delivery_charges": delivery,
+        "free_delivery_threshold": threshold,
+        "amount_to_free_delivery": _money(max(0.0, threshold - subtotal)),
+        "discount": 0.0,
+        "total": _money(subtotal + tax + delivery),
+        "min_order_amount": min_order,
+        "below_minimum": subtotal < min_order,
+        "issues": issues,
+    }
+
+
+async def quote(items: List[Dict[str, Any]], products: Optional[Dict[str, dict]] = None) -> dict:
+    """Price `items`; pass `products` from load_pricing if the caller already has them."""
+    if products is None:
+        products = await load_pricing([pid for pid in map(item_product_id, items) if pid])
+    settings = await settings_cache.get()
+    return price_cart(items, products, settings)
+
+
+def total_mismatches(order: Dict[str, Any], cart_quote: dict) -> Dict[str, dict]:
+    """Amounts where the order differs from the quote by more than the tolerance."""
+    mismatches = {}
+    for field in VERIFIED_FIELDS:
+        sent = float(order.get(field, 0) or 0)
+        expected = cart_quote[field]
+        if abs(sent - expected) > ORDER_TOTALS_TOLERANCE:
+            mismatches[field] = {"sent": sent, "expected": expected}
+    return mismatches
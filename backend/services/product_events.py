@@ -0,0 +1,48 @@
+"""
+In-process notifications for product writes.
+
+Routers publish after every product create/update/delete so in-memory
+structures derived from the catalog (search index, ...) can update
+incrementally instead of being rebuilt from Mongo. Listeners are plain
+synchronous callables and must be cheap; anything heavy should schedule
+its own background work. Local writes are also handed to forwarders (the
+cross-worker invalidation bus); changes made by other workers come back
+through deliver(), which only notifies listeners.
+"""
+from typing import Callable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# listener(product_id, product) where product is the new state as a dict, or None when deleted
+ProductListener = Callable[[str, Optional[dict]], None]
+
+_listeners: List[ProductListener] = []
+_forwarders: List[ProductListener] = []
+
+
+def subscribe(listener: ProductListener) -> None:
+    _listeners.append(listener)
+
+
+def forward(forwarder: ProductListener) -> None:
+    _forwarders.append(forwarder)
+
+
+def _notify(callbacks: List[ProductListener], product_id: str, product: Optional[dict]) -> None:
+    for callback in callbacks:
+        try:
+            callback(product_id, product)
+        except Exception as e:
+            logger.error(f"Product listener {getattr(callback, '__qualname__', callback)} failed: {e}", exc_info=True)
+
+
+def publish(product_id: str, product: Optional[dict]) -> None:
+    """A product was written by this process."""
+    _notify(_listeners, product_id, product)
+    _notify(_forwarders, product_id, product)
+
+
+def deliver(product_id: str, product: Optional[dict]) -> None:
+    """A product was written by another worker."""
+    _notify(_listeners, product_id, product)
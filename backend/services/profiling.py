@@ -0,0 +1,182 @@
+"""
+On-demand CPU profiling of individual requests.
+
+A request is profiled when it carries `X-Profile-Token: <PROFILE_SECRET>`, or
+when its route has been armed for 1-in-N sampling through the admin debug API.
+pyinstrument (statistical, async-aware, speedscope output) is used when
+installed; otherwise cProfile writes a .pstats file. Note that cProfile sees
+everything running on the event loop thread while the request is in flight,
+not just the profiled request.
+
+When no secret is configured and no route is armed the middleware is a
+single attribute check per request.
+"""
+from starlette.routing import Match
+from typing import Dict, List, Optional
+import asyncio
+import cProfile
+import datetime
+import hmac
+import itertools
+import logging
+import os
+import re
+import time
+
+try:
+    from pyinstrument import Profiler as _Pyinstrument
+    from pyinstrument.renderers import SpeedscopeRenderer as _SpeedscopeRenderer
+except ImportError:  # optional dependency
+    _Pyinstrument = None
+    _SpeedscopeRenderer = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/babadairy-profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_HEADER = b"x-profile-token"
+
+# route template -> profile every Nth request
+route_sampling: Dict[str, int] = {}
+_route_counters: Dict[str, "itertools.count"] = {}
+_active = False  # only one profiler may run at a time
+
+
+def arm_route(route: str, every_n: int) -> None:
+    route_sampling[route] = max(1, every_n)
+    _route_counters[route] = itertools.count()
+
+
+def disarm_route(route: str) -> None:
+    route_sampling.pop(route, None)
+    _route_counters.pop(route, None)
+
+
+def _matched_route(app, scope) -> Optional[str]:
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", None)
+    return None
+
+
+def _safe_name(route: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+
+
+def _write_profile(filename: str, data) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, filename)
+    if isinstance(data, cProfile.Profile):
+        data.dump_stats(path)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data)
+    _rotate()
+
+
+def _rotate() -> None:
+    files = list_profiles()
+    for stale in files[PROFILE_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, stale["name"]))
+        except OSError:
+            pass
+
+
+def list_profiles() -> List[dict]:
+    """Stored profiles, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    entries = []
+    for name in os.listdir(PROFILE_DIR):
+        path = os.path.join(PROFILE_DIR, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            entries.append({
+                "name": name,
+                "size": stat.st_size,
+                "created_at": datetime.datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                "format": "speedscope" if name.endswith(".speedscope.json") else "pstats",
+            })
+    entries.sort(key=lambda e: e["created_at"], reverse=True)
+    return entries
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Absolute path of a stored profile, refusing anything outside PROFILE_DIR."""
+    if os.path.basename(name) != name:
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware wrapping selected requests in a profiler."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (PROFILE_SECRET or route_sampling):
+            await self.app(scope, receive, send)
+            return
+
+        route = self._selected_route(scope)
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+        await self._profile(scope, receive, send, route)
+
+    def _selected_route(self, scope) -> Optional[str]:
+        if _active:
+            return None
+        if PROFILE_SECRET:
+            token = dict(scope["headers"]).get(PROFILE_HEADER)
+            if token is not None and hmac.compare_digest(token, PROFILE_SECRET.encode("latin-1")):
+                return _matched_route(scope["app"], scope) or scope["path"]
+        if route_sampling:
+            route = _matched_route(scope["app"], scope)
+            if route in route_sampling and next(_route_counters[route]) % route_sampling[route] == 0:
+                return route
+        return None
+
+    async def _profile(self, scope, receive, send, route: str):
+        global _active
+        _active = True
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.perf_counter_ns() % 1_000_000)}"
+        base = f"{stamp}-{scope['method']}-{_safe_name(route)}"
+        filename = base + (".speedscope.json" if _Pyinstrument else ".pstats")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", filename.encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        if _Pyinstrument is not None:
+            profiler = _Pyinstrument(async_mode="enabled")
+            profiler.start()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profiler.stop()
+                _active = False
+            data = profiler.output(renderer=_SpeedscopeRenderer())
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profiler.disable()
+                _active = False
+            data = profiler
+
+        try:
+            await asyncio.to_thread(_write_profile, filename, data)
+            logger.info(f"Profile written: {filename}")
+        except Exception as e:
+            logger.error(f"Failed to write profile {filename}: {e}")
@@ -0,0 +1,248 @@
+"""
+"Frequently bought together" from order co-occurrence.
+
+The model is a sparse product x product matrix (dict of dicts) counting how
+many non-cancelled orders contain both products, plus how many orders
+contain each product. Neighbors are ranked by cosine similarity,
+count(a, b) / sqrt(orders(a) * orders(b)), so bestsellers do not show up
+next to everything. The top RELATED_TOP_K neighbors of every product are
+kept precomputed; requests only read them.
+
+Every worker builds the matrix from order history (hot and archived
+orders) at startup and then updates it incrementally whenever an order is
+created, cancelled, reopened or deleted: by this worker directly, by the
+others through the invalidation bus. Only the worker running the job
+rescans every RELATED_REBUILD_SECONDS to correct drift. Updates made while a
+scan runs are replayed on the new model, against what the scan counted.
+"""
+from itertools import permutations
+from math import sqrt
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import heapq
+import logging
+import os
+import time
+import database
+import models
+from services.jobs import PeriodicJob
+from services.order_archive import archive_collection
+
+logger = logging.getLogger(__name__)
+
+RELATED_TOP_K = int(os.getenv("RELATED_TOP_K", "20"))
+RELATED_REBUILD_SECONDS = float(os.getenv("RELATED_REBUILD_SECONDS", "3600"))
+# Pairs seen in fewer orders than this are noise, not recommendations
+RELATED_MIN_CO_OCCURRENCE = int(os.getenv("RELATED_MIN_CO_OCCURRENCE", "1"))
+# Orders with more distinct products than this are bulk/party orders and say little about pairs
+RELATED_MAX_ORDER_PRODUCTS = int(os.getenv("RELATED_MAX_ORDER_PRODUCTS", "30"))
+
+# forwarder(order id, products, +1/-1): local order changes, handed to the invalidation bus
+OrderForwarder = Callable[[str, List[str], int], None]
+
+ITEMS_PROJECTION = {"_id": 1, "items.productId": 1, "items.product_id": 1}
+
+
+def order_products(items: Iterable[dict]) -> List[str]:
+    """Distinct product ids of an order's items."""
+    seen = {}
+    for item in items or []:
+        if isinstance(item, dict):
+            product_id = item.get("productId") or item.get("product_id")
+            if product_id:
+                seen[product_id] = None
+    return list(seen)
+
+
+class CoOccurrenceModel:
+
+    def __init__(self, top_k: int = RELATED_TOP_K):
+        self.top_k = top_k
+        self._pairs: Dict[str, Dict[str, int]] = {}
+        self._orders: Dict[str, int] = {}
+        self._top: Dict[str, List[Tuple[str, float, int]]] = {}
+        self.order_count = 0
+        self.built_at: Optional[float] = None
+        # (order id, products, +1/-1) of incremental updates, kept while rebuilds are scanning
+        self._pending: Optional[List[Tuple[str, List[str], int]]] = None
+        self._rebuilding = 0
+
+    def _apply(self, products: List[str], sign: int) -> None:
+        if len(products) < 2 or len(products) > RELATED_MAX_ORDER_PRODUCTS:
+            return  # single-product orders have no pairs; see RELATED_MAX_ORDER_PRODUCTS
+        self.order_count += sign
+        for product_id in products:
+            self._orders[product_id] = self._orders.get(product_id, 0) + sign
+        for a, b in permutations(products, 2):
+            row = self._pairs.setdefault(a, {})
+            count = row.get(b, 0) + sign
+            if count > 0:
+                row[b] = count
+            else:
+                row.pop(b, None)
+
+    def _rank(self, product_id: str) -> None:
+        row = self._pairs.get(product_id) or {}
+        n_a = self._orders.get(product_id, 0)
+        scored = (
+            (b, count / sqrt(n_a * self._orders[b]), count)
+            for b, count in row.items()
+            if count >= RELATED_MIN_CO_OCCURRENCE and n_a > 0 and self._orders.get(b, 0) > 0
+        )
+        top = heapq.nlargest(self.top_k, scored, key=lambda entry: (entry[1], entry[2]))
+        if top:
+            self._top[product_id] = top
+        else:
+            self._top.pop(product_id, None)
+
+    def begin_rebuild(self) -> None:
+        """Call before scanning the orders; updates from now on are replayed by rebuild()."""
+        if self._rebuilding == 0:
+            self._pending = []
+        self._rebuilding += 1
+
+    def abort_rebuild(self) -> None:
+        self._rebuilding = max(0, self._rebuilding - 1)
+        if self._rebuilding == 0:
+            self._pending = None
+
+    def rebuild(self, baskets: Dict[str, List[str]]) -> None:
+        """Replace the model with one built from `baskets` (order id -> products of each counted order)."""
+        fresh = CoOccurrenceModel.from_orders(baskets.values(), self.top_k)
+        pending, rebuilding = self._pending, self._rebuilding
+        self.__dict__.update(fresh.__dict__)
+        self._pending, self._rebuilding = pending, rebuilding
+        # The scan may have read an order before or after a buffered update to it: apply an
+        # update only if it changes whether the order is counted
+        counted: Dict[str, bool] = {}
+        for order_id, products, sign in pending or []:
+            was_counted = counted.get(order_id, order_id in baskets)
+            if was_counted != (sign > 0):
+                self._update(products, sign)
+            counted[order_id] = sign > 0
+        self.abort_rebuild()
+
+    def apply_order(self, order_id: str, products: List[str], sign: int) -> None:
+        """An order with `products` was placed or reopened (+1), or cancelled or deleted (-1)."""
+        if self._pending is not None:
+            self._pending.append((order_id, products, sign))
+        self._update(products, sign)
+
+    def _update(self, products: List[str], sign: int) -> None:
+        self._apply(products, sign)
+        # Rows of the order's products changed; rank them again (other rows catch up on the next rebuild)
+        for product_id in products:
+            self._rank(product_id)
+
+    def neighbors(self, product_id: str, limit: int) -> List[Tuple[str, float, int]]:
+        """(product id, score, orders together) best first."""
+        return self._top.get(product_id, [])[:limit]
+
+    def stats(self) -> dict:
+        return {
+            "orders": self.order_count,
+            "products": len(self._orders),
+            "pairs": sum(len(row) for row in self._pairs.values()),
+            "built_at": self.built_at,
+        }
+
+    @classmethod
+    def from_orders(cls, orders: Iterable[List[str]], top_k: int = RELATED_TOP_K) -> "CoOccurrenceModel":
+        model = cls(top_k)
+        for products in orders:
+            model._apply(products, 1)
+        for product_id in model._pairs:
+            model._rank(product_id)
+        model.built_at = time.time()
+        return model
+
+
+co_occurrence = CoOccurrenceModel()
+_forwarders: List[OrderForwarder] = []
+
+
+def forward(forwarder: OrderForwarder) -> None:
+    _forwarders.append(forwarder)
+
+
+def _order_changed(order_id: str, items: Iterable[dict], sign: int) -> None:
+    products = order_products(items)
+    co_occurrence.apply_order(order_id, products, sign)
+    if len(products) < 2:
+        return  # no pairs, nothing for the other workers to apply
+    for forwarder in _forwarders:
+        try:
+            forwarder(order_id, products, sign)
+        except Exception as e:
+            logger.error(f"Order forwarder {getattr(forwarder, '__qualname__', forwarder)} failed: {e}", exc_info=True)
+
+
+def add_order(order_id: str, items: Iterable[dict]) -> None:
+    """This worker placed or reopened an order."""
+    _order_changed(order_id, items, 1)
+
+
+def remove_order(order_id: str, items: Iterable[dict]) -> None:
+    """This worker cancelled or deleted an order."""
+    _order_changed(order_id, items, -1)
+
+
+def deliver(order_id: str, products: List[str], sign: int) -> None:
+    """Another worker changed an order."""
+    co_occurrence.apply_order(order_id, products, sign)
+
+
+async def build_if_missing() -> None:
+    """Job follow-up in workers not running the rescans: they build once, then stay current through the bus."""
+    if co_occurrence.built_at is None:
+        await rebuild_co_occurrence()
+
+
+async def rebuild_co_occurrence() -> dict:
+    """Scan order history and rebuild the model."""
+    start = time.perf_counter()
+    baskets: Dict[str, List[str]] = {}
+    query = {"status": {"$ne": "cancelled"}}
+    co_occurrence.begin_rebuild()
+    try:
+        for collection in (database.collection_for(models.Order, "analytics"), archive_collection("analytics")):
+            async for doc in collection.find(query, ITEMS_PROJECTION, batch_size=2000):
+                products = order_products(doc.get("items"))
+                if len(products) > 1:  # the rest carry no pairs
+                    baskets[str(doc["_id"])] = products
+    except BaseException:
+        co_occurrence.abort_rebuild()
+        raise
+    co_occurrence.rebuild(baskets)
+    stats = dict(co_occurrence.stats(), seconds=round(time.perf_counter() - start, 3))
+    logger.info(f"Co-occurrence model built: {stats['pairs']} pairs over {stats['products']} products "
+                f"from {stats['orders']} multi-item orders in {stats['seconds']}s")
+    return stats
+
+
+def related_products(product_id: str, category: Optional[str], catalog: Dict[str, dict],
+                     limit: int) -> List[dict]:
+    """
+    Products bought together with `product_id`, topped up with popular
+    products of the same category (cold start). `catalog` maps ids to active
+    product response dicts; anything not in it is not recommended.
+    """
+    results = []
+    seen = {product_id}
+    for other_id, score, together in co_occurrence.neighbors(product_id, limit * 2):
+        product = catalog.get(other_id)
+        if product is None or other_id in seen:
+            continue
+        results.append(dict(product, reason="bought_together", score=round(score, 4), orders_together=together))
+        seen.add(other_id)
+        if len(results) >= limit:
+            return results
+    if category:
+        same_category = [p for p in catalog.values() if p.get("category") == category and p["id"] not in seen]
+        same_category.sort(key=lambda p: (p.get("review_count", 0), p.get("rating", 0)), reverse=True)
+        for product in same_category[:limit - len(results)]:
+            results.append(dict(product, reason="same_category", score=0.0, orders_together=0))
+    return results
+
+
+co_occurrence_job = PeriodicJob("co_occurrence", rebuild_co_occurrence, RELATED_REBUILD_SECONDS,
+                                follow=build_if_missing)
@@ -0,0 +1,81 @@
+"""
+Per-request context shared with code that has no access to the Request object
+(pymongo event listeners, log records). Motor runs driver calls on its executor
+with a copy of the caller's context, so listeners see the originating request.
+"""
+from contextvars import ContextVar
+from typing import Optional
+import logging
+import time
+import uuid
+
+logger = logging.getLogger("access")
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+_current_scope: ContextVar[Optional[dict]] = ContextVar("current_scope", default=None)
+_current_request_id: ContextVar[str] = ContextVar("current_request_id", default="")
+
+
+def current_route() -> str:
+    """Route template of the request being served, or "" outside a request."""
+    scope = _current_scope.get()
+    if scope is None:
+        return ""
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path", "")
+
+
+def current_request_id() -> str:
+    """Id of the request being served (from X-Request-ID or generated), or "" outside a request."""
+    return _current_request_id.get()
+
+
+class RequestContextMiddleware:
+    """
+    Pure ASGI middleware binding the ASGI scope and a request id to the
+    request's context, echoing the id in X-Request-ID and logging one
+    access record with the request duration.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = ""
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((REQUEST_ID_HEADER, request_id.encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        scope_token = _current_scope.set(scope)
+        id_token = _current_request_id.set(request_id)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            logger.info(
+                f"{scope['method']} {scope['path']} {status[0]}",
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status[0],
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                },
+            )
+            _current_request_id.reset(id_token)
+            _current_scope.reset(scope_token)
@@ -0,0 +1,266 @@
+"""
+In-process full-text product search.
+
+An inverted index over name, description, ingredients, flavors and category,
+ranked with BM25 (field weights are applied to term frequencies, BM25F-style).
+Query terms that are not in the vocabulary are expanded to similar indexed
+terms through a character-trigram index, so "chocolat" or "pistaa" still
+match. Only active products are indexed; the index is built once from Mongo
+and then kept current from product write events. Events that arrive while a
+rebuild is loading the catalog are buffered and replayed after the swap, so
+the rebuild cannot undo them.
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import models
+import heapq
+import math
+import re
+import time
+import unicodedata
+
+# Field -> weight applied to its term frequencies
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "flavors": 2.0, "ingredients": 1.0, "description": 1.0}
+# Fields kept per product for projected results (images are reduced to the first one)
+RESULT_FIELDS = ("id", "name", "category", "price", "discount", "rating", "review_count", "featured", "image")
+# Projection used when loading the catalog from Mongo
+MONGO_PROJECTION = {
+    "name": 1, "category": 1, "description": 1, "ingredients": 1, "flavors": 1, "status": 1,
+    "price": 1, "discount": 1, "rating": 1, "review_count": 1, "featured": 1, "images": {"$slice": 1},
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+FUZZY_MIN_SIMILARITY = 0.4
+FUZZY_MAX_EXPANSIONS = 3
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    if not text:
+        return []
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    normalized = "".join(c for c in normalized if not unicodedata.combining(c))
+    return _TOKEN_RE.findall(normalized)
+
+
+def trigrams(term: str) -> Set[str]:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _field_text(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value)
+    return str(value or "")
+
+
+def _project(product: dict) -> dict:
+    images = product.get("images") or []
+    return {
+        "id": str(product.get("id") or product.get("_id")),
+        "name": product.get("name", "") or "",
+        "category": product.get("category", "") or "",
+        "price": float(product.get("price", 0) or 0),
+        "discount": float(product.get("discount", 0) or 0),
+        "rating": float(product.get("rating", 0) or 0),
+        "review_count": int(product.get("review_count", 0) or 0),
+        "featured": bool(product.get("featured", False)),
+        "image": images[0] if images else None,
+    }
+
+
+class ProductSearchIndex:
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, float]] = {}   # term -> {product_id: weighted tf}
+        self._doc_terms: Dict[str, List[str]] = {}          # product_id -> distinct terms (for removal)
+        self._doc_length: Dict[str, float] = {}             # product_id -> weighted length
+        self._docs: Dict[str, dict] = {}                    # product_id -> projected result
+        self._trigrams: Dict[str, Set[str]] = {}            # trigram -> terms
+        self._term_gram_count: Dict[str, int] = {}          # term -> number of distinct trigrams
+        # term -> {product_id: BM25 tf component}; computed on first query, dropped when the term changes
+        self._impacts: Dict[str, Dict[str, float]] = {}
+        self._impacts_avg_length = 0.0
+        self._total_length = 0.0
+        # product_id -> latest event state, kept while rebuilds are loading
+        self._pending: Optional[Dict[str, Optional[dict]]] = None
+        self._rebuilding = 0
+        self.built = False
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # --- writes -------------------------------------------------------------------
+
+    def begin_rebuild(self) -> None:
+        """Call before loading the catalog; product events from now on are replayed by rebuild()."""
+        if self._rebuilding == 0:
+            self._pending = {}
+        self._rebuilding += 1
+
+    def abort_rebuild(self) -> None:
+        self._rebuilding = max(0, self._rebuilding - 1)
+        if self._rebuilding == 0:
+            self._pending = None
+
+    def rebuild(self, products: Iterable[dict]) -> None:
+        fresh = ProductSearchIndex()
+        for product in products:
+            fresh.upsert(product)
+        pending, rebuilding = self._pending, self._rebuilding
+        self.__dict__.update(fresh.__dict__)
+        self._pending, self._rebuilding = pending, rebuilding
+        for product_id, product in list((pending or {}).items()):
+            self.on_product_changed(product_id, product)
+        self.abort_rebuild()
+        self.built = True
+
+    def upsert(self, product: dict) -> None:
+        product_id = str(product.get("id") or product.get("_id"))
+        self.remove(product_id)
+        if (product.get("status") or "active") != "active":
+            return
+
+        frequencies: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(_field_text(product.get(field))):
+                frequencies[token] = frequencies.get(token, 0.0) + weight
+        if not frequencies:
+            return
+
+        for term, tf in frequencies.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                grams = trigrams(term)
+                self._term_gram_count[term] = len(grams)
+                for gram in grams:
+                    self._trigrams.setdefault(gram, set()).add(term)
+            postings[product_id] = tf
+            self._impacts.pop(term, None)
+        length = sum(frequencies.values())
+        self._doc_terms[product_id] = list(frequencies)
+        self._doc_length[product_id] = length
+        self._total_length += length
+        self._docs[product_id] = _project(product)
+
+    def remove(self, product_id: str) -> None:
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            self._impacts.pop(term, None)
+            if not postings:
+                del self._postings[term]
+                self._term_gram_count.pop(term, None)
+                for gram in trigrams(term):
+                    bucket = self._trigrams.get(gram)
+                    if bucket is not None:
+                        bucket.discard(term)
+                        if not bucket:
+                            del self._trigrams[gram]
+        self._total_length -= self._doc_length.pop(product_id, 0.0)
+        self._docs.pop(product_id, None)
+
+    def on_product_changed(self, product_id: str, product: Optional[dict]) -> None:
+        """product_events listener."""
+        if self._pending is not None:
+            self._pending[product_id] = product
+        if product is None:
+            self.remove(product_id)
+        else:
+            self.upsert(product)
+
+    # --- reads ---------------------------------------------------------------------
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """The token itself if indexed, otherwise the most similar indexed terms by trigram overlap."""
+        if token in self._postings:
+            return [(token, 1.0)]
+        grams = trigrams(token)
+        overlap: Dict[str, int] = {}
+        for gram in grams:
+            for term in self._trigrams.get(gram, ()):
+                overlap[term] = overlap.get(term, 0) + 1
+        candidates = []
+        for term, shared in overlap.items():
+            # Jaccard similarity of the two trigram sets
+            similarity = shared / (len(grams) + self._term_gram_count[term] - shared)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                candidates.append((term, similarity))
+        return heapq.nlargest(FUZZY_MAX_EXPANSIONS, candidates, key=lambda c: c[1])
+
+    def _term_impacts(self, term: str, avg_length: float) -> Dict[str, float]:
+        """Per-product tf*(k1+1)/(tf+norm) for a term, cached until the term or the average length changes."""
+        if abs(avg_length - self._impacts_avg_length) > 0.1 * self._impacts_avg_length:
+            # Average document length drifted >10% since the cache was filled; renormalize everything
+            self._impacts = {}
+            self._impacts_avg_length = avg_length
+        impacts = self._impacts.get(term)
+        if impacts is None:
+            avg = self._impacts_avg_length
+            lengths = self._doc_length
+            impacts = {
+                product_id: tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths[product_id] / avg))
+                for product_id, tf in self._postings[term].items()
+            }
+            self._impacts[term] = impacts
+        return impacts
+
+    def search(self, query: str, skip: int = 0, limit: int = 20,
+               fields: Optional[Iterable[str]] = None) -> dict:
+        start = time.perf_counter()
+        doc_count = len(self._docs)
+        scores: Dict[str, float] = {}
+        if doc_count:
+            avg_length = self._total_length / doc_count
+            weighted_terms = [
+                (term, similarity * math.log(1 + (doc_count - len(self._postings[term]) + 0.5)
+                                             / (len(self._postings[term]) + 0.5)))
+                for token in dict.fromkeys(tokenize(query))
+                for term, similarity in self._expand(token)
+            ]
+            for term, weight in weighted_terms:
+                impacts = self._term_impacts(term, avg_length)
+                if not scores:
+                    scores = {product_id: weight * impact for product_id, impact in impacts.items()}
+                    continue
+                get = scores.get
+                for product_id, impact in impacts.items():
+                    scores[product_id] = get(product_id, 0.0) + weight * impact
+
+        ranked = heapq.nlargest(skip + limit, scores.items(), key=lambda item: item[1])[skip:]
+        wanted = [f for f in (fields or RESULT_FIELDS) if f in RESULT_FIELDS]
+        results = []
+        for product_id, score in ranked:
+            doc = self._docs[product_id]
+            result = {f: doc[f] for f in wanted}
+            result["id"] = product_id
+            result["score"] = round(score, 4)
+            results.append(result)
+        return {
+            "query": query,
+            "total": len(scores),
+            "took_ms": round((time.perf_counter() - start) * 1000, 3),
+            "results": results,
+        }
+
+
+product_index = ProductSearchIndex()
+
+
+async def rebuild_product_index() -> None:
+    """Load the active catalog (text fields and first image only) and rebuild the index."""
+    product_index.begin_rebuild()
+    try:
+        cursor = models.Product.get_motor_collection().find({"status": {"$ne": "inactive"}}, MONGO_PROJECTION)
+        products = [doc async for doc in cursor]
+    except BaseException:
+        product_index.abort_rebuild()
+        raise
+    product_index.rebuild(products)
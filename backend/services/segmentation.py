@@ -0,0 +1,212 @@
+"""
+Customer RFM segmentation.
+
+A batch job: orders (hot and archived, cancelled ones excluded) are
+streamed with a small projection into columnar NumPy arrays (customer code,
+timestamp, total). Recency, frequency and monetary value per customer are
+then computed with grouped reductions, scored 1-5 by quintile and mapped to
+a segment with vectorized rules. Each run writes its rows to
+`customer_segments` under a new run id and then publishes the run
+(services.jobs.publish_run); the admin analytics API reads the current run
+only, so concurrent runs in several workers never mix or delete each
+other's results. Nothing is computed per request.
+
+Scans run against the analytics read profile. The job runs on
+SEGMENTATION_INTERVAL_SECONDS (0 disables) and from segment_customers.py.
+"""
+from datetime import datetime
+from typing import Dict, List, Tuple
+from uuid import uuid4
+import logging
+import os
+import time
+import numpy as np
+from pymongo import ASCENDING, DESCENDING
+import database
+import models
+from services.jobs import PeriodicJob, publish_run
+from services.order_archive import archive_collection
+
+logger = logging.getLogger(__name__)
+
+SEGMENTATION_INTERVAL_SECONDS = float(os.getenv("SEGMENTATION_INTERVAL_SECONDS", "86400"))
+SEGMENTATION_BATCH_SIZE = int(os.getenv("SEGMENTATION_BATCH_SIZE", "5000"))
+
+SEGMENTS_COLLECTION = "customer_segments"
+ORDER_PROJECTION = {"_id": 0, "user_id": 1, "created_at": 1, "total": 1}
+
+# Checked in order; the first matching rule wins (r, f = recency and frequency scores)
+SEGMENT_RULES = (
+    ("champions", lambda r, f, m: (r >= 4) & (f >= 4)),
+    ("loyal", lambda r, f, m: (r >= 3) & (f >= 4)),
+    ("new", lambda r, f, m: (r >= 4) & (f <= 1)),
+    ("promising", lambda r, f, m: r >= 3),
+    ("at_risk", lambda r, f, m: (r <= 2) & (f >= 3)),
+    ("hibernating", lambda r, f, m: r == 2),
+)
+FALLBACK_SEGMENT = "lapsed"
+SEGMENTS = tuple(name for name, _ in SEGMENT_RULES) + (FALLBACK_SEGMENT,)
+
+
+def _timestamps(values: List[str]) -> np.ndarray:
+    """ISO strings -> seconds since the epoch (NaT for unparseable values)."""
+    # Trim to seconds; the stored strings are naive local time, some with fractions or a Z
+    trimmed = np.array([str(v)[:19] if v else "NaT" for v in values], dtype="U19")
+    try:
+        return trimmed.astype("datetime64[s]")
+    except ValueError:
+        out = np.empty(len(trimmed), dtype="datetime64[s]")
+        for i, value in enumerate(trimmed):
+            try:
+                out[i] = np.datetime64(value, "s")
+            except ValueError:
+                out[i] = np.datetime64("NaT")
+        return out
+
+
+async def load_order_columns(batch_size: int = SEGMENTATION_BATCH_SIZE) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+    """(customer codes, timestamps, totals, code -> user id) for all non-cancelled orders."""
+    query = {"status": {"$ne": "cancelled"}, "user_id": {"$nin": [None, "", "guest"]}}
+    codes_by_user: Dict[str, int] = {}
+    code_chunks, ts_chunks, total_chunks = [], [], []
+    for collection in (database.collection_for(models.Order, "analytics"), archive_collection("analytics")):
+        cursor = collection.find(query, ORDER_PROJECTION, batch_size=batch_size)
+        while True:
+            docs = await cursor.to_list(length=batch_size)
+            if not docs:
+                break
+            code_chunks.append(np.fromiter(
+                (codes_by_user.setdefault(d["user_id"], len(codes_by_user)) for d in docs),
+                dtype=np.int64, count=len(docs),
+            ))
+            ts_chunks.append(_timestamps([d.get("created_at") for d in docs]))
+            total_chunks.append(np.fromiter((float(d.get("total") or 0) for d in docs), dtype=np.float64,
+                                            count=len(docs)))
+    if not code_chunks:
+        return np.empty(0, np.int64), np.empty(0, "datetime64[s]"), np.empty(0, np.float64), []
+    user_ids = [None] * len(codes_by_user)
+    for user_id, code in codes_by_user.items():
+        user_ids[code] = user_id
+    return np.concatenate(code_chunks), np.concatenate(ts_chunks), np.concatenate(total_chunks), user_ids
+
+
+def quintile_scores(values: np.ndarray, higher_is_better: bool = True) -> np.ndarray:
+    """1-5 by quintile of `values` (5 = best)."""
+    if values.size == 0:
+        return np.empty(0, dtype=np.int8)
+    edges = np.quantile(values, [0.2, 0.4, 0.6, 0.8])
+    scores = np.searchsorted(edges, values, side="right") + 1
+    return (scores if higher_is_better else 6 - scores).astype(np.int8)
+
+
+def compute_rfm(codes: np.ndarray, timestamps: np.ndarray, totals: np.ndarray, customers: int,
+                now: np.datetime64) -> Dict[str, np.ndarray]:
+    """Per-customer recency (days), frequency, monetary, their scores and segment index."""
+    valid = ~np.isnat(timestamps)
+    seconds = timestamps.astype("int64")
+    last = np.full(customers, np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(last, codes[valid], seconds[valid])
+    frequency = np.bincount(codes, minlength=customers)
+    monetary = np.bincount(codes, weights=totals, minlength=customers)
+    now_seconds = now.astype("datetime64[s]").astype("int64")
+    has_date = last != np.iinfo(np.int64).min
+    recency_days = np.where(has_date, (now_seconds - last) / 86400.0, np.inf)
+
+    # Customers whose orders all lack a date rank as the least recent
+    worst = recency_days[has_date].max() + 1 if has_date.any() else 0.0
+    r = quintile_scores(np.where(has_date, recency_days, worst), higher_is_better=False)
+    f = quintile_scores(frequency.astype(np.float64))
+    m = quintile_scores(monetary)
+    segment = np.select([rule(r, f, m) for _, rule in SEGMENT_RULES], np.arange(len(SEGMENT_RULES)),
+                        default=len(SEGMENT_RULES))
+    return {
+        "recency_days": recency_days, "frequency": frequency, "monetary": monetary,
+        "r": r, "f": f, "m": m, "segment": segment,
+    }
+
+
+async def _write_segments(run_id: str, user_ids: List[str], rfm: Dict[str, np.ndarray],
+                          computed_at: datetime) -> int:
+    collection = models.Order.get_motor_collection().database[SEGMENTS_COLLECTION]
+    await collection.create_index([("run_id", ASCENDING), ("segment", ASCENDING), ("monetary", DESCENDING)],
+                                  name="run_segment_monetary")
+    await collection.create_index([("run_id", ASCENDING), ("user_id", ASCENDING)], name="run_user")
+    written = 0
+    rows = []
+    for i, user_id in enumerate(user_ids):
+        recency = rfm["recency_days"][i]
+        r, f, m = int(rfm["r"][i]), int(rfm["f"][i]), int(rfm["m"][i])
+        rows.append({
+            "run_id": run_id,
+            "user_id": user_id,
+            "segment": SEGMENTS[int(rfm["segment"][i])],
+            "recency_days": None if np.isinf(recency) else round(float(recency), 1),
+            "frequency": int(rfm["frequency"][i]),
+            "monetary": round(float(rfm["monetary"][i]), 2),
+            "r": r, "f": f, "m": m,
+            "rfm": f"{r}{f}{m}",
+            "computed_at": computed_at,
+        })
+        if len(rows) >= 1000:
+            await collection.insert_many(rows, ordered=False)
+            written += len(rows)
+            rows = []
+    if rows:
+        await collection.insert_many(rows, ordered=False)
+        written += len(rows)
+    return written
+
+
+async def _publish_segments(run_id: str, computed_at: datetime) -> bool:
+    """Make this run the one the API reads, then drop superseded rows (or ours, if a newer run won)."""
+    collection = models.Order.get_motor_collection().database[SEGMENTS_COLLECTION]
+    published, previous_at = await publish_run(SEGMENTS_COLLECTION, run_id, computed_at)
+    if not published:
+        await collection.delete_many({"run_id": run_id})
+    elif previous_at is not None:
+        # Runs older than the one just replaced (which lagging readers may still use)
+        await collection.delete_many({"computed_at": {"$lt": previous_at}})
+    return published
+
+
+async def run_segmentation() -> dict:
+    """Load, score and store all customers; returns counts, timings and rows/s."""
+    computed_at = datetime.utcnow().replace(microsecond=0)
+    start = time.perf_counter()
+    codes, timestamps, totals, user_ids = await load_order_columns()
+    loaded = time.perf_counter()
+    rfm = compute_rfm(codes, timestamps, totals, len(user_ids), np.datetime64(datetime.now(), "s"))
+    computed = time.perf_counter()
+    run_id = uuid4().hex
+    written = await _write_segments(run_id, user_ids, rfm, computed_at)
+    published = await _publish_segments(run_id, computed_at)
+    done = time.perf_counter()
+
+    counts = np.bincount(rfm["segment"], minlength=len(SEGMENTS)) if len(user_ids) else np.zeros(len(SEGMENTS))
+    report = {
+        "orders": int(codes.size),
+        "customers": written,
+        "segments": {name: int(count) for name, count in zip(SEGMENTS, counts)},
+        "seconds": {
+            "load": round(loaded - start, 3),
+            "compute": round(computed - loaded, 4),
+            "write": round(done - computed, 3),
+            "total": round(done - start, 3),
+        },
+        "orders_per_second": {
+            "load": round(codes.size / (loaded - start)) if loaded > start else None,
+            "compute": round(codes.size / (computed - loaded)) if computed > loaded else None,
+        },
+        "computed_at": computed_at.isoformat(),
+        "run_id": run_id,
+        # False when a newer run finished first; this run's rows were discarded
+        "published": published,
+    }
+    logger.info(
+        f"Customer segmentation: {report['orders']} orders -> {written} customers in {report['seconds']['total']}s "
+        f"(load {report['orders_per_second']['load']} rows/s, compute {report['orders_per_second']['compute']} rows/s)"
+    )
+    return report
+
+
+segmentation_job = PeriodicJob("customer_segmentation", run_segmentation, SEGMENTATION_INTERVAL_SECONDS)
@@ -0,0 +1,66 @@
+"""
+Process-local cache of the single SiteSettings document.
+
+Settings are read on every storefront visit and on checkout but change only
+from the admin panel. The cached document is replaced on local updates and
+dropped when another worker changes it (invalidation bus); the TTL only
+bounds staleness if an invalidation is ever missed.
+"""
+from typing import Optional
+import asyncio
+import logging
+import os
+import time
+from models import SiteSettings
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_ID = "site_settings"
+SETTINGS_CACHE_TTL_SECONDS = float(os.getenv("SETTINGS_CACHE_TTL_SECONDS", "300"))
+
+
+class SettingsCache:
+
+    def __init__(self, ttl_seconds: float = SETTINGS_CACHE_TTL_SECONDS):
+        self._ttl = ttl_seconds
+        self._settings: Optional[SiteSettings] = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _load(self) -> SiteSettings:
+        settings = await SiteSettings.find_one(SiteSettings.id == SETTINGS_ID)
+        if not settings:
+            settings = SiteSettings(id=SETTINGS_ID)
+            try:
+                await settings.insert()
+            except Exception as insert_err:
+                # Document might already exist (e.g. race), fetch again
+                logger.info(f"Default settings insert said: {insert_err}")
+                settings = await SiteSettings.find_one(SiteSettings.id == SETTINGS_ID)
+                if not settings:
+                    raise
+        return settings
+
+    async def get(self) -> SiteSettings:
+        """The settings document (created with defaults if missing). Treat as read-only."""
+        settings = self._settings
+        if settings is not None and time.monotonic() - self._loaded_at < self._ttl:
+            return settings
+        async with self._lock:
+            if self._settings is None or time.monotonic() - self._loaded_at >= self._ttl:
+                self.set(await self._load())
+            return self._settings
+
+    async def refresh(self) -> None:
+        async with self._lock:
+            self.set(await self._load())
+
+    def set(self, settings: SiteSettings) -> None:
+        self._settings = settings
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        self._settings = None
+
+
+settings_cache = SettingsCache()
@@ -0,0 +1,182 @@
+"""
+Slow MongoDB operation log.
+
+A pymongo CommandListener compares every command's duration with
+SLOW_QUERY_MS. Offenders are logged with the shape of their filter and
+pipeline (keys and operators; values such as emails, phones and ids are
+replaced by "?"), sort, projection, duration and calling route, and kept
+in a bounded list of the worst
+SLOW_QUERY_TOP_N. A sample of slow reads is re-run as
+explain("executionStats") in the background and the plan summary is
+attached to the entry.
+"""
+from pymongo import monitoring
+from typing import Any, Dict, List, Optional, Tuple
+from services.request_context import current_route
+import asyncio
+import datetime
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_TOP_N = int(os.getenv("SLOW_QUERY_TOP_N", "50"))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1"))
+# Explains run against production data; never have more than this many in flight
+SLOW_QUERY_MAX_CONCURRENT_EXPLAINS = int(os.getenv("SLOW_QUERY_MAX_CONCURRENT_EXPLAINS", "2"))
+
+# Commands whose shape we record; explain is only attempted for reads
+_TRACKED_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete", "getMore"}
+_EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct"}
+_MAX_VALUE_CHARS = 500
+
+
+def _truncate(value: Any) -> Any:
+    """Compact, bounded representation (update payloads may carry base64 images)."""
+    if value is None:
+        return None
+    text = json.dumps(value, default=str)
+    return text if len(text) <= _MAX_VALUE_CHARS else text[:_MAX_VALUE_CHARS] + "..."
+
+
+def _shape(value: Any) -> Any:
+    """Keys, operators and $field references of a filter or pipeline, with every literal value redacted."""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = [_shape(item) for item in value]
+        # Lists of literals ($in, ...) collapse to one placeholder; their length is not interesting either
+        return shapes if any(isinstance(item, (dict, list)) for item in shapes) else ["?"] if shapes else []
+    if value is None or isinstance(value, str) and value.startswith("$"):
+        return value
+    return "?"
+
+
+def _explain_command(command: dict) -> Optional[dict]:
+    """Strip driver/session fields so the command can be wrapped in explain."""
+    inner = {k: v for k, v in command.items()
+             if not k.startswith("$") and k not in ("lsid", "txnNumber", "cursor", "readConcern", "writeConcern")}
+    if "pipeline" in inner:
+        if any("$out" in stage or "$merge" in stage for stage in inner["pipeline"]):
+            return None
+        inner["cursor"] = {}
+    return {"explain": inner, "verbosity": "executionStats"}
+
+
+def _plan_summary(result: dict) -> dict:
+    stats = result.get("executionStats", {}) or {}
+    planner = result.get("queryPlanner", {}) or {}
+    winning = planner.get("winningPlan", {}) or {}
+    return {
+        "stages": [s.get("stage", "?") for s in _walk(winning)],
+        "index": next((s.get("indexName") for s in _walk(winning) if s.get("indexName")), None),
+        "execution_time_ms": stats.get("executionTimeMillis"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned"),
+    }
+
+
+def _walk(stage: dict):
+    while stage:
+        yield stage
+        stage = stage.get("inputStage")
+
+
+class SlowQueryLog(monitoring.CommandListener):
+
+    def __init__(self):
+        self._pending: Dict[Tuple, Tuple[str, dict, str]] = {}
+        self._worst: List[Tuple[float, int, dict]] = []  # min-heap on duration
+        self._seq = itertools.count()
+        self._explains_in_flight = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client = None
+
+    def attach(self, client, loop: asyncio.AbstractEventLoop) -> None:
+        """Give the listener a client and loop to run background explains on."""
+        self._client = client
+        self._loop = loop
+
+    def started(self, event):
+        if event.command_name in _TRACKED_COMMANDS:
+            self._pending[(event.connection_id, event.request_id)] = (
+                event.database_name, event.command, current_route())
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < SLOW_QUERY_MS:
+            return
+        database_name, command, route = pending
+        name = event.command_name
+        entry = {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "database": database_name,
+            "collection": command.get(name) if isinstance(command.get(name), str) else command.get("collection"),
+            "command": name,
+            "duration_ms": round(duration_ms, 3),
+            "route": route,
+            "filter": _truncate(_shape(command.get("filter", command.get("query")))),
+            "sort": _truncate(command.get("sort")),
+            "projection": _truncate(command.get("projection", command.get("fields"))),
+            "pipeline": _truncate(_shape(command.get("pipeline"))),
+            "explain": None,
+        }
+        logger.warning(
+            f"Slow MongoDB {name} on {entry['collection']} took {entry['duration_ms']}ms "
+            f"(route={route or '-'} filter={entry['filter']} sort={entry['sort']} projection={entry['projection']})"
+        )
+        self._record(entry)
+        if name in _EXPLAINABLE_COMMANDS and random.random() < SLOW_QUERY_EXPLAIN_SAMPLE_RATE:
+            self._schedule_explain(entry, database_name, command)
+
+    def _record(self, entry: dict) -> None:
+        item = (entry["duration_ms"], next(self._seq), entry)
+        if len(self._worst) < SLOW_QUERY_TOP_N:
+            heapq.heappush(self._worst, item)
+        elif item[0] > self._worst[0][0]:
+            heapq.heapreplace(self._worst, item)
+
+    def _schedule_explain(self, entry: dict, database_name: str, command: dict) -> None:
+        if self._client is None or self._loop is None or self._loop.is_closed():
+            return
+        if self._explains_in_flight >= SLOW_QUERY_MAX_CONCURRENT_EXPLAINS:
+            return
+        explain = _explain_command(command)
+        if explain is None:
+            return
+        self._explains_in_flight += 1
+        asyncio.run_coroutine_threadsafe(self._explain(entry, database_name, explain), self._loop)
+
+    async def _explain(self, entry: dict, database_name: str, explain: dict) -> None:
+        try:
+            result = await self._client[database_name].command(explain)
+            entry["explain"] = _plan_summary(result)
+        except Exception as e:
+            entry["explain"] = {"error": str(e)}
+        finally:
+            self._explains_in_flight -= 1
+
+    def worst(self) -> List[dict]:
+        """Slowest recorded operations, slowest first."""
+        return [entry for _, _, entry in sorted(self._worst, reverse=True)]
+
+    def clear(self) -> None:
+        self._worst = []
+
+
+slow_query_log = SlowQueryLog()
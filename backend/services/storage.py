@@ -1,9 +1,14 @@
 from azure.storage.blob.aio import BlobServiceClient
 import os
 from fastapi import UploadFile
-from typing import Union
+from typing import Optional, Union
+from services.metrics import blob_upload_duration_seconds
+import logging
+import time
 import uuid
 
+logger = logging.getLogger(__name__)
+
 async def upload_file_to_azure(file: Union[UploadFile, bytes], filename: str = None) -> str:
     """
     Uploads a file to Azure Blob Storage and returns the public URL.
@@ -36,9 +41,46 @@ async def upload_file_to_azure(file: Union[UploadFile, bytes], filename: str = N
             blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
 
             # Upload the file content directly
-            await blob_client.upload_blob(file_content, overwrite=True)
+            start = time.perf_counter()
+            try:
+                await blob_client.upload_blob(file_content, overwrite=True)
+            except Exception:
+                blob_upload_duration_seconds.observe(time.perf_counter() - start, ("error",))
+                raise
+            blob_upload_duration_seconds.observe(time.perf_counter() - start, ("success",))
             
             return blob_client.url
     except Exception as e:
-        print(f"Azure Upload Error: {e}")
+        logger.error(f"Azure Upload Error: {e}")
         raise e
+
+
+async def put_blob(container_name: str, blob_name: str, data: bytes, content_type: str = None) -> None:
+    """Upload bytes under a fixed blob name (overwrites)."""
+    from azure.storage.blob import ContentSettings
+
+    connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+    async with BlobServiceClient.from_connection_string(connection_string) as blob_service_client:
+        blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
+        settings = ContentSettings(content_type=content_type) if content_type else None
+        start = time.perf_counter()
+        try:
+            await blob_client.upload_blob(data, overwrite=True, content_settings=settings)
+        except Exception:
+            blob_upload_duration_seconds.observe(time.perf_counter() - start, ("error",))
+            raise
+        blob_upload_duration_seconds.observe(time.perf_counter() - start, ("success",))
+
+
+async def get_blob(container_name: str, blob_name: str) -> Optional[bytes]:
+    """Blob content, or None if it does not exist."""
+    from azure.core.exceptions import ResourceNotFoundError
+
+    connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+    async with BlobServiceClient.from_connection_string(connection_string) as blob_service_client:
+        blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
+        try:
+            downloader = await blob_client.download_blob()
+        except ResourceNotFoundError:
+            return None
+        return await downloader.readall()
@@ -0,0 +1,266 @@
+"""
+Prefix autocomplete for the shop search box.
+
+Product names, categories and flavors (from products and from
+SiteSettings.product_flavors) are kept in one sorted array of normalized
+keys; a prefix lookup is a bisect plus a short range scan. Every word
+suffix of a phrase is indexed too, so "kul" completes "Kesar Pista Kulfi".
+Suggestions are ranked by a popularity weight (reviews and rating, with a
+boost for featured products); categories and flavors accumulate the
+weights of the products carrying them. The scan stops at a hard time
+budget and returns the best completions found so far. Writes that arrive
+while a rebuild is loading are replayed after the swap.
+"""
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import heapq
+import math
+import os
+import time
+import models
+from services.search import tokenize
+
+SUGGEST_BUDGET_MS = float(os.getenv("SUGGEST_BUDGET_MS", "2"))
+SUGGEST_MAX_LIMIT = 20
+SUGGEST_CACHE_SIZE = int(os.getenv("SUGGEST_CACHE_SIZE", "2048"))
+# Range entries scanned between clock checks
+_CHECK_EVERY = 64
+
+FEATURED_BOOST = 2.0
+SITE_FLAVOR_WEIGHT = 0.5
+# Completions of the whole phrase rank above completions of a later word
+PHRASE_START_BONUS = 1.25
+MONGO_PROJECTION = {"name": 1, "category": 1, "flavors": 1, "status": 1, "rating": 1, "review_count": 1, "featured": 1}
+
+_SITE_SETTINGS = "__site_settings__"
+
+# (kind, normalized text) for categories/flavors, ("product", product_id) for products
+EntryKey = Tuple[str, str]
+
+
+def _normalize(text: str) -> str:
+    return " ".join(tokenize(text))
+
+
+def product_weight(product: dict) -> float:
+    reviews = int(product.get("review_count", 0) or 0)
+    rating = float(product.get("rating", 0) or 0)
+    weight = 1.0 + math.log1p(reviews) * (rating / 5 if rating else 0.5)
+    if product.get("featured"):
+        weight += FEATURED_BOOST
+    return weight
+
+
+class SuggestionIndex:
+
+    def __init__(self):
+        self._entries: Dict[EntryKey, dict] = {}           # entry -> {"text", "type", "weight", "refs", ...}
+        self._keys: List[Tuple[str, EntryKey]] = []        # sorted (normalized word suffix, entry)
+        self._contributions: Dict[str, List[Tuple[EntryKey, str, str, float]]] = {}  # source -> added entries
+        # (normalized prefix, limit) -> result; cleared on every write
+        self._cache: "OrderedDict[Tuple[str, int], dict]" = OrderedDict()
+        self._bulk = False  # rebuild appends keys and sorts once at the end
+        # source -> latest product (None when removed) or site flavors, kept while rebuilds are loading
+        self._pending: Optional[Dict[str, object]] = None
+        self._rebuilding = 0
+        self.built = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --- writes -------------------------------------------------------------------
+
+    def _add(self, key: EntryKey, text: str, kind: str, weight: float, product_id: Optional[str] = None) -> None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry["weight"] += weight
+            entry["refs"] += 1
+            return
+        normalized = _normalize(text)
+        if not normalized:
+            return
+        entry = {"text": text, "type": kind, "weight": weight, "refs": 1, "normalized": normalized}
+        if product_id is not None:
+            entry["product_id"] = product_id
+        self._entries[key] = entry
+        words = normalized.split(" ")
+        for i in range(len(words)):
+            if self._bulk:
+                self._keys.append((" ".join(words[i:]), key))
+            else:
+                insort(self._keys, (" ".join(words[i:]), key))
+
+    def _subtract(self, key: EntryKey, weight: float) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry["weight"] -= weight
+        entry["refs"] -= 1
+        if entry["refs"] > 0:
+            return
+        del self._entries[key]
+        words = entry["normalized"].split(" ")
+        for i in range(len(words)):
+            item = (" ".join(words[i:]), key)
+            pos = bisect_left(self._keys, item)
+            if pos < len(self._keys) and self._keys[pos] == item:
+                del self._keys[pos]
+
+    def _set_source(self, source: str, additions: List[Tuple[EntryKey, str, str, float]]) -> None:
+        self._cache.clear()
+        for key, _, _, weight in self._contributions.pop(source, []):
+            self._subtract(key, weight)
+        for key, text, kind, weight in additions:
+            self._add(key, text, kind, weight, product_id=source if kind == "product" else None)
+        if additions:
+            self._contributions[source] = additions
+
+    def upsert(self, product: dict) -> None:
+        product_id = str(product.get("id") or product.get("_id"))
+        if (product.get("status") or "active") != "active":
+            self._set_source(product_id, [])
+            return
+        weight = product_weight(product)
+        additions = []
+        name = product.get("name") or ""
+        if name:
+            additions.append((("product", product_id), name, "product", weight))
+        category = product.get("category") or ""
+        if _normalize(category):
+            additions.append((("category", _normalize(category)), category, "category", weight))
+        for flavor in dict.fromkeys(product.get("flavors") or []):
+            if _normalize(flavor):
+                additions.append((("flavor", _normalize(flavor)), flavor, "flavor", weight))
+        self._set_source(product_id, additions)
+
+    def remove(self, product_id: str) -> None:
+        self._set_source(product_id, [])
+
+    def set_site_flavors(self, flavors: List[str]) -> None:
+        """Flavors configured in SiteSettings; suggested even before any product carries them."""
+        if self._pending is not None:
+            self._pending[_SITE_SETTINGS] = list(flavors or [])
+        additions = [
+            (("flavor", _normalize(flavor)), flavor, "flavor", SITE_FLAVOR_WEIGHT)
+            for flavor in dict.fromkeys(flavors or []) if _normalize(flavor)
+        ]
+        self._set_source(_SITE_SETTINGS, additions)
+
+    def begin_rebuild(self) -> None:
+        """Call before loading the catalog; writes from now on are replayed by rebuild()."""
+        if self._rebuilding == 0:
+            self._pending = {}
+        self._rebuilding += 1
+
+    def abort_rebuild(self) -> None:
+        self._rebuilding = max(0, self._rebuilding - 1)
+        if self._rebuilding == 0:
+            self._pending = None
+
+    def rebuild(self, products: List[dict], site_flavors: List[str]) -> None:
+        fresh = SuggestionIndex()
+        fresh._bulk = True
+        fresh.set_site_flavors(site_flavors)
+        for product in products:
+            fresh.upsert(product)
+        fresh._keys.sort()
+        fresh._bulk = False
+        pending, rebuilding = self._pending, self._rebuilding
+        self.__dict__.update(fresh.__dict__)
+        self._pending, self._rebuilding = pending, rebuilding
+        for source, value in list((pending or {}).items()):
+            if source == _SITE_SETTINGS:
+                self.set_site_flavors(value)
+            else:
+                self.on_product_changed(source, value)
+        self.abort_rebuild()
+        self.built = True
+
+    def on_product_changed(self, product_id: str, product: Optional[dict]) -> None:
+        """product_events listener."""
+        if self._pending is not None:
+            self._pending[product_id] = product
+        if product is None:
+            self.remove(product_id)
+        else:
+            self.upsert(product)
+
+    # --- reads ---------------------------------------------------------------------
+
+    def suggest(self, prefix: str, limit: int = 8, budget_ms: float = SUGGEST_BUDGET_MS) -> dict:
+        start = time.perf_counter()
+        deadline = start + budget_ms / 1000
+        normalized = _normalize(prefix)
+        # Keep "pista " distinct from "pista" so the next word is being completed
+        if normalized and prefix[-1:].isspace():
+            normalized += " "
+        cached = self._cache.get((normalized, limit))
+        if cached is not None:
+            self._cache.move_to_end((normalized, limit))
+            return dict(cached, prefix=prefix, took_ms=round((time.perf_counter() - start) * 1000, 3))
+
+        scores: Dict[EntryKey, float] = {}
+        truncated = False
+        if normalized:
+            keys, entries = self._keys, self._entries
+            pos = bisect_left(keys, (normalized,))
+            scanned = 0
+            while pos < len(keys) and keys[pos][0].startswith(normalized):
+                suffix, key = keys[pos]
+                entry = entries[key]
+                score = entry["weight"] * (PHRASE_START_BONUS if suffix == entry["normalized"] else 1.0)
+                if score > scores.get(key, 0.0):
+                    scores[key] = score
+                pos += 1
+                scanned += 1
+                if scanned % _CHECK_EVERY == 0 and time.perf_counter() > deadline:
+                    truncated = pos < len(keys) and keys[pos][0].startswith(normalized)
+                    break
+
+        suggestions = []
+        seen = set()
+        for key, score in heapq.nlargest(limit * 2, scores.items(), key=lambda item: item[1]):
+            entry = self._entries[key]
+            # A category and a flavor can share a name; show it once
+            if entry["normalized"] in seen:
+                continue
+            seen.add(entry["normalized"])
+            suggestion = {"text": entry["text"], "type": entry["type"], "score": round(score, 4)}
+            if "product_id" in entry:
+                suggestion["product_id"] = entry["product_id"]
+            suggestions.append(suggestion)
+            if len(suggestions) == limit:
+                break
+        result = {
+            "prefix": prefix,
+            "took_ms": round((time.perf_counter() - start) * 1000, 3),
+            "truncated": truncated,
+            "suggestions": suggestions,
+        }
+        # Partial results are not cached so a later, less loaded call can complete the scan
+        if not truncated:
+            self._cache[(normalized, limit)] = result
+            if len(self._cache) > SUGGEST_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return result
+
+
+suggestion_index = SuggestionIndex()
+
+
+async def rebuild_suggestion_index() -> None:
+    """Load the active catalog's names, categories, flavors and popularity plus the site flavors."""
+    suggestion_index.begin_rebuild()
+    try:
+        cursor = models.Product.get_motor_collection().find({"status": {"$ne": "inactive"}}, MONGO_PROJECTION)
+        products = [doc async for doc in cursor]
+        settings = await models.SiteSettings.get_motor_collection().find_one(
+            {"_id": "site_settings"}, {"product_flavors": 1}
+        )
+    except BaseException:
+        suggestion_index.abort_rebuild()
+        raise
+    site_flavors = settings.get("product_flavors", []) if settings else models.SiteSettings.model_fields[
+        "product_flavors"].default
+    suggestion_index.rebuild(products, site_flavors)
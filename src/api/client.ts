@@ -8,6 +8,27 @@ function getApiBaseUrl(): string {
 
 const API_URL = getApiBaseUrl(); 
 
+// Non-2xx response; keeps the status and body so callers can show the server's `detail`
+export class ApiError extends Error {
+    status: number;
+    body: string;
+
+    constructor(message: string, status: number, body: string) {
+        super(message);
+        this.name = 'ApiError';
+        this.status = status;
+        this.body = body;
+    }
+
+    get detail(): any {
+        try {
+            return JSON.parse(this.body).detail;
+        } catch {
+            return undefined;
+        }
+    }
+}
+
 export const apiClient = {
     get: async (url: string) => {
         const response = await fetch(`${API_URL}${url}`, {
@@ -17,21 +38,21 @@ export const apiClient = {
         if (!response.ok) {
             const errorText = await response.text();
             console.error(`GET ${url} error:`, errorText);
-            throw new Error(`API Get Error (${response.status}): ${response.statusText} - ${errorText}`);
+            throw new ApiError(`API Get Error (${response.status}): ${response.statusText} - ${errorText}`, response.status, errorText);
         }
         return response.json();
     },
-    post: async (url: string, data: any) => {
+    post: async (url: string, data: any, headers: Record<string, string> = {}) => {
         const response = await fetch(`${API_URL}${url}`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', ...headers },
             body: JSON.stringify(data),
             mode: 'cors',
         });
         if (!response.ok) {
             const errorText = await response.text();
             console.error(`POST ${url} error:`, errorText);
-            throw new Error(`API Post Error (${response.status}): ${response.statusText} - ${errorText}`);
+            throw new ApiError(`API Post Error (${response.status}): ${response.statusText} - ${errorText}`, response.status, errorText);
         }
         return response.json();
     },
@@ -45,7 +66,7 @@ export const apiClient = {
         if (!response.ok) {
             const errorText = await response.text();
             console.error(`PUT ${url} error:`, errorText);
-            throw new Error(`API Put Error (${response.status}): ${response.statusText} - ${errorText}`);
+            throw new ApiError(`API Put Error (${response.status}): ${response.statusText} - ${errorText}`, response.status, errorText);
         }
         return response.json();
     },
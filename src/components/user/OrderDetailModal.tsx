@@ -6,7 +6,7 @@ import { downloadInvoice, printInvoice } from '@/utils/invoiceGenerator';
 import { useCart } from '@/contexts/CartContext';
 import { useNavigate } from 'react-router-dom';
 import toast from 'react-hot-toast';
-import { fetchProducts } from '@/utils/dataManager';
+import { fetchProductsByIds } from '@/utils/dataManager';
 import {
     Package,
     User,
@@ -62,11 +62,11 @@ export default function OrderDetailModal({ isOpen, onClose, order }: OrderDetail
 
     const handleReorder = async () => {
         try {
-            const products = await fetchProducts();
+            const products = await fetchProductsByIds(order.items.map(item => item.productId));
             let addedCount = 0;
 
             for (const item of order.items) {
-                const product = products.find(p => p.id === item.productId || p.name === item.name);
+                const product = products.find(p => p.id === item.productId);
                 if (product) {
                     addItem(product, item.size, item.quantity);
                     addedCount++;
@@ -9,7 +9,8 @@ import { Label } from '@/components/ui/label';
 import { useCart } from '@/contexts/CartContext';
 import { useAuth } from '@/contexts/AuthContext';
 import { formatCurrency } from '@/utils/formatters';
-import { saveOrder } from '@/utils/dataManager';
+import { saveOrder, fetchCartQuote, CartQuote } from '@/utils/dataManager';
+import { ApiError } from '@/api/client';
 import { Order, Address } from '@/types';
 import { CreditCard, CheckCircle, MapPin, User, Home, Building, Plus } from 'lucide-react';
 
@@ -17,9 +18,30 @@ type CheckoutStep = 'contact' | 'delivery' | 'payment';
 
 export default function Checkout() {
     const navigate = useNavigate();
-    const { items, subtotal, tax, deliveryCharges, total, clearCart } = useCart();
+    const { items, clearCart } = useCart();
     const { user } = useAuth();
 
+    // Totals always come from the server quote (the order is verified against it); no client-side fallback
+    const [quote, setQuote] = useState<CartQuote | null>(null);
+    const [quoteFailed, setQuoteFailed] = useState(false);
+    const [quoteRequest, setQuoteRequest] = useState(0);
+    useEffect(() => {
+        let cancelled = false;
+        setQuote(null);
+        setQuoteFailed(false);
+        if (items.length === 0) return;
+        fetchCartQuote(items).then(result => {
+            if (cancelled) return;
+            setQuote(result);
+            setQuoteFailed(result === null);
+        });
+        return () => {
+            cancelled = true;
+        };
+    }, [items, quoteRequest]);
+    const refreshQuote = () => setQuoteRequest(n => n + 1);
+    const quotePending = quote === null && !quoteFailed;
+
     const [currentStep, setCurrentStep] = useState<CheckoutStep>('contact');
     const [isProcessing, setIsProcessing] = useState(false);
     const [savedAddresses, setSavedAddresses] = useState<Address[]>([]);
@@ -73,6 +95,7 @@ export default function Checkout() {
     }
 
     const handlePlaceOrder = async () => {
+        if (!quote) return;
         setIsProcessing(true);
 
         try {
@@ -116,11 +139,11 @@ export default function Checkout() {
                     price: item.price,
                     size: item.size,
                 })),
-                subtotal,
-                tax,
-                deliveryCharges,
+                subtotal: quote.subtotal,
+                tax: quote.tax,
+                deliveryCharges: quote.deliveryCharges,
                 discount: 0,
-                total,
+                total: quote.total,
                 customer: {
                     name: contactInfo.name,
                     email: contactInfo.email,
@@ -160,7 +183,14 @@ export default function Checkout() {
             navigate('/order-success');
         } catch (error) {
             console.error('Error placing order:', error);
-            toast.error('Failed to place order. Please try again.');
+            if (error instanceof ApiError && error.status === 422) {
+                // Prices or settings changed since the quote: show why and re-quote before a retry
+                const detail = error.detail;
+                toast.error(typeof detail === 'string' ? detail : detail?.message || 'Your order could not be placed.');
+                refreshQuote();
+            } else {
+                toast.error('Failed to place order. Please try again.');
+            }
             setIsProcessing(false);
         }
     };
@@ -458,11 +488,34 @@ export default function Checkout() {
                                             <Button
                                                 onClick={handlePlaceOrder}
                                                 className="flex-1"
-                                                disabled={isProcessing}
+                                                disabled={isProcessing || !quote || quote.belowMinimum || quote.issues.length > 0}
                                             >
-                                                {isProcessing ? 'Processing...' : `Place Order (${formatCurrency(total)})`}
+                                                {isProcessing
+                                                    ? 'Processing...'
+                                                    : quote
+                                                        ? `Place Order (${formatCurrency(quote.total)})`
+                                                        : 'Calculating total...'}
                                             </Button>
                                         </div>
+                                        {quoteFailed && (
+                                            <p className="text-sm text-error mt-3">
+                                                Could not calculate your total.{' '}
+                                                <button type="button" className="underline" onClick={refreshQuote}>
+                                                    Try again
+                                                </button>
+                                            </p>
+                                        )}
+                                        {quote && quote.issues.length > 0 && (
+                                            <p className="text-sm text-error mt-3">
+                                                Some items in your cart are unavailable or exceed the available stock.
+                                                Please update your cart.
+                                            </p>
+                                        )}
+                                        {quote?.belowMinimum && (
+                                            <p className="text-sm text-error mt-3">
+                                                Your order is below the minimum order amount.
+                                            </p>
+                                        )}
                                     </div>
                                 )}
                             </div>
@@ -485,30 +538,36 @@ export default function Checkout() {
                                     ))}
                                 </div>
 
-                                <div className="border-t border-chocolate/10 pt-4 space-y-2">
-                                    <div className="flex justify-between text-sm">
-                                        <span className="text-chocolate/70">Subtotal</span>
-                                        <span className="font-semibold">{formatCurrency(subtotal)}</span>
-                                    </div>
-                                    <div className="flex justify-between text-sm">
-                                        <span className="text-chocolate/70">Tax (5%)</span>
-                                        <span className="font-semibold">{formatCurrency(tax)}</span>
-                                    </div>
-                                    <div className="flex justify-between text-sm">
-                                        <span className="text-chocolate/70">Delivery</span>
-                                        <span className="font-semibold">
-                                            {deliveryCharges === 0 ? (
-                                                <span className="text-success">FREE</span>
-                                            ) : (
-                                                formatCurrency(deliveryCharges)
-                                            )}
-                                        </span>
+                                {quote ? (
+                                    <div className="border-t border-chocolate/10 pt-4 space-y-2">
+                                        <div className="flex justify-between text-sm">
+                                            <span className="text-chocolate/70">Subtotal</span>
+                                            <span className="font-semibold">{formatCurrency(quote.subtotal)}</span>
+                                        </div>
+                                        <div className="flex justify-between text-sm">
+                                            <span className="text-chocolate/70">Tax ({quote.taxRate}%)</span>
+                                            <span className="font-semibold">{formatCurrency(quote.tax)}</span>
+                                        </div>
+                                        <div className="flex justify-between text-sm">
+                                            <span className="text-chocolate/70">Delivery</span>
+                                            <span className="font-semibold">
+                                                {quote.deliveryCharges === 0 ? (
+                                                    <span className="text-success">FREE</span>
+                                                ) : (
+                                                    formatCurrency(quote.deliveryCharges)
+                                                )}
+                                            </span>
+                                        </div>
+                                        <div className="flex justify-between text-lg font-bold border-t border-chocolate/10 pt-2 mt-2">
+                                            <span>Total</span>
+                                            <span className="text-primary">{formatCurrency(quote.total)}</span>
+                                        </div>
                                     </div>
-                                    <div className="flex justify-between text-lg font-bold border-t border-chocolate/10 pt-2 mt-2">
-                                        <span>Total</span>
-                                        <span className="text-primary">{formatCurrency(total)}</span>
+                                ) : (
+                                    <div className="border-t border-chocolate/10 pt-4 text-sm text-chocolate/60">
+                                        {quotePending ? 'Calculating total...' : 'Total unavailable'}
                                     </div>
-                                </div>
+                                )}
                             </div>
                         </div>
                     </div>
@@ -5,10 +5,11 @@ import Footer from '@/components/layout/Footer';
 import { Button } from '@/components/ui/button';
 import { useCart } from '@/contexts/CartContext';
 import { Product, Review } from '@/types';
-import { fetchProductById, fetchReviewsByProductId } from '@/utils/dataManager';
+import { fetchProductById, fetchRelatedProducts, fetchReviewsByProductId } from '@/utils/dataManager';
 import { formatCurrency } from '@/utils/formatters';
 import { Star, ShoppingCart, Truck, Shield, Heart } from 'lucide-react';
 import { useFavorites } from '@/contexts/FavoritesContext';
+import ProductCard from '@/components/shop/ProductCard';
 
 export default function ProductDetail() {
     const { id } = useParams<{ id: string }>();
@@ -18,6 +19,7 @@ export default function ProductDetail() {
 
     const [product, setProduct] = useState<Product | null>(null);
     const [reviews, setReviews] = useState<Review[]>([]);
+    const [related, setRelated] = useState<Product[]>([]);
     const [selectedSize, setSelectedSize] = useState('');
     const [quantity, setQuantity] = useState(1);
     const [isLoading, setIsLoading] = useState(true);
@@ -27,12 +29,16 @@ export default function ProductDetail() {
 
         setIsLoading(true);
         const productData = await fetchProductById(id);
-        const reviewsData = await fetchReviewsByProductId(id);
+        const [reviewsData, relatedData] = await Promise.all([
+            fetchReviewsByProductId(id),
+            fetchRelatedProducts(id),
+        ]);
 
         if (productData) {
             setProduct(productData);
             setSelectedSize(productData.sizes[0] || '');
             setReviews(reviewsData);
+            setRelated(relatedData);
         }
         setIsLoading(false);
     };
@@ -273,6 +279,20 @@ export default function ProductDetail() {
                         </div>
                     </div>
 
+                    {/* Frequently Bought Together */}
+                    {related.length > 0 && (
+                        <div className="mt-16">
+                            <h2 className="text-3xl font-display font-bold text-chocolate mb-8">
+                                Frequently Bought Together
+                            </h2>
+                            <div className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-4 gap-6">
+                                {related.map(item => (
+                                    <ProductCard key={item.id} product={item} />
+                                ))}
+                            </div>
+                        </div>
+                    )}
+
                     {/* Reviews Section */}
                     <div className="
 
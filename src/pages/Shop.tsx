@@ -10,7 +10,7 @@ import ProductGrid from '@/components/shop/ProductGrid';
 import ProductQuickView from '@/components/shop/ProductQuickView';
 import { Button } from '@/components/ui/button';
 import { Product } from '@/types';
-import { fetchProducts } from '@/utils/dataManager';
+import { fetchCatalog } from '@/utils/dataManager';
 
 export default function Shop() {
     const [searchParams] = useSearchParams();
@@ -47,7 +47,7 @@ export default function Shop() {
 
     const loadProducts = async () => {
         setIsLoading(true);
-        const data = await fetchProducts();
+        const data = await fetchCatalog();
         setProducts(data.filter(p => p.status === 'active'));
         setIsLoading(false);
     };
@@ -6,7 +6,7 @@ import AdminLayout from '@/components/admin/AdminLayout';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Textarea } from '@/components/ui/textarea';
-import { apiClient } from '@/api/client';
+import { apiClient, ApiError } from '@/api/client';
 import {
     Store,
     CreditCard,
@@ -105,6 +105,9 @@ interface SiteSettings {
     
     // Notifications
     enable_notifications: boolean;
+
+    // Server-side version, sent back on save to detect concurrent edits
+    version?: number;
 }
 
 const defaultSettings: SiteSettings = {
@@ -186,6 +189,8 @@ export default function Settings() {
     const { isAdmin, user } = useAuth();
     const navigate = useNavigate();
     const [settings, setSettings] = useState<SiteSettings>(defaultSettings);
+    // Last state read from / written to the backend; saves only send fields that differ from it
+    const [savedSettings, setSavedSettings] = useState<SiteSettings>(defaultSettings);
     const [isLoading, setIsLoading] = useState(true);
     const [isSaving, setIsSaving] = useState(false);
     const [activeTab, setActiveTab] = useState<'store' | 'website' | 'products' | 'payment' | 'delivery' | 'billing'>('store');
@@ -219,21 +224,9 @@ export default function Settings() {
             const response = await apiClient.get('/settings/');
             // API client returns JSON directly, not wrapped in data
             if (response) {
-                // Merge backend response with defaults to ensure all fields exist
-                const loadedSettings = {
-                    ...defaultSettings,
-                    ...response,
-                    // Ensure arrays are properly set (don't override with undefined)
-                    product_categories: response.product_categories || defaultSettings.product_categories,
-                    product_sizes: response.product_sizes || defaultSettings.product_sizes,
-                    product_flavors: response.product_flavors || defaultSettings.product_flavors,
-                    product_dietary: response.product_dietary || defaultSettings.product_dietary,
-                    categories: response.categories || defaultSettings.categories,
-                    carousel_images: response.carousel_images || defaultSettings.carousel_images,
-                    features: response.features || defaultSettings.features,
-                    trust_indicators: response.trust_indicators || defaultSettings.trust_indicators,
-                };
+                const loadedSettings = withDefaults(response);
                 setSettings(loadedSettings);
+                setSavedSettings(loadedSettings);
                 console.log('Settings loaded from backend:', loadedSettings);
             } else {
                 // If no response, use defaults
@@ -249,24 +242,82 @@ export default function Settings() {
         }
     };
 
+    // Merge backend response with defaults to ensure all fields exist
+    const withDefaults = (response: any): SiteSettings => ({
+        ...defaultSettings,
+        ...response,
+        // Ensure arrays are properly set (don't override with undefined)
+        product_categories: response.product_categories || defaultSettings.product_categories,
+        product_sizes: response.product_sizes || defaultSettings.product_sizes,
+        product_flavors: response.product_flavors || defaultSettings.product_flavors,
+        product_dietary: response.product_dietary || defaultSettings.product_dietary,
+        categories: response.categories || defaultSettings.categories,
+        carousel_images: response.carousel_images || defaultSettings.carousel_images,
+        features: response.features || defaultSettings.features,
+        trust_indicators: response.trust_indicators || defaultSettings.trust_indicators,
+    });
+
+    const isConflict = (error: unknown) => error instanceof ApiError && error.status === 409;
+
+    const editedKeys = (local: SiteSettings, base: SiteSettings) =>
+        Object.keys(local).filter(key =>
+            key !== 'version' && JSON.stringify((local as any)[key]) !== JSON.stringify((base as any)[key]));
+
+    // Another admin saved since this form was loaded: take their values for the fields left untouched here,
+    // keep this admin's edits on top (unsaved) and name the fields both changed, so nothing is dropped silently
+    const mergeAfterConflict = async (local: SiteSettings) => {
+        let latest: SiteSettings;
+        try {
+            latest = withDefaults(await apiClient.get('/settings/'));
+        } catch (error) {
+            console.error('Failed to load settings after a conflict:', error);
+            toast.error('Settings were changed by another admin and the latest values could not be loaded. Please try again.');
+            return;
+        }
+        const edited = editedKeys(local, savedSettings);
+        const changedByBoth = edited.filter(key =>
+            JSON.stringify((latest as any)[key]) !== JSON.stringify((savedSettings as any)[key]));
+        setSettings({
+            ...latest,
+            ...Object.fromEntries(edited.map(key => [key, (local as any)[key]])),
+            version: latest.version,
+        });
+        setSavedSettings(latest);
+        toast.error(
+            changedByBoth.length > 0
+                ? `Settings were changed by another admin, including ${changedByBoth.join(', ')}. Your edits are kept but not saved; review them and save again.`
+                : 'Settings were changed by another admin. Their changes are loaded and your edits kept; save again to apply them.',
+            { duration: 8000 }
+        );
+    };
+
     const handleSave = async () => {
         setIsSaving(true);
         try {
-            console.log('Saving settings to backend:', settings);
-            console.log('Settings object keys:', Object.keys(settings));
+            // Only send what changed, plus the version it is based on, so parallel edits of other fields survive
+            const changes = Object.fromEntries(
+                editedKeys(settings, savedSettings).map(key => [key, (settings as any)[key]])
+            );
+            if (Object.keys(changes).length === 0) {
+                toast.success('No changes to save');
+                return;
+            }
+            console.log('Saving settings to backend:', Object.keys(changes));
             // apiClient.put returns the JSON directly, not wrapped in { data: ... }
-            const response = await apiClient.put('/settings/', settings);
-            console.log('Settings saved response:', response);
-            console.log('Verifying save - fetching settings again...');
-            // Verify by fetching the settings again
-            const verifyResponse = await apiClient.get('/settings/');
-            console.log('Verified settings from DB:', verifyResponse);
+            const response = await apiClient.put('/settings/', { ...changes, version: settings.version });
+            const saved = { ...settings, version: response.version };
+            setSettings(saved);
+            setSavedSettings(saved);
             toast.success('Settings saved successfully! Refreshing...');
             // Dispatch event to refresh settings across the app
             setTimeout(() => {
                 window.dispatchEvent(new Event('settingsUpdated'));
             }, 100);
         } catch (error: any) {
+            if (isConflict(error)) {
+                await mergeAfterConflict(settings);
+                return;
+            }
             console.error('Error saving settings:', error);
             console.error('Error message:', error?.message);
             toast.error(`Failed to save settings: ${error?.message || 'Unknown error'}`);
@@ -275,6 +326,13 @@ export default function Settings() {
         }
     };
 
+    // Saves a single product list right away; keeps the local version in step with the server
+    const saveProductList = async (type: 'product_categories' | 'product_sizes' | 'product_flavors' | 'product_dietary', values: string[]) => {
+        const response = await apiClient.put('/settings/', { [type]: values, version: settings.version });
+        setSettings(prev => ({ ...prev, [type]: values, version: response.version }));
+        setSavedSettings(prev => ({ ...prev, [type]: values, version: response.version }));
+    };
+
     const handleChange = (key: keyof SiteSettings, value: any) => {
         setSettings(prev => ({ ...prev, [key]: value }));
     };
@@ -300,11 +358,15 @@ export default function Settings() {
         
         // Auto-save to backend
         try {
-            await apiClient.put('/settings/', { [type]: updatedSettings[type] });
+            await saveProductList(type, updatedSettings[type]);
             toast.success(`Added ${value}`);
             // Dispatch event to notify other components
             window.dispatchEvent(new Event('settingsUpdated'));
         } catch (error: any) {
+            if (isConflict(error)) {
+                await mergeAfterConflict(updatedSettings);
+                return;
+            }
             console.error('Error saving settings:', error);
             toast.error(`Failed to save: ${error?.message || 'Unknown error'}`);
             // Revert on error
@@ -321,11 +383,15 @@ export default function Settings() {
         
         // Auto-save to backend
         try {
-            await apiClient.put('/settings/', { [type]: updatedSettings[type] });
+            await saveProductList(type, updatedSettings[type]);
             toast.success(`Removed ${value}`);
             // Dispatch event to notify other components
             window.dispatchEvent(new Event('settingsUpdated'));
         } catch (error: any) {
+            if (isConflict(error)) {
+                await mergeAfterConflict(updatedSettings);
+                return;
+            }
             console.error('Error saving settings:', error);
             toast.error(`Failed to save: ${error?.message || 'Unknown error'}`);
             // Revert on error
@@ -59,6 +59,7 @@ export interface OrderItem {
     quantity: number;
     price: number;
     size: string;
+    thumbnail?: string;
 }
 
 export interface StatusHistory {
@@ -2,37 +2,73 @@ import { Product, Order, User, Review, Inventory } from '../types';
 import { apiClient } from '../api/client';
 
 // Products
+const mapProduct = (item: any): Product => ({
+    id: item.id,
+    name: item.name,
+    category: item.category,
+    description: item.description || '',
+    price: Number(item.price),
+    discount: Number(item.discount || 0),
+    images: item.images || [],
+    sizes: item.sizes || [],
+    priceBySize: item.price_by_size || undefined,
+    stock: item.stock || 0,
+    lowStockThreshold: item.low_stock_threshold || 10,
+    flavors: item.flavors || [],
+    dietary: item.dietary || [],
+    rating: Number(item.rating || 0),
+    reviewCount: item.review_count || 0,
+    ingredients: item.ingredients || '',
+    nutrition: item.nutrition || {},
+    status: item.status || 'active',
+    featured: item.featured || false,
+    createdAt: item.created_at,
+});
+
 export const fetchProducts = async (): Promise<Product[]> => {
     try {
         const products = await apiClient.get('/products/');
-        return products.map((item: any) => ({
-            id: item.id,
-            name: item.name,
-            category: item.category,
-            description: item.description || '',
-            price: Number(item.price),
-            discount: Number(item.discount || 0),
-            images: item.images || [],
-            sizes: item.sizes || [],
-            priceBySize: item.price_by_size || undefined,
-            stock: item.stock || 0,
-            lowStockThreshold: item.low_stock_threshold || 10,
-            flavors: item.flavors || [],
-            dietary: item.dietary || [],
-            rating: Number(item.rating || 0),
-            reviewCount: item.review_count || 0,
-            ingredients: item.ingredients || '',
-            nutrition: item.nutrition || {},
-            status: item.status || 'active',
-            featured: item.featured || false,
-            createdAt: item.created_at,
-        }));
+        return products.map(mapProduct);
     } catch (error) {
         console.error('Error fetching products:', error);
         return [];
     }
 };
 
+// Active products only, from the server's cached (ETag + compressed) snapshot
+export const fetchCatalog = async (): Promise<Product[]> => {
+    try {
+        const products = await apiClient.get('/products/catalog');
+        return products.map(mapProduct);
+    } catch (error) {
+        console.error('Error fetching catalog:', error);
+        return [];
+    }
+};
+
+// One request for many products (cart, favorites, reorder); unknown ids are dropped
+export const fetchProductsByIds = async (ids: string[]): Promise<Product[]> => {
+    if (ids.length === 0) return [];
+    try {
+        const { results } = await apiClient.post('/products/batch', { ids });
+        return results.filter((item: any) => item.found !== false).map(mapProduct);
+    } catch (error) {
+        console.error('Error fetching products by id:', error);
+        return [];
+    }
+};
+
+// "Frequently bought together" for a product page
+export const fetchRelatedProducts = async (id: string, limit: number = 4): Promise<Product[]> => {
+    try {
+        const products = await apiClient.get(`/products/${id}/related?limit=${limit}`);
+        return products.map(mapProduct);
+    } catch (error) {
+        console.error('Error fetching related products:', error);
+        return [];
+    }
+};
+
 export const fetchProductById = async (id: string): Promise<Product | undefined> => {
     try {
         const item = await apiClient.get(`/products/${id}`);
@@ -65,7 +101,7 @@ export const fetchProductById = async (id: string): Promise<Product | undefined>
 };
 
 export const fetchFeaturedProducts = async (): Promise<Product[]> => {
-    const products = await fetchProducts();
+    const products = await fetchCatalog();
     return products.filter(p => p.featured);
 };
 
@@ -77,10 +113,9 @@ export const saveProduct = async (product: Partial<Product>): Promise<void> => {
             productData.low_stock_threshold = product.lowStockThreshold;
             delete productData.lowStockThreshold;
         }
-        if (product.reviewCount !== undefined) {
-            productData.review_count = product.reviewCount;
-            delete productData.reviewCount;
-        }
+        // Rating and review count are kept by the reviews API; product writes don't carry them
+        delete productData.rating;
+        delete productData.reviewCount;
         if (product.createdAt) {
             productData.created_at = product.createdAt;
             delete productData.createdAt;
@@ -148,31 +183,64 @@ export const fetchOrdersByUserId = async (userId: string): Promise<Order[]> => {
     return await fetchOrders(userId);
 };
 
+// Throws on failure (ApiError with status 422 when the server rejects the totals) so checkout can react
 export const saveOrder = async (order: Order): Promise<void> => {
+    const orderData = {
+        id: order.id,
+        user_id: order.userId,
+        order_number: order.orderNumber,
+        items: order.items,
+        subtotal: order.subtotal,
+        tax: order.tax,
+        delivery_charges: order.deliveryCharges,
+        discount: order.discount,
+        total: order.total,
+        customer: order.customer,
+        payment_method: order.paymentMethod,
+        payment_status: order.paymentStatus,
+        status: order.status,
+        status_history: order.statusHistory,
+        invoice_number: order.invoiceNumber,
+        created_at: order.createdAt,
+        estimated_delivery: order.estimatedDelivery
+    };
+    // The order id doubles as the idempotency key so a retried POST can't create a duplicate order
+    await apiClient.post('/orders/', orderData, { 'Idempotency-Key': order.id });
+    window.dispatchEvent(new CustomEvent('ordersUpdated'));
+};
+
+export interface CartQuote {
+    subtotal: number;
+    taxRate: number;
+    tax: number;
+    deliveryCharges: number;
+    freeDeliveryThreshold: number;
+    total: number;
+    belowMinimum: boolean;
+    issues: { product_id: string; size?: string; issue: string; available?: number }[];
+}
+
+// Server-side pricing of the cart; the order is verified against the same rules when it is placed
+export const fetchCartQuote = async (
+    items: { productId: string; size?: string; quantity: number }[]
+): Promise<CartQuote | null> => {
     try {
-        const orderData = {
-            id: order.id,
-            user_id: order.userId,
-            order_number: order.orderNumber,
-            items: order.items,
-            subtotal: order.subtotal,
-            tax: order.tax,
-            delivery_charges: order.deliveryCharges,
-            discount: order.discount,
-            total: order.total,
-            customer: order.customer,
-            payment_method: order.paymentMethod,
-            payment_status: order.paymentStatus,
-            status: order.status,
-            status_history: order.statusHistory,
-            invoice_number: order.invoiceNumber,
-            created_at: order.createdAt,
-            estimated_delivery: order.estimatedDelivery
+        const quote = await apiClient.post('/cart/quote', {
+            items: items.map(item => ({ productId: item.productId, size: item.size, quantity: item.quantity })),
+        });
+        return {
+            subtotal: Number(quote.subtotal),
+            taxRate: Number(quote.tax_rate),
+            tax: Number(quote.tax),
+            deliveryCharges: Number(quote.delivery_charges),
+            freeDeliveryThreshold: Number(quote.free_delivery_threshold),
+            total: Number(quote.total),
+            belowMinimum: Boolean(quote.below_minimum),
+            issues: quote.issues || [],
         };
-        await apiClient.post('/orders/', orderData);
-        window.dispatchEvent(new CustomEvent('ordersUpdated'));
     } catch (error) {
-        console.error('Error saving order:', error);
+        console.error('Error fetching cart quote:', error);
+        return null;
     }
 };
 
@@ -212,23 +280,30 @@ export const fetchUsers = async (): Promise<User[]> => {
     }
 };
 
-// Reviews - (Assuming we haven't implemented backend for reviews yet, keep empty or implement later.
-// The plan didn't explicitly detail Reviews router but it was in models.
-// Let's implement fetch if we can, or return empty for now to avoid breaking.)
-// Added Review model to models.py, need to make sure API exists? 
-// Checking task... "Create Database Models (Products, Orders, Users, etc.)" -> "Create API Endpoints (CRUD)"
-// I only created Products, Orders, Users routers. I missed Reviews.
-// I should add Review support or return empty. Returning empty for now to stick to explicit plan, or quickly add it.
-// I'll return empty for now to verify main flows first.
-export const fetchReviews = async (): Promise<Review[]> => {
-    // TODO: Implement reviews API
-    return [];
-};
+// Reviews (newest first, paged by the backend; first page by default)
+const mapReview = (item: any): Review => ({
+    id: item.id,
+    productId: item.product_id,
+    userId: item.user_id || '',
+    userName: item.user_name || '',
+    rating: Number(item.rating || 0),
+    title: item.title || '',
+    comment: item.comment || '',
+    images: item.images || [],
+    verified: Boolean(item.verified),
+    createdAt: item.created_at,
+});
 
-export const fetchReviewsByProductId = async (productId: string): Promise<Review[]> => {
-    // TODO: Implement reviews API
-    console.log('Fetching reviews for', productId);
-    return [];
+export const fetchReviewsByProductId = async (productId: string, skip: number = 0, limit: number = 20): Promise<Review[]> => {
+    try {
+        const reviews = await apiClient.get(
+            `/reviews/?product_id=${encodeURIComponent(productId)}&skip=${skip}&limit=${limit}`
+        );
+        return reviews.map(mapReview);
+    } catch (error) {
+        console.error('Error fetching reviews:', error);
+        return [];
+    }
 };
 
 // Inventory - Mock for now